@@ -1886,6 +1886,10 @@ class InteractiveClean:
         for imid, imdetails in self._clean_targets.items( ):
             ports.append( imdetails['gui']['cube']._pipe['image'].address[1] )
             ports.append( imdetails['gui']['cube']._pipe['control'].address[1] )
+            ### tile server used when the cube is displayed with tiles
+            tile_address = imdetails['gui']['cube']._pipe['image'].tile_address( )
+            if tile_address is not None:
+                ports.append( tile_address[1] )
 
         # Also forward http port if serving webpage
         if not self._is_notebook:
@@ -2238,6 +2242,12 @@ class InteractiveClean:
                 iteration_limit = int(msg['value']['iteration']['niter'])
                 stopdesc, stopcode, majordone, majorleft, iterleft, self._convergence_data = await self._clean['gclean'].__anext__( )
 
+                ###
+                ### tclean has updated the images on disk so cached image planes are stale
+                ###
+                for target in self._clean_targets.values( ):
+                    target['gui']['cube'].image_modified( )
+
                 clean_cmds = self._clean['gclean'].cmds( )
 
                 for key, value in self._convergence_data.items( ):
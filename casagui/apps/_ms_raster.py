@@ -2,6 +2,7 @@
 Implementation of the ``MsRaster`` application for measurement set raster plotting and editing
 '''
 
+from contextlib import contextmanager
 import time
 
 from bokeh.models.formatters import NumeralTickFormatter
@@ -13,7 +14,8 @@ from pandas import to_datetime
 from casagui.bokeh.format import get_time_formatter
 from casagui.bokeh.state._palette import available_palettes
 from casagui.plot.ms_plot._ms_plot import MsPlot
-from casagui.plot.ms_plot._ms_plot_constants import VIS_AXIS_OPTIONS, SPECTRUM_AXIS_OPTIONS
+from casagui.plot.ms_plot._ms_plot_constants import (VIS_AXIS_OPTIONS, SPECTRUM_AXIS_OPTIONS, AUTO_COLOR_PERCENTILES,
+ITER_PLOT_BATCH_SIZE, RECHUNK_EFFICIENCY, RECHUNK_MIN_BYTES)
 from casagui.plot.ms_plot._ms_plot_selectors import (file_selector, title_selector, style_selector, axis_selector,
 aggregation_selector, iteration_selector, selection_selector, plot_starter)
 from casagui.plot.ms_plot._raster_plot_inputs import check_inputs
@@ -27,6 +29,16 @@ class MsRaster(MsPlot):
         ms (str): path to MSv2 (.ms) or MSv4 (.zarr) file. Required when show_gui=False.
         log_level (str): logging threshold. Options include 'debug', 'info', 'warning', 'error', 'critical'. Default 'info'.
         show_gui (bool): whether to launch the interactive GUI in a browser tab. Default False.
+        convert_selection (dict): MSv2 data to convert to zarr before plotting, by spw_name, field_name,
+            and/or scan_name. Default None (all data).  MSv2 is converted in a background process, and
+            data selected for plotting is converted when needed.
+        convert_config (dict): MSv2 conversion configuration. Default None (defaults for all keys). Options include:
+            n_workers (int): number of worker processes converting partitions in parallel. Default min(4, cpu count).
+                Not used when a dask client is active (e.g. started with toolviper); its workers are used instead.
+            partition_scheme (list): additional MSv2 partitioning keys, e.g. ['FIELD_ID', 'SCAN_NUMBER']. Default [].
+            compressor (str): Blosc compressor name ('lz4', 'zstd', ...) or None. Default 'lz4'.
+            main_chunksize (dict, float): msv4 chunk sizes by dimension, or chunk size in GiB. Default None (xradio default).
+            use_dask_client (bool): whether to use the active dask client. Default True.
 
     Example:
         from casagui.plots import MsRaster
@@ -38,14 +50,20 @@ class MsRaster(MsPlot):
         msr.save() # saves as {ms name}_raster.png
     '''
 
-    def __init__(self, ms=None, log_level="info", show_gui=False):
-        super().__init__(ms, log_level, show_gui, "MsRaster")
+    def __init__(self, ms=None, log_level="info", show_gui=False, convert_selection=None, convert_config=None):
+        super().__init__(ms, log_level, show_gui, "MsRaster", convert_selection, convert_config)
         self._raster_plot = RasterPlot()
 
         # Calculations for color limits
-        self._spw_stats = {}
         self._spw_color_limits = {}
 
+        # Overview levels are chosen for the (width, height) of exported plots, if known.
+        # Plots are created again for a larger export size if they used an overview level
+        # chosen for fewer pixels (see save()).
+        self._export_pixels = None
+        self._overview_pixels = None
+        self._plot_args = None
+
         if show_gui:
             # GUI based on panel widgets
             self._gui_layout = None
@@ -56,6 +74,8 @@ class MsRaster(MsPlot):
             self._last_style_inputs = None
             # Last plot when no new plot created (plot inputs same) or is iter Layout plot (opened in tab)
             self._last_gui_plot = None
+            # Whether last plot used partial data (MSv2 conversion in progress); plot again with same inputs
+            self._last_plot_partial = False
 
             # Return plot for gui DynamicMap:
             # Empty plot when ms not set or plot fails
@@ -93,7 +113,8 @@ class MsRaster(MsPlot):
 
 # pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-locals, unused-argument
     def plot(self, x_axis='baseline', y_axis='time', vis_axis='amp', selection=None, aggregator=None, agg_axis=None,
-             iter_axis=None, iter_range=None, subplots=None, color_mode=None, color_range=None, title=None, clear_plots=True):
+             iter_axis=None, iter_range=None, subplots=None, color_mode=None, color_range=None, color_sample=None, title=None,
+             rasterize=False, clear_plots=True):
         '''
         Create a raster plot of vis_axis data in the data_group after applying selection.
         Plot axes include data dimensions (time, baseline/antenna, frequency, polarization).
@@ -133,23 +154,38 @@ class MsRaster(MsPlot):
                 Use with iter_axis and iter_range, or clear_plots=False.
                 If used in multiple calls, the last subplots tuple will be used to determine grid to show or save.
             color_mode (None, str): Whether to limit range of colorbar.  Default None (no limit).
-                Options include None (use data limits), 'auto' (calculate limits for amplitude), and 'manual' (use range in color_range).
-                'auto' is equivalent to None if vis_axis is not 'amp'.
+                Options include None (use data limits), 'auto' (calculate limits from percentiles of unflagged data in spw),
+                and 'manual' (use range in color_range).
+                'auto' is equivalent to None if aggregator is set.
                 When subplots is set, the 'auto' or 'manual' range will be used for all plots.
             color_range (tuple): (min, max) of colorbar to use if color_mode is 'manual'.
+            color_sample (None, float): fraction (0, 1] of the time chunks of each msv4 dataset to use to calculate 'auto' color limits.
+                Default None (use all data).  A small fraction gives a fast estimate for very large datasets.
             title (str): Plot title, default None (no title)
                 Set title='ms' to generate title from ms name and iter_axis value, if any.
+            rasterize (bool): whether to rasterize 2D plots with datashader. Default False.
+                The data is aggregated (mean) to the plot size and re-aggregated on zoom, so that the browser
+                receives a fixed-size image for large datasets. Hover shows the aggregated data values.
+                Requires datashader; ignored for 1D (scatter) plots.
             clear_plots (bool): whether to clear list of plots. Default True.
 
         If not show_gui and plotting is successful, use show() or save() to view/save the plot only.
         '''
         inputs = locals() # collect arguments into dict (not unused as pylint complains!)
+        self._plot_args = {key: value for key, value in inputs.items() if key != 'self'}
 
         start = time.time()
 
         # Clear for new plot
         self._reset_plot(clear_plots)
 
+        # Convert MSv2 data needed for selection if not converted yet.
+        # Without the GUI, wait for the data to plot so that plot and save() do not use partial data.
+        if self._data and self._data.is_valid() and (selection is None or isinstance(selection, dict)):
+            if self._data.update_conversion(selection, wait=not self._show_gui):
+                self._ms_info['data_dims'] = self._data.get_data_dimensions()
+                self._spw_color_limits.clear() # may have been computed with partial data
+
         # Get data dimensions if valid MS is set to check input axes
         if 'data_dims' in self._ms_info:
             data_dims = self._ms_info['data_dims']
@@ -160,6 +196,7 @@ class MsRaster(MsPlot):
 
         # Validate input arguments; data dims needed to check input and rename baseline dimension
         check_inputs(inputs)
+        inputs['plot_pixels'] = self._get_plot_pixels()
         self._plot_inputs = inputs
 
         # Copy user selection dict; selection will be modified for plot
@@ -177,7 +214,7 @@ class MsRaster(MsPlot):
                     self._do_iter_plot(self._plot_inputs)
                 else:
                     plot = self._do_plot(self._plot_inputs)
-                    self._plots.append(plot)
+                    self._add_plot(plot)
             except RuntimeError as e:
                 error = f"Plot failed: {str(e)}"
                 super()._notify(error, "error", 0)
@@ -185,7 +222,7 @@ class MsRaster(MsPlot):
             self._logger.debug("Plot elapsed time: %.2fs.", time.time() - start)
 # pylint: enable=too-many-arguments, too-many-positional-arguments, too-many-locals, unused-argument
 
-    def save(self, filename='', fmt='auto', width=900, height=600):
+    def save(self, filename='', fmt='auto', width=900, height=600, n_workers=4):
         '''
         Save plot to file.
 
@@ -196,15 +233,67 @@ class MsRaster(MsPlot):
                 Default 'auto': inferred from filename extension.
             width (int): width of exported plot.
             height (int): height of exported plot.
+            n_workers (int): number of threads used to save iteration plots individually.
 
         If iteration plots were created:
             If subplots is a grid, the layout plot will be saved to a single file.
             If subplots is a single plot, iteration plots will be saved individually,
                 with a plot index appended to the filename: {filename}_{index}.{ext}.
+        To save a large number of iteration plots without keeping them in memory, use stream_plots().
+        Plots which used an overview level (see build_overview()) with fewer samples than the export size
+        are plotted again with data for the export size.
         '''
         if not filename:
             filename = f"{self._ms_info['basename']}_raster.png"
-        super().save(filename, fmt, width, height)
+        self._replot_for_export(width, height)
+        super().save(filename, fmt, width, height, n_workers)
+
+    @contextmanager
+    def stream_plots(self, filename='', fmt='auto', width=900, height=600, n_workers=4):
+        '''
+        Save plots to file as they are created, instead of keeping them for show() or save().
+
+        Args:
+            filename (str): Name of file to save. Default '': plots will be saved as {ms}_raster_{index}.{ext}.
+            fmt (str): Format of file to save ('png', 'svg', 'html', or 'gif').
+                Default 'auto': inferred from filename extension.
+            width (int): width of exported plot.
+            height (int): height of exported plot.
+            n_workers (int): number of threads used to save plots.
+
+        Example:
+            with msr.stream_plots('myvis_raster.png'):
+                msr.plot(iter_axis='baseline', iter_range=(0, -1))
+        '''
+        if not filename:
+            filename = f"{self._ms_info['basename']}_raster.png"
+        with super().stream_plots(filename, fmt, width, height, n_workers) as exporter:
+            yield exporter
+
+    def _get_plot_pixels(self):
+        ''' Return (width, height) of plots being exported, or None if not known (plots are shown) '''
+        if self._export_pixels is not None:
+            return self._export_pixels
+        if self._stream_exporter is not None:
+            return (self._stream_info['width'], self._stream_info['height'])
+        return None
+
+    def _replot_for_export(self, width, height):
+        ''' Create plots again for export size if they used an overview level chosen for fewer pixels '''
+        if self._overview_pixels is None or (width <= self._overview_pixels[0] and height <= self._overview_pixels[1]):
+            return
+        if self._show_gui or not self._plot_args or not self._plot_args['clear_plots']:
+            # Plots from previous plot() calls would be lost
+            self._logger.warning("Saved plot uses overview data chosen for a %sx%s plot, which has fewer samples "
+                "than the %sx%s export. Select a time or frequency range to save full resolution data.",
+                self._overview_pixels[0], self._overview_pixels[1], width, height)
+            return
+        self._logger.info("Plotting again with data for %sx%s export.", width, height)
+        self._export_pixels = (width, height)
+        try:
+            self.plot(**self._plot_args)
+        finally:
+            self._export_pixels = None
 
     def _do_plot(self, plot_inputs):
         ''' Create plot using plot inputs '''
@@ -213,9 +302,31 @@ class MsRaster(MsPlot):
 
         # Select vis_axis data to plot and update selection; returns xarray Dataset
         raster_data = self._data.get_raster_data(plot_inputs)
+        self._log_chunk_report(plot_inputs)
+        return self._make_plot(raster_data, plot_inputs)
+
+    def _log_chunk_report(self, plot_inputs):
+        ''' Log bytes read from zarr chunks for plot; suggest rechunk() if most of the data read is not plotted '''
+        report = self._data.get_chunk_report(plot_inputs)
+        if not report:
+            return
+        message = (f"Plot data read from {report['num_chunks']} chunks: {report['read_bytes'] / 1e6:.1f} MB "
+            f"for {report['selected_bytes'] / 1e6:.1f} MB selected")
+        if report['efficiency'] < RECHUNK_EFFICIENCY and report['read_bytes'] >= RECHUNK_MIN_BYTES:
+            self._logger.info("%s. Use rechunk() to write a copy of the MS with chunks for raster plots.", message)
+        else:
+            self._logger.debug(message)
 
+    def _make_plot(self, raster_data, plot_inputs):
+        ''' Create plot of raster data (xarray Dataset) using plot inputs '''
         # Add params needed for plot: auto color range and ms name
         self._set_auto_color_range(plot_inputs) # set calculated limits if auto mode
+        if plot_inputs.get('overview_pixels'):
+            # Smallest size an overview level was chosen for, for save()
+            pixels = plot_inputs['overview_pixels']
+            if self._overview_pixels is not None:
+                pixels = (min(pixels[0], self._overview_pixels[0]), min(pixels[1], self._overview_pixels[1]))
+            self._overview_pixels = pixels
         ms_name = self._ms_info['basename'] # for title
         self._raster_plot.set_plot_params(raster_data, plot_inputs, ms_name)
 
@@ -250,17 +361,47 @@ class MsRaster(MsPlot):
         num_iter_plots = min(num_iter_plots, num_subplots) if num_subplots > 1 else num_iter_plots
         end_idx = start_idx + num_iter_plots
 
-        for i in range(start_idx, end_idx):
-            # Select iteration value and make plot
-            value = iter_values[i]
-            self._logger.info("Plot %s iteration index %s value %s", iter_axis, i, value)
-            plot_inputs['selection'][iter_axis] = value
-            try:
-                plot = self._do_plot(plot_inputs)
-                self._plots.append(plot)
-            except RuntimeError as e:
-                self._logger.info("Iteration plot for value %s failed: %s", str(value), str(e))
+        # Select raster data for a batch of iteration values without reading it,
+        # then read the batch together with one dask compute.  Lazy data is only
+        # created for one batch at a time to limit the size of the dask graphs.
+        last_inputs = None
+        for batch_start in range(start_idx, end_idx, ITER_PLOT_BATCH_SIZE):
+            iter_inputs = []
+            lazy_data = []
+            for i in range(batch_start, min(batch_start + ITER_PLOT_BATCH_SIZE, end_idx)):
+                value = iter_values[i]
+                self._logger.info("Plot %s iteration index %s value %s", iter_axis, i, value)
+                inputs = plot_inputs.copy()
+                inputs['selection'] = plot_inputs['selection'].copy()
+                inputs['selection'][iter_axis] = value
+                try:
+                    lazy_data.append(self._data.get_lazy_raster_data(inputs))
+                    iter_inputs.append(inputs)
+                except RuntimeError as e:
+                    self._logger.info("Iteration plot for value %s failed: %s", str(value), str(e))
+
+            if not iter_inputs:
                 continue
+            if last_inputs is None:
+                # Chunk reads are similar for each iteration; report them once
+                self._log_chunk_report(iter_inputs[0])
+            last_inputs = iter_inputs[-1]
+
+            raster_data_list = self._data.compute_raster_data(lazy_data)
+            for inputs, raster_data in zip(iter_inputs, raster_data_list):
+                value = inputs['selection'][iter_axis]
+                if raster_data is None:
+                    self._logger.info("Iteration plot for value %s failed: %s", str(value),
+                        "raster plane selection yielded data with all nan values.")
+                    continue
+                try:
+                    self._add_plot(self._make_plot(raster_data, inputs))
+                except RuntimeError as e:
+                    self._logger.info("Iteration plot for value %s failed: %s", str(value), str(e))
+
+        # Keep inputs of last iteration, as when iterations are plotted in sequence
+        if last_inputs is not None:
+            plot_inputs.update(last_inputs)
 
     def _init_plot(self, plot_inputs):
         ''' Apply automatic selection '''
@@ -290,59 +431,51 @@ class MsRaster(MsPlot):
             plot_inputs['selection']['spw_name'] = first_spw
 
     def _set_auto_color_range(self, plot_inputs):
-        ''' Calculate stats for color limits for non-gui amplitude plots. '''
+        ''' Calculate color limits from data percentiles for auto color mode. '''
         color_mode = plot_inputs['color_mode']
         color_limits = None
 
         if color_mode == 'auto':
-            if plot_inputs['vis_axis']=='amp' and not plot_inputs['aggregator']:
-                # For amplitude, limit colorbar range using stored per-spw ms stats
+            if not plot_inputs['aggregator']:
+                # Limit colorbar range using stored per-spw limits
+                vis_axis = plot_inputs['vis_axis']
                 spw_name = plot_inputs['selection']['spw_name']
-                if spw_name in self._spw_color_limits:
-                    color_limits = self._spw_color_limits[spw_name]
+                color_sample = plot_inputs.get('color_sample')
+                limits_key = (spw_name, plot_inputs['selection']['data_group_name'], vis_axis, color_sample)
+                if limits_key in self._spw_color_limits:
+                    color_limits = self._spw_color_limits[limits_key]
                 else:
                     # Select spw name and data group only
                     spw_data_selection = {'spw_name': spw_name, 'data_group_name': plot_inputs['selection']['data_group_name']}
-                    color_limits = self._calc_amp_color_limits(spw_data_selection)
-                    self._spw_color_limits[spw_name] = color_limits
+                    color_limits = self._calc_color_limits(spw_data_selection, vis_axis, color_sample)
+                    self._spw_color_limits[limits_key] = color_limits
         plot_inputs['auto_color_range'] = color_limits
 
         if color_limits:
-            self._logger.info("Setting amplitude color range: (%.4f, %.4f).", color_limits[0], color_limits[1])
+            self._logger.info("Setting %s color range: (%.4f, %.4f).", plot_inputs['vis_axis'], color_limits[0], color_limits[1])
         elif color_mode is None:
             self._logger.info("Autoscale color range")
         else:
             self._logger.info("Using manual color range: %s", plot_inputs['color_range'])
 
-    def _calc_amp_color_limits(self, selection):
-        # Calculate colorbar limits from amplitude stats for unflagged data in selected spw
-        self._logger.info("Calculating stats for colorbar limits.")
+    def _calc_color_limits(self, selection, vis_axis, sample_fraction=None):
+        # Calculate colorbar limits from percentiles of unflagged data in selected spw
+        self._logger.info("Calculating %s percentiles for colorbar limits.", vis_axis)
         start = time.time()
 
-        ms_stats = self._data.get_vis_stats(selection, 'amp')
-        self._spw_stats['spw_name'] = ms_stats
-        if not ms_stats:
-            return None # autoscale
-
-        min_val, max_val, mean, std = ms_stats
-
-        data_min = min(0.0, min_val)
-        clip_min = max(data_min, mean - (3.0 * std))
-        data_max = max(0.0, max_val)
-        clip_max = min(data_max, mean + (3.0 * std))
-
-        if clip_min == 0.0 and clip_max == 0.0:
-            color_limits = None # flagged data only
-        else:
-            color_limits = (clip_min, clip_max)
+        quantiles = [percentile / 100.0 for percentile in AUTO_COLOR_PERCENTILES]
+        limits = self._data.get_vis_quantiles(selection, vis_axis, quantiles, sample_fraction)
         self._logger.debug("Stats elapsed time: %.2fs.", time.time() - start)
-        return color_limits
+        if not limits or limits[0] == limits[1]:
+            return None # autoscale: flagged data only or constant data
+        return tuple(limits)
 
     def _reset_plot(self, clear_plots=True):
         ''' Reset any plot settings for a new plot '''
         # Clear plot list
         if clear_plots:
             super().clear_plots()
+            self._overview_pixels = None
 
         # Reset selection in data and dim selection in plot inputs
         super().clear_selection()
@@ -475,13 +608,20 @@ class MsRaster(MsPlot):
         gui_plot = None
 
         style_inputs = self._raster_plot.get_plot_params()['style']
-        if self._inputs_changed(style_inputs):
-            # First plot or changed plot
+        if self._last_plot_partial or self._inputs_changed(style_inputs):
+            # First plot, changed plot, or plot again with converted data
+            self._last_plot_partial = False
             try:
-                # Check inputs from GUI then plot
+                # Convert MSv2 data needed for selection, check inputs from GUI, then plot
+                if self._data.update_conversion(self._plot_inputs.get('selection'), wait=False):
+                    self._ms_info['data_dims'] = self._data.get_data_dimensions()
+                    self._spw_color_limits.clear() # may have been computed with partial data
+                    self._update_gui_axis_options()
                 self._plot_inputs['data_dims'] = self._ms_info['data_dims']
                 check_inputs(self._plot_inputs)
                 gui_plot = self._do_gui_plot()
+                if gui_plot is not self._empty_plot:
+                    self._last_plot_partial = self._notify_partial_conversion()
             except (ValueError, TypeError) as e:
                 # Clear plot, inputs invalid
                 self._notify(str(e), 'error', 0)
@@ -510,6 +650,16 @@ class MsRaster(MsPlot):
 
         return gui_plot
 
+    def _notify_partial_conversion(self):
+        ''' Warn user if MSv2 conversion of plotted spw is in progress: plot, stats, and color limits use partial data.
+            Returns whether plot is partial. '''
+        spw_name = self._plot_inputs['selection'].get('spw_name')
+        if spw_name and not self._data.is_conversion_complete({'spw_name': spw_name}):
+            self._notify(f"Plot shows partial data: MSv2 conversion of spw {spw_name} is in progress. "
+                "Click Plot again to update the plot with converted data.", 'warning', 0)
+            return True
+        return False
+
     def _inputs_changed(self, style_inputs):
         ''' Check if inputs changed and need new plot '''
         if not self._last_plot_inputs:
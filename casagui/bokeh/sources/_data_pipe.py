@@ -40,7 +40,7 @@ from bokeh.util.compiler import TypeScript
 from bokeh.core.properties import Tuple, String, Int, Instance, Nullable
 from bokeh.models.callbacks import Callback
 
-from ...utils import serialize, deserialize
+from ...utils import serialize, serialize_binary, deserialize
 from ..state import casalib_url, casaguijs_url
 
 class DataPipe(DataSource):
@@ -61,6 +61,11 @@ class DataPipe(DataSource):
         this javascript is run when this DataPipe object is initialized. init_script
         is used to run caller JavaScript which needs to be run at initialization time.
         This is optional and does not need to be set.
+    binary: bool
+        if true and the JavaScript side advertises support when the connection is
+        initialized, messages sent to JavaScript use binary frames where arrays are
+        sent as raw buffers instead of base64 encoded JSON strings (see
+        ``casagui.utils.serialize_binary``)
     """
 
     init_script = Nullable(Instance(Callback), help="""
@@ -71,7 +76,7 @@ class DataPipe(DataSource):
 
     __javascript__ = [ casalib_url( ), casaguijs_url( ) ]
 
-    def __init__( self, *args, abort=None, **kwargs ):
+    def __init__( self, *args, abort=None, binary=True, **kwargs ):
         super( ).__init__( *args, **kwargs )
         self.__send_queue = { }
         self.__pending = { }
@@ -80,10 +85,19 @@ class DataPipe(DataSource):
         self.__lock = threading.Lock( )
         self.__session = None
         self.__abort = abort
+        self.__allow_binary = binary
+        self.__binary = False                   ### negotiated when the session is initialized
 
         if self.__abort is not None and not callable(self.__abort):
                 raise RuntimeError(f'abort function must be callable ({type(self.__abort)} is not)')
 
+    async def __send( self, websocket, msg ):
+        ### binary frames are only used if the JavaScript side has indicated support
+        if self.__binary:
+            await websocket.send( serialize_binary( msg ) )
+        else:
+            await websocket.send( serialize( msg ) )
+
     def __enqueue_send( self, ident, msg, callback ):
         ### it is assumed that this is called AFTER the lock has been aquired
         if ident in self.__send_queue:
@@ -101,7 +115,7 @@ class DataPipe(DataSource):
         ## until the javascript reply is received...
         if ident in self.__pending:
             if self.__websocket is not None:
-                await self.__websocket.send( { 'id': '', 'message': 'queueing callback, but already one callback waiting', 'direction': 'error' } )
+                await self.__send( self.__websocket, { 'id': '', 'message': 'queueing callback, but already one callback waiting', 'direction': 'error' } )
         else:
             self.__pending[ident] = callback
 
@@ -158,10 +172,10 @@ class DataPipe(DataSource):
                         self.__enqueue_send( ident, msg, callback )
                         existing = self.__dequeue_send(ident)
                         self.__put_pending(ident, existing['cb'])
-                        await self.__websocket.send(serialize( existing['msg'] ))
+                        await self.__send( self.__websocket, existing['msg'] )
                     else:
                         await self.__put_pending(ident, callback)
-                        await self.__websocket.send(serialize( msg ))
+                        await self.__send( self.__websocket, msg )
 
     async def process_messages( self, websocket ):
         """Process messages related to image display updates.
@@ -200,11 +214,16 @@ class DataPipe(DataSource):
                     ###
                     if self.__session == None:
                         self.__session = msg['session']
+                    if msg['id'] == 'initialize':
+                        ###
+                        ### JavaScript indicates whether it can decode binary frames
+                        ###
+                        self.__binary = self.__allow_binary and bool(msg.get('binary', False))
                     if msg['direction'] == 'p2j':
                         cb = self.__get_pending(msg['id'])
                         outgo = self.__dequeue_send(msg['id'])
                         if outgo is not None:
-                            await websocket.send(serialize(outgo['msg']))
+                            await self.__send( websocket, outgo['msg'] )
                             await self.__put_pending(msg['id'],outgo['cb'])
                         if cb is not None:
                             if inspect.isawaitable(cb):
@@ -222,9 +241,9 @@ class DataPipe(DataSource):
                             try:
                                 return_message = "an exception occurred in creating the respone"
                                 return_message = await result
-                                await self.__websocket.send( serialize( { 'id': msg['id'],
-                                                                          'message': return_message,
-                                                                          'direction': msg['direction'] } ) )
+                                await self.__send( self.__websocket, { 'id': msg['id'],
+                                                                      'message': return_message,
+                                                                      'direction': msg['direction'] } )
                             except Exception as e:
                                 trace_back = traceback.format_exc().replace('\n','\n                       ')
                                 print('************************************************************************************************************************')
@@ -232,16 +251,16 @@ class DataPipe(DataSource):
                                 print( f'''              MESSAGE: {repr(msg)}''' )
                                 print( f'''          STACK TRACE: {trace_back}''' )
                                 print('************************************************************************************************************************')
-                                await self.__websocket.send( serialize( { 'id': msg['id'],
-                                                                          'message': { 'error': "exception encountered",
-                                                                                       'errant': str(return_message),
-                                                                                       'exception': repr(e) },
-                                                                          'direction': str(msg['direction']) } ) )
+                                await self.__send( self.__websocket, { 'id': msg['id'],
+                                                                      'message': { 'error': "exception encountered",
+                                                                                   'errant': str(return_message),
+                                                                                   'exception': repr(e) },
+                                                                      'direction': str(msg['direction']) } )
                         else:
                             try:
-                                await self.__websocket.send( serialize( { 'id': msg['id'],
-                                                                          'message': result,
-                                                                          'direction': msg['direction'] } ) )
+                                await self.__send( self.__websocket, { 'id': msg['id'],
+                                                                      'message': result,
+                                                                      'direction': msg['direction'] } )
                             except Exception as e:
                                 trace_back = traceback.format_exc().replace('\n','\n                       ')
                                 print('************************************************************************************************************************')
@@ -249,10 +268,10 @@ class DataPipe(DataSource):
                                 print( f'''              MESSAGE: {repr(msg)}''' )
                                 print( f'''          STACK TRACE: {trace_back}''' )
                                 print('************************************************************************************************************************')
-                                await self.__websocket.send( serialize( { 'id': msg['id'],
-                                                                          'message': { 'error': "exception encountered",
-                                                                                       'errant': str(result),
-                                                                                       'exception': repr(e) },
-                                                                          'direction': str(msg['direction']) } ) )
+                                await self.__send( self.__websocket, { 'id': msg['id'],
+                                                                      'message': { 'error': "exception encountered",
+                                                                                   'errant': str(result),
+                                                                                   'exception': repr(e) },
+                                                                      'direction': str(msg['direction']) } )
         finally:
             self.__websocket = None
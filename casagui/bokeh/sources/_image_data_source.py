@@ -34,6 +34,7 @@ from bokeh.core.properties import Instance, Tuple, Int, Nullable
 from bokeh.models.callbacks import Callback
 from ._image_pipe import ImagePipe
 from ..state import casalib_url, casaguijs_url
+from ...utils import block_reduce
 
 class ImageDataSource(ColumnDataSource):
     """Implementation of a ``ColumnDataSource`` customized for planes from
@@ -45,6 +46,13 @@ class ImageDataSource(ColumnDataSource):
     ----------
     image_source: ImagePipe
         the conduit for updating the channel/plane from the image cube
+    tiles: bool
+        if true the channel is displayed with tiles (see ``ImagePipe.tile_url``) so
+        only the tile version is embedded instead of the initial channel
+    view_size: tuple of int or None
+        ( width, height ) in screen pixels of the initial display of the whole channel,
+        used to choose the resolution of the embedded initial channel and masks (see
+        ``ImagePipe.decimation_factor``)
     """
 
     init_script = Nullable(Instance(Callback), help="""
@@ -58,18 +66,38 @@ class ImageDataSource(ColumnDataSource):
     ''')
     num_chans = Tuple( Int, Int, help="[ num-stokes-planes, num-channels ]" )
     cur_chan  = Tuple( Int, Int, help="[ num-stokes-planes, num-channels ]" )
+    max_level = Int( 0, help="log2 of the largest decimation factor (see ImagePipe.max_decimation_factor)" )
 
     __javascript__ = [ casalib_url( ), casaguijs_url( ) ]
 
-    def __init__( self, *args, **kwargs ):
+    ###
+    ### screen size assumed for the initial display when no view_size is given, e.g.
+    ### when the plot is sized by the browser
+    ###
+    _initial_view_pixels = 1024
+
+    def __init__( self, *args, tiles=False, view_size=None, **kwargs ):
         super( ).__init__( *args, **kwargs )
+        ###
+        ### the initial channel is embedded at the resolution needed to display the whole
+        ### channel in view_size screen pixels, once the browser has laid out the plot it
+        ### reports the actual view (see ImageDataSource.update_view) and the channel is
+        ### only requested again if a different resolution is needed
+        ###
+        shape = self.image_source.shape
+        width, height = view_size if view_size else ( self._initial_view_pixels, self._initial_view_pixels )
+        view = dict( x=[0, shape[0]], y=[0, shape[1]], width=width, height=height )
+        ### with tiles only the masks are embedded at the reduced resolution
+        factor = self.image_source.decimation_factor( view )
         mask0 = self.image_source.mask0( [0,0] )
-        self.data = { 'img': [ self.image_source.channel( [0,0], np.uint8 ) ],
-                      'msk0': [ mask0 if mask0 is not None else None ] }
+        image = { 'tile': [ self.image_source.tile_version( ) ] } if tiles else { 'img': [ self.image_source.channel( [0,0], np.uint8, view ) ] }
+        self.data = { **image,
+                      'msk0': [ block_reduce( mask0, factor, 'max' ) if mask0 is not None else None ] }
         if self.image_source.have_mask( ):
-            self.data['msk'] = [ self.image_source.mask( [0,0] ) ]
+            self.data['msk'] = [ block_reduce( self.image_source.mask( [0,0] ), factor, 'max' ) ]
         self.num_chans = list(self.image_source.shape[-2:])
         self.cur_chan  = [ 0, 0 ]
+        self.max_level = int(np.log2( self.image_source.max_decimation_factor( ) ))
 
     def mask_contour_source( self, data ):
         if not self._mask_contour_source:
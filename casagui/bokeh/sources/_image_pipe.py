@@ -29,30 +29,36 @@
 implementation for CASA images which allows for interacitve display
 of image cube channels in response to user input.'''
 
+import io
 import os
+import re
 import sys
 import json
+import time
 import asyncio
+import threading
 from uuid import uuid4
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 from . import DataPipe
 from bokeh.util.compiler import TypeScript
 from bokeh.core.properties import Tuple, String, Int, Instance, Nullable
 from bokeh.models.callbacks import Callback
 from bokeh.plotting import ColumnDataSource
-from ..state import casalib_url, casaguijs_url
+from ..state import casalib_url, casaguijs_url, find_palette, default_palette
 
 import numpy as np
+from matplotlib.image import imsave
 try:
     import casatools as ct
-    from casatools import regionmanager
     from casatools import image as imagetool
 except:
     ct = None
     from casagui.utils import warn_import
     warn_import('casatools')
 
-from ...utils import pack_arrays, partition, resource_manager, strip_arrays
+from ...utils import pack_arrays, partition, resource_manager, strip_arrays, PlaneCache, TMSTiles, block_reduce, find_ws_address
 
 class ImagePipe(DataPipe):
     """The `ImagePipe` allows for updates to Bokeh plots from a CASA or CNGI
@@ -73,10 +79,32 @@ class ImagePipe(DataPipe):
         this javascript is run when this DataPipe object is initialized. init_script
         is used to run caller JavaScript which needs to be run at initialization time.
         This is optional and does not need to be set.
+    cache_size: int
+        upper limit in bytes for the image planes cached in memory
+    prefetch: int
+        number of channels in the direction the user is moving through the cube which
+        are loaded in the background, zero disables prefetching
+    check_interval: float or None
+        minimum number of seconds between scans of the image directory for changes made
+        on disk, ``None`` disables scanning and only ``image_modified( )`` invalidates
+        the cached planes
+    decimation: str or None
+        how image pixels are combined when a channel is requested for a view which is
+        smaller than the image, ``'mean'`` or ``'max'``; ``None`` always sends the full
+        resolution channel
+    tile_cache_size: int
+        maximum number of rendered PNG tiles which are kept (see ``tile``)
     """
     __im_path = None
     __im = None
     __chan_shape = None
+    __plane_cache = None
+    __tile_server = None
+    ### upper limit for the size of the blocks of channels read and written
+    ### when the whole mask cube is modified
+    __mask_chunk_bytes = 256*1024*1024
+    ### number of bins used to quantize pixels (see __quantize)
+    __quant_bins = 254
 
     shape = Tuple( Int, Int, Int, Int, help="shape: [ RA, DEC, Stokes, Spectral ]" )
     dataid = String( )
@@ -92,7 +120,6 @@ class ImagePipe(DataPipe):
             self.__img.close( )
             self.__stokes_labels = None
         self.__img = imagetool( )
-        self.__rgn = regionmanager( )
         try:
             self.__img.open(image)
             self.__image_path = image
@@ -143,39 +170,239 @@ class ImagePipe(DataPipe):
             self.__stokes_labels = self.__img.coordsys( ).stokes( )
         return self.__stokes_labels
 
-    def __get_chan( self, index ):
-        def newest_ctime( path ):
-            files = os.listdir(path)
-            paths = [os.path.join(path, basename) for basename in files]
-            return max( map( os.path.getctime, paths ) )
-
-        image_ctime = newest_ctime( self.__image_path )
-        if image_ctime > self.__cached_chan_ctime or \
-           self.__cached_chan_index[0] != index[0] or \
-           self.__cached_chan_index[1] != index[1] or \
-           self.__cached_chan is None :
+    def __fetch_chan( self, index ):
+        ### called from both the websocket thread and the plane cache prefetch thread
+        with self.__img_lock:
             if self.__img is None:
                 raise RuntimeError('no image is available')
-            ###
-            ### ensure that the channel index is within cube shape
-            ###
-            index = list(index)     # index is potentially a python tuple
-            index[0] = min( index[0], self.__chan_shape[0] - 1 )
-            index[1] = min( index[1], self.__chan_shape[1] - 1 )
-            index[0] = max( index[0], 0 )
-            index[1] = max( index[1], 0 )
-            self.__cached_chan_index = index
-            self.__cached_chan_ctime = image_ctime
-            self.__cached_chan = self.__img.getchunk( blc=[0,0] + index,
-                                                      trc=self.__chan_shape + index )
-        return self.__cached_chan
+            return self.__img.getchunk( blc=[0,0] + index, trc=self.__chan_shape + index )
+
+    def image_modified( self ):
+        """Signal that the image on disk has been modified, e.g. by a major cycle
+        run by ``tclean``. All cached planes are discarded and the image generation
+        is incremented. Callers which modify the image should use this instead of
+        relying upon the (throttled) directory scan.
+        """
+        self.__generation += 1
+
+    def generation( self ):
+        """Return the image generation. This is an integer which is incremented
+        each time the image is known to have changed. Checking it is O(1) except
+        when the ``check_interval`` has expired, in which case the image directory
+        is scanned for files whose change time is newer than the last scan.
+        """
+        def newest_ctime( path ):
+            with os.scandir(path) as entries:
+                return max( (e.stat( ).st_ctime for e in entries), default=0 )
+
+        if self.__check_interval is not None:
+            now = time.monotonic( )
+            if now - self.__last_check >= self.__check_interval:
+                self.__last_check = now
+                image_ctime = newest_ctime( self.__image_path )
+                if self.__image_ctime is not None and image_ctime > self.__image_ctime:
+                    self.__generation += 1
+                self.__image_ctime = image_ctime
+        return self.__generation
+
+    def __clamp_index( self, index ):
+        ###
+        ### ensure that the channel index is within cube shape
+        ###
+        index = list(index)     # index is potentially a python tuple
+        index[0] = min( index[0], self.shape[2] - 1 )
+        index[1] = min( index[1], self.shape[3] - 1 )
+        index[0] = max( index[0], 0 )
+        index[1] = max( index[1], 0 )
+        return index
+
+    def __get_chan( self, index ):
+        if self.__img is None:
+            raise RuntimeError('no image is available')
+        index = self.__clamp_index( index )
+
+        generation = self.generation( )
+        if generation != self.__cached_generation:
+            ### image has been modified on disk so all cached planes are stale
+            self.__plane_cache.clear( )
+            self.__cached_generation = generation
+        return self.__plane_cache.get( index )
+
+    def analysis( self, index ):
+        """Return the summary of one channel which is shared by quantization, the
+        colormap adjustment histogram and the statistics table. It is computed once
+        from the finite pixels of the cached plane and then kept with the plane (so
+        it is discarded when the plane is evicted or the image changes).
+
+        Parameters
+        ----------
+        index: [ int, int ]
+            list containing first the ''stokes'' index and second the ''channel'' index
+
+        Returns
+        -------
+        dict:
+            ``min``, ``max``, ``minpos``, ``maxpos`` (flat index in first-axis-fastest order),
+            ``npts``, ``sum``, ``sumsq``, ``m2`` (sum of squared differences from the mean),
+            ``all_finite``, ``hist`` (counts and bin edges, with as many bins as the histogram
+            source or 256 if there is no histogram source) and ``quant_edges`` (bin edges used
+            to quantize pixels in the range of the channel)
+        """
+        index = self.__clamp_index( index )
+        plane = np.squeeze( self.__get_chan(index) )
+        extras = self.__plane_cache.extras( index )
+        if extras is not None and 'analysis' in extras:
+            return extras['analysis']
+
+        flat = plane.ravel(order='F')
+        finite = np.isfinite(flat)
+        all_finite = bool(finite.all( ))
+        values = flat if all_finite else flat[finite]
+        if len(values) == 0:
+            result = { 'min': 0.0, 'max': 0.0, 'minpos': 0, 'maxpos': 0, 'npts': 0, 'sum': 0.0, 'sumsq': 0.0,
+                       'm2': 0.0, 'all_finite': all_finite,
+                       'hist': ( np.zeros(1, dtype=np.int64), np.array([0.0, 0.0]) ),
+                       'quant_edges': self.__quant_edges( 0.0, 0.0 ) }
+        else:
+            positions = None if all_finite else np.flatnonzero(finite)
+            imin, imax = int(np.argmin(values)), int(np.argmax(values))
+            amin, amax = float(values[imin]), float(values[imax])
+            wide = values.astype(np.float64, copy=False)
+            nbins = len(self._histogram_source.data['top']) if self._histogram_source else 256
+            counts, edges = np.histogram( values, bins=nbins, range=( amin, amax ) )
+            total = float(wide.sum( ))
+            result = { 'min': amin, 'max': amax,
+                       'minpos': imin if positions is None else int(positions[imin]),
+                       'maxpos': imax if positions is None else int(positions[imax]),
+                       'npts': len(values), 'sum': total,
+                       'sumsq': float(np.dot( wide, wide )), 'm2': self.__sum_squared_deviations( wide, total ),
+                       'all_finite': all_finite, 'hist': ( counts, edges ),
+                       'quant_edges': self.__quant_edges( amin, amax ) }
+        if extras is not None:
+            extras['analysis'] = result
+        return result
+
+    def decimation_factor( self, view ):
+        """Determine how many image pixels (along each axis) should be combined into
+        one pixel for display in ``view``. The factor is a power of two which matches
+        the ``units_per_pixel`` of one of the ``TMSTiles`` zoom levels for this image,
+        and it is one (full resolution) when the view is zoomed in far enough that each
+        image pixel covers at least half of a screen pixel.
+
+        Parameters
+        ----------
+        view: dict or None
+            dictionary with ``x`` and ``y`` (visible range in image pixels as two element
+            lists) and ``width`` and ``height`` (screen pixel dimensions of the view)
+        """
+        if view is None or self.__decimation is None:
+            return 1
+        try:
+            upp = min( (view['x'][1] - view['x'][0]) / max( view['width'], 1 ),
+                       (view['y'][1] - view['y'][0]) / max( view['height'], 1 ) )
+        except (KeyError, IndexError, TypeError):
+            return 1
+        tiling = self.tiling( )
+        return tiling.units_per_pixel( tiling.zoom_for_resolution( upp ) )
+
+    def max_decimation_factor( self ):
+        """The largest factor returned by ``decimation_factor``, i.e. the ``units_per_pixel``
+        of the coarsest ``TMSTiles`` zoom level (one if channels are not decimated)."""
+        if self.__decimation is None:
+            return 1
+        tiling = self.tiling( )
+        return tiling.units_per_pixel( tiling.zoom_levels( )[0] )
+
+    @staticmethod
+    def __sum_squared_deviations( values, total ):
+        ### second pass over the float64 values, sumsq - sum * mean loses precision
+        ### when the mean is large compared to the spread
+        deviations = values - total / len(values)
+        return float(np.dot( deviations, deviations ))
 
     ### ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ----
     ### the element type of image pixels retrieved from the CASA image are float64, but it
     ### seems like 256 is the greatest number of colors in the colormaps currrently used
     ### for pseudo color within interactive clean...
     ### ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ---- ----
-    def channel( self, index, pixel_type ):
+    @classmethod
+    def __quant_edges( cls, umin, umax ):
+        ### quantization bins depend only on the range, not on the pixels
+        return np.histogram_bin_edges( np.empty(0), bins=cls.__quant_bins, range=( umin, umax ) )
+
+    def __quantize( self, nptype, image_plane, amin=None, amax=None, edges=None ):
+        ### amin/amax allow a portion of a channel (e.g. a tile) to be quantized using the
+        ### range of the whole channel so that colors are consistent across the channel;
+        ### edges are the bin edges for ( amin, amax ) from the plane analysis
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        ### Note:
+        ###    (1) the histogram sent to GUI is ALWAYS be histogram based on the raw image (THIS IS HANDLED ABOVE)
+        ###    (2) the scaled portion of the matrix should be the non-cropped portion
+        ###    (3) the lower cropped portion should be set to the min scaled value
+        ###    (4) the upper cropped portion should be set to the max scaled value
+        ###    (5) a histogram should be created with the resulting (completely filled) array
+        ###    (6) then this histogram should be used with the (completely filled) array with numpy.digitize( ) to create
+        ###        the uint8 array
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        exclude_below = None
+        exclude_above = None
+        included = None
+
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        ### Sort out the relationship between channel min/max and user specified min/max
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        if amin is None: amin = image_plane.min( )          ## array min
+        if amax is None: amax = image_plane.max( )          ## array max
+        rg = [ amin if len(self.__quant_adjustments['bounds'][0]) == 0 else self.__quant_adjustments['bounds'][0][0],
+               amax if len(self.__quant_adjustments['bounds'][1]) == 0 else self.__quant_adjustments['bounds'][1][0] ]
+        umin = min(rg)                      ## user specified min
+        umax = max(rg)                      ## user specified max
+        if umin > amin:
+            ## elements that are masked to the minumum color for the image
+            exclude_below = image_plane < umin
+        if umax < amax:
+            ## elements that are masked to the maximum color for the image
+            exclude_above = image_plane > umax
+
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        ### Set up access masks
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        if exclude_below is not None and exclude_above is not None:
+            included = np.logical_not( np.logical_or( exclude_below, exclude_above ) )
+        elif exclude_below is not None:
+            included = np.logical_not( exclude_below )
+        elif exclude_above is not None:
+            included = np.logical_not( exclude_above )
+
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        ### Apply the scaling function to the included pixels
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        selected_scaling = self.__quant_adjustments['transfer']['scaling']
+        if selected_scaling != 'linear':
+            if selected_scaling not in self.__quant_scaling:
+                print( f'''error: ${selected_scaling} is not a known scaling...''', file=sys.stderr )
+                result = image_plane
+            else:
+                normalize = 0 if umin > 0 else -umin
+                result = np.ma.zeros(image_plane.shape,image_plane.dtype)
+                result[included] = self.__quant_scaling[selected_scaling]( image_plane[included]+normalize if included is not None else image_plane+normalize,
+                                                                           **self.__quant_adjustments['transfer']['args'] )
+                if exclude_below is not None:
+                    result[exclude_below] = result[included].min( )
+                if exclude_above is not None:
+                    result[exclude_above] = result[included].max( )
+        else:
+            result = image_plane
+
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        ### Histogram of the scaled
+        ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
+        if edges is None or ( umin, umax ) != ( amin, amax ):
+            edges = self.__quant_edges( umin, umax )
+
+        return np.digitize( result, edges, right=True ).astype(nptype)
+
+    def channel( self, index, pixel_type, view=None ):
         """Retrieve one channel from the image cube. The `index` should be a
         two element list of integers. The first integer is the ''stokes'' axis
         in the image cube. The second integer is the ''channel'' axis in the
@@ -187,82 +414,174 @@ class ImagePipe(DataPipe):
             list containing first the ''stokes'' index and second the ''channel'' index
         pixel_type: numpy type
             the numpy type for the pixel elements of the returned channel
+        view: dict or None
+            visible range and screen size of the display (see ``decimation_factor``),
+            if supplied the channel is reduced in resolution to match the display
+            otherwise the full resolution channel is returned
         """
-        def quantize( nptype, image_plane ):
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            ### Note:
-            ###    (1) the histogram sent to GUI is ALWAYS be histogram based on the raw image (THIS IS HANDLED ABOVE)
-            ###    (2) the scaled portion of the matrix should be the non-cropped portion
-            ###    (3) the lower cropped portion should be set to the min scaled value
-            ###    (4) the upper cropped portion should be set to the max scaled value
-            ###    (5) a histogram should be created with the resulting (completely filled) array
-            ###    (6) then this histogram should be used with the (completely filled) array with numpy.digitize( ) to create
-            ###        the uint8 array
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            exclude_below = None
-            exclude_above = None
-            included = None
-
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            ### Sort out the relationship between channel min/max and user specified min/max
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            amin = image_plane.min( )           ## array min
-            amax = image_plane.max( )           ## array max
-            rg = [ amin if len(self.__quant_adjustments['bounds'][0]) == 0 else self.__quant_adjustments['bounds'][0][0],
-                   amax if len(self.__quant_adjustments['bounds'][1]) == 0 else self.__quant_adjustments['bounds'][1][0] ]
-            umin = min(rg)                      ## user specified min
-            umax = max(rg)                      ## user specified max
-            if umin > amin:
-                ## elements that are masked to the minumum color for the image
-                exclude_below = image_plane < umin
-            if umax < amax:
-                ## elements that are masked to the maximum color for the image
-                exclude_above = image_plane > umax
-
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            ### Set up access masks
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            if exclude_below is not None and exclude_above is not None:
-                included = np.logical_not( np.logical_or( exclude_below, exclude_above ) )
-            elif exclude_below is not None:
-                included = np.logical_not( exclude_below )
-            elif exclude_above is not None:
-                included = np.logical_not( exclude_above )
-
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            ### Apply the scaling function to the included pixels
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            selected_scaling = self.__quant_adjustments['transfer']['scaling']
-            if selected_scaling != 'linear':
-                if selected_scaling not in self.__quant_scaling:
-                    print( f'''error: ${selected_scaling} is not a known scaling...''', file=sys.stderr )
-                    result = image_plane
-                else:
-                    normalize = 0 if umin > 0 else -umin
-                    result = np.ma.zeros(image_plane.shape,image_plane.dtype)
-                    result[included] = self.__quant_scaling[selected_scaling]( image_plane[included]+normalize if included is not None else image_plane+normalize,
-                                                                               **self.__quant_adjustments['transfer']['args'] )
-                    if exclude_below is not None:
-                        result[exclude_below] = result[included].min( )
-                    if exclude_above is not None:
-                        result[exclude_above] = result[included].max( )
-            else:
-                result = image_plane
-
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            ### Histogram of the scaled
-            ### --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-            edges = np.histogram_bin_edges( result, bins=254, range=( umin, umax ) )
-
-            return np.digitize( result, edges, right=True ).astype(nptype)
-
         if self.__img is None:
             raise RuntimeError('no image is available')
+        plane = block_reduce( np.squeeze( self.__get_chan(index) ), self.decimation_factor( view ), self.__decimation )
         if np.issubdtype( pixel_type, np.integer ):
-            return quantize( pixel_type,
-                             np.squeeze( self.__get_chan(index) ) ).transpose( )
+            ### full resolution range so colors do not shift with the decimation factor
+            summary = self.analysis( index )
+            return self.__quantize( pixel_type, plane, summary['min'], summary['max'], summary['quant_edges'] ).transpose( )
         else:
-            return np.squeeze( self.__get_chan(index) ).astype(pixel_type).transpose( )
+            return plane.astype(pixel_type).transpose( )
+
+    def tiling( self ):
+        """Return the ``TMSTiles`` object which describes the TMS tiling of the image planes."""
+        if self.__tiles is None:
+            self.__tiles = TMSTiles( self.shape[0:2] )
+        return self.__tiles
+
+    def tile( self, index, z, x, y, palette=None ):
+        """Render one 256x256 TMS tile of a channel as a PNG image. The tile extents come
+        from ``TMSTiles`` so they match a Bokeh ``TMSTileSource`` whose ``initial_resolution``
+        is ``tiling( ).units_per_pixel(0)``. Pixels are block averaged for zoom levels below
+        the native resolution, and quantization uses the range of the whole channel so that
+        the colors of adjacent tiles agree. Rendered tiles are cached.
+
+        Parameters
+        ----------
+        index: [ int, int ]
+            list containing first the ''stokes'' index and second the ''channel'' index
+        z: int
+            zoom level
+        x: int
+            tile column
+        y: int
+            tile row (TMS rows increase from the bottom of the image)
+        palette: str or None
+            name of the palette used to color the tile (see ``available_palettes``)
+
+        Returns
+        -------
+        bytes:
+            PNG encoded tile
+        """
+        tiling = self.tiling( )
+        if tiling.tile( z, x, y ) is None:
+            raise RuntimeError(f'tile ({z},{x},{y}) does not exist')
+        if palette is None:
+            palette = default_palette( )
+
+        index = self.__clamp_index( index )
+        key = ( tuple(index), int(z), int(x), int(y), palette, self.__quant_version, self.generation( ) )
+        with self.__tile_lock:
+            if key in self.__tile_cache:
+                self.__tile_cache.move_to_end(key)
+                return self.__tile_cache[key]
+
+        colors = find_palette( palette )
+        if colors is None:
+            raise RuntimeError(f'unknown palette: {palette}')
+        plane = np.squeeze( self.__get_chan(index) )
+        summary = self.analysis( index )
+
+        ###
+        ### image pixel and TMS tile indexes both have their origin at the bottom left
+        ###
+        tile_size = tiling.tile_size( )
+        units = tiling.units_per_pixel( int(z) )
+        extent = tile_size * units
+        region = block_reduce( plane[ int(x) * extent:(int(x) + 1) * extent,
+                                     int(y) * extent:(int(y) + 1) * extent ], units, 'mean' )
+        quantized = self.__quantize( np.uint8, region, summary['min'], summary['max'], summary['quant_edges'] )
+
+        ###
+        ### PNG rows start at the top, the part of a tile beyond the image edge is transparent
+        ###
+        lut = np.array( [ [ int(c[i:i+2], 16) for i in (1, 3, 5) ] + [ 255 ] for c in colors ], dtype=np.uint8 )
+        rgba = np.zeros( ( tile_size, tile_size, 4 ), dtype=np.uint8 )
+        w, h = quantized.shape
+        rgba[ tile_size-h:, :w ] = lut[ quantized.T[::-1] ]
+        buf = io.BytesIO( )
+        imsave( buf, rgba, format='png' )
+        result = buf.getvalue( )
+
+        with self.__tile_lock:
+            self.__tile_cache[key] = result
+            while len(self.__tile_cache) > self.__tile_cache_size:
+                self.__tile_cache.popitem(last=False)
+        return result
+
+    def tile_url( self, address='127.0.0.1', origins=None ):
+        """Start the HTTP server which provides the tiles rendered by ``tile`` (if it is not
+        already running) and return the URL template for a Bokeh ``TMSTileSource``. Along with
+        Bokeh's ``{X}``, ``{Y}`` and ``{Z}``, the template uses ``{S}`` (stokes index), ``{C}``
+        (channel index), ``{P}`` (palette name) and ``{V}`` (see ``tile_version``) which must
+        be supplied with the ``TMSTileSource`` ``extra_url_vars``.
+
+        The tile server listens on its own port (see ``tile_address``). When the GUI is
+        displayed on another host, this port must be forwarded along with the websocket
+        ports (e.g. ``ssh -L <port>:localhost:<port>``).
+
+        Parameters
+        ----------
+        address: str
+            network address for the tile server
+        origins: list of str or None
+            origins of the pages which display the Bokeh plot and are allowed to load tiles,
+            ``None`` allows pages loaded from files and from servers on the local host (which
+            includes ports forwarded from another host)
+        """
+        if self.__tile_server is None:
+            pipe = self
+            path_re = re.compile( r'^/(\d+)/(\d+)/([^/]+)/[^/]*/(\d+)/(\d+)/(\d+)\.png$' )
+            local_re = re.compile( r'^(null|https?://(localhost|127\.0\.0\.1|\[::1\])(:\d+)?)$' )
+            def allowed( origin ):
+                ### Bokeh loads tiles with crossOrigin="anonymous" so the browser always sends the origin
+                return local_re.match( origin ) is not None if origins is None else origin in origins
+            class TileRequestHandler( BaseHTTPRequestHandler ):
+                def do_GET( self ):
+                    origin = self.headers.get( 'Origin' )
+                    if origin is not None and not allowed( origin ):
+                        self.send_error( 403 )
+                        return
+                    match = path_re.match( self.path )
+                    if match is None:
+                        self.send_error( 404 )
+                        return
+                    stokes, chan, palette, z, x, y = match.groups( )
+                    try:
+                        png = pipe.tile( [ int(stokes), int(chan) ], int(z), int(x), int(y), palette )
+                    except Exception as e:
+                        self.send_error( 404, explain=str(e) )
+                        return
+                    self.send_response( 200 )
+                    self.send_header( 'Content-Type', 'image/png' )
+                    self.send_header( 'Content-Length', str(len(png)) )
+                    if origin is not None:
+                        self.send_header( 'Access-Control-Allow-Origin', origin )
+                        self.send_header( 'Vary', 'Origin' )
+                    self.end_headers( )
+                    self.wfile.write( png )
+                def log_message( self, *args ):
+                    pass
+            self.__tile_server = ThreadingHTTPServer( find_ws_address( address ), TileRequestHandler )
+            self.__tile_server.daemon_threads = True
+            threading.Thread( target=self.__tile_server.serve_forever, daemon=True ).start( )
+        host, port = self.tile_address( )
+        return f"http://{host}:{port}/{{S}}/{{C}}/{{P}}/{{V}}/{{Z}}/{{X}}/{{Y}}.png"
+
+    def tile_address( self ):
+        """Network address of the tile server started by ``tile_url``.
+
+        Returns
+        -------
+        tuple of str and int or None
+            address and port of the tile server, ``None`` if tiles are not being served
+        """
+        if self.__tile_server is None:
+            return None
+        return tuple(self.__tile_server.server_address[0:2])
+
+    def tile_version( self ):
+        """Version string for the ``{V}`` component of the ``tile_url`` template. It changes
+        whenever the image or the colormap adjustments change so that the browser does not
+        reuse tiles it has already loaded."""
+        return f"{self.generation( )}.{self.__quant_version}"
 
     def have_mask0( self ):
         """Check to see if the synthesis imaging 'mask0' mask exists
@@ -347,6 +666,7 @@ class ImagePipe(DataPipe):
     def set_mask_name( self, new_mask_path ):
         self.__close_mask( )
         self.__open_mask( new_mask_path )
+        self.__mask_generation += 1
 
     def put_mask( self, index, mask ):
         """Replace one channel mask with the mask specified as the second parameter.
@@ -371,6 +691,117 @@ class ImagePipe(DataPipe):
             self.__msk.putchunk( blc=[0,0] + index, pixels=mask.astype(np.uint8) )
         else:
             self.__msk.putchunk( blc=[0,0] + index, pixels=mask )
+        self.__mask_generation += 1
+
+    def mask_generation( self ):
+        """Return a counter which is incremented each time the mask cube is modified
+        through this ``ImagePipe``, it can be used to tell when values derived from
+        the mask are out of date."""
+        return self.__mask_generation
+
+    def __update_mask_cube( self, stokes, update, read=True, channels=None ):
+        ###
+        ### apply update( chunk, first_channel ) to the mask cube a block of channels
+        ### at a time, the chunk has the shape [ RA, DEC, 1, channels ] and is
+        ### modified in place, if 'read' is false the existing mask is not read,
+        ### 'channels' limits the update to a range of channels
+        ###
+        if self.__msk is None:
+            raise RuntimeError(f'cannot modify mask cube because no mask cube exists')
+        nx, ny, nstokes, nchan = self.shape
+        stokes_indexes = range(nstokes) if stokes is None else [ min( max( stokes, 0 ), nstokes - 1 ) ]
+        ### getchunk returns float64 pixels even though the mask cube is stored as float32
+        ### so the block size is based on the size of the chunks that are actually read
+        plane_bytes = nx * ny * np.dtype(np.float64).itemsize
+        step = max( 1, self.__mask_chunk_bytes // max( plane_bytes, 1 ) )
+        first, last = ( 0, nchan ) if channels is None else ( max( channels[0], 0 ), min( channels[1], nchan ) )
+        for s in stokes_indexes:
+            for c0 in range( first, last, step ):
+                c1 = min( c0 + step, last )
+                blc = [ 0, 0, s, c0 ]
+                if read:
+                    chunk = self.__msk.getchunk( blc=blc, trc=[ nx-1, ny-1, s, c1-1 ] )
+                else:
+                    chunk = np.zeros( ( nx, ny, 1, c1 - c0 ), dtype=np.float64 )
+                update( chunk, c0 )
+                self.__msk.putchunk( blc=blc, pixels=chunk.astype(np.uint8) if chunk.dtype == bool else chunk )
+        self.__mask_generation += 1
+
+    def fill_mask( self, value, stokes=None ):
+        """Set every pixel of the mask cube to ``value``. Only channels from the specified
+        stokes plane are modified if ``stokes`` is not ``None``.
+
+        Parameters
+        ----------
+        value: bool or number
+            value assigned to all mask pixels
+        stokes: int or None
+            stokes index of the channels to modify, if ``None`` all channels are modified
+        """
+        def fill( chunk, first ):
+            chunk[...] = value
+        self.__update_mask_cube( stokes, fill, read=False )
+
+    def set_mask_region( self, stokes, region, value ):
+        """Set the pixels selected by ``region`` to ``value`` in every channel of one stokes plane.
+
+        Parameters
+        ----------
+        stokes: int
+            stokes index of the channels to modify
+        region: numpy.ndarray
+            boolean array with the shape of one channel (indexed as ``[x, y]`` like the
+            masks returned by ``mask(..., True)``) which selects the pixels to set
+        value: bool or number
+            value assigned to the selected pixels
+        """
+        def assign( chunk, first ):
+            chunk[region] = value
+        self.__update_mask_cube( stokes, assign )
+
+    def combine_mask( self, stokes, source, action ):
+        """Add the mask of channel ``source`` to (``action='or'``) or subtract it from
+        (``action='andnot'``) every other channel of one stokes plane. The ``source``
+        channel itself is not modified.
+
+        Parameters
+        ----------
+        stokes: int
+            stokes index of the channels to modify
+        source: [ int, int ]
+            list containing first the ''stokes'' index and second the ''channel'' index
+            of the mask channel which is combined with the other channels
+        action: str
+            ``'or'`` to add the source mask, ``'andnot'`` to subtract it
+        """
+        if action not in ( 'or', 'andnot' ):
+            raise RuntimeError(f'unknown mask combination: {action}')
+        modifier = np.squeeze( self.__msk.getchunk( blc=[0,0] + list(source),
+                                                    trc=self.__chan_shape + list(source) ) ) != 0
+        def combine( chunk, first ):
+            keep = None
+            if source[0] == stokes and first <= source[1] < first + chunk.shape[3]:
+                keep = chunk[:,:,:,source[1] - first].copy( )
+            chunk[modifier] = 1 if action == 'or' else 0
+            if keep is not None:
+                chunk[:,:,:,source[1] - first] = keep
+        self.__update_mask_cube( stokes, combine )
+
+    def invert_mask( self, stokes, channel=None ):
+        """Invert the mask (non-zero pixels become zero and zero pixels become one) for
+        every channel of one stokes plane or for a single channel. The inversion is done
+        in place on each block of channels read from the mask cube.
+
+        Parameters
+        ----------
+        stokes: int
+            stokes index of the channels to modify
+        channel: int or None
+            index of the only channel to invert, if ``None`` all channels are inverted
+        """
+        def invert( chunk, first ):
+            np.equal( chunk, 0, out=chunk )
+        self.__update_mask_cube( stokes, invert, channels=None if channel is None else ( channel, channel + 1 ) )
 
     def spectrum( self, index, mask=False ):
         """Retrieve one spectrum from the image cube. The `index` should be a
@@ -393,8 +824,9 @@ class ImagePipe(DataPipe):
             raise RuntimeError('no image is available')
         result_mask = np.squeeze( self.__msk.getchunk( blc=index + [0],
                                                        trc=index + [self.shape[-1]] ) ) if self.__msk and mask else None
-        result = np.squeeze( self.__img.getchunk( blc=index + [0],
-                                                 trc=index + [self.shape[-1]] ) )
+        with self.__img_lock:
+            result = np.squeeze( self.__img.getchunk( blc=index + [0],
+                                                     trc=index + [self.shape[-1]] ) )
         ### should return spectral freq etc.
         ### here for X rather than just the index
         try:
@@ -418,22 +850,29 @@ class ImagePipe(DataPipe):
 
     async def _image_message_handler( self, cmd ):
         if cmd['action'] == 'channel':
-            chan = self.channel(cmd['index'],np.uint8)
-            mask = { } if self.__msk is None else { 'msk': [ pack_arrays( self.mask(cmd['index']) ) ] }
+            ### 'view' is included when the display may be smaller than the image
+            view = cmd.get('view')
+            factor = self.decimation_factor( view )
+            if self.__tile_server is None:
+                image = { 'img': [ pack_arrays( self.channel(cmd['index'],np.uint8,view) ) ] }
+            else:
+                ### the channel is displayed with tiles, the version tells the browser when to reload them
+                image = { 'tile': [ self.tile_version( ) ] }
+            mask = { } if self.__msk is None else { 'msk': [ pack_arrays( block_reduce( self.mask(cmd['index']), factor, 'max' ) ) ] }
             _mask0 = self.mask0(cmd['index'])
-            mask0 = { } if _mask0 is None else { 'msk0': [ pack_arrays(_mask0) ] }
+            mask0 = { } if _mask0 is None else { 'msk0': [ pack_arrays( block_reduce( _mask0, factor, 'max' ) ) ] }
             histogram = self.histogram( cmd['index'] ) if self._histogram_source else { }
             if self._stats:
                 #statistics for the displayed plane of the image cubea
                 statistics = self.statistics( cmd['index'] )
-                return { 'chan': { 'img': [ pack_arrays(chan) ],
+                return { 'chan': { **image,
                                    **mask0,
                                    **mask },
                          'stats': { 'labels': list(statistics.keys( )), 'values': pack_arrays(list(statistics.values( ))) },
                          'hist': histogram,
                          'id': cmd['id'] }
             else:
-                return { 'chan': { 'img': [ pack_arrays(chan) ],
+                return { 'chan': { **image,
                                    **mask0,
                                    **mask },
                          'hist': histogram,
@@ -448,11 +887,14 @@ class ImagePipe(DataPipe):
             else:
                 ### later a function should be provided for setting the quantization transfer function
                 self.__quant_adjustments = { 'bounds': cmd['bounds'], 'transfer': cmd['transfer'] }
-                ### ensure that the cached channel is not used...
-                self.__cached_chan = None
+            ### previously rendered tiles no longer match the adjustments
+            self.__quant_version += 1
+            with self.__tile_lock:
+                self.__tile_cache.clear( )
             return { 'result': 'OK', 'id': cmd['id'] }
 
-    def __init__( self, image, *args, mask=None, stats=False, **kwargs ):
+    def __init__( self, image, *args, mask=None, stats=False, cache_size=512*1024*1024, prefetch=4, check_interval=2.0,
+                  decimation='mean', tile_cache_size=2048, **kwargs ):
         super( ).__init__( *args, **kwargs, )
 
         self.dataid = str(uuid4( ))
@@ -461,11 +903,21 @@ class ImagePipe(DataPipe):
             raise RuntimeError('cannot open an image because casatools is not available')
 
         self.__img = None
+        self.__img_lock = threading.RLock( )
         self.__msk = None
+        self.__mask_generation = 0
+        self.__plane_cache = None
         self.__fits_header = None
         self.__fits_header_str = ''
         resource_manager( ).reg_at_exit( self, '__del__' )
         self._stats = stats
+        self.__decimation = decimation
+        self.__tiles = None
+        self.__tile_server = None
+        self.__tile_lock = threading.Lock( )
+        self.__tile_cache = OrderedDict( )
+        self.__tile_cache_size = tile_cache_size
+        self.__quant_version = 0
         self.__open_image( image )
         self.__open_mask( mask )
         self.__mask0_cache = None
@@ -480,11 +932,20 @@ class ImagePipe(DataPipe):
         self.__mask_statistics = False
 
         ###
-        ### the last channel retrieved is kept around for pixel retrieval
+        ### recently used channels are kept around for pixel retrieval and channel
+        ### changes, the channels adjacent to the current channel are prefetched
+        ###
+        self.__plane_cache = PlaneCache( self.__fetch_chan, self.shape[3], max_bytes=cache_size, prefetch=prefetch )
+
+        ###
+        ### image change detection, the generation is incremented by image_modified( )
+        ### or when the (throttled) scan of the image directory finds newer files
         ###
-        self.__cached_chan = None
-        self.__cached_chan_index = None
-        self.__cached_chan_ctime = 0
+        self.__generation = 0
+        self.__cached_generation = 0
+        self.__check_interval = check_interval
+        self.__last_check = float('-inf')
+        self.__image_ctime = None
 
         ###
         ### quantization controls to affect how pseudo colors are displayed
@@ -500,13 +961,18 @@ class ImagePipe(DataPipe):
         super( ).register( self.dataid, self._image_message_handler )
 
     def __del__(self):
-        if self.__rgn:
-            self.__rgn.done( )
-        if self.__img != None:
-            self.__img.close()
-            self.__img.done()
-            self.__img = None
-            self.__stokes_labels = None
+        if self.__tile_server is not None:
+            self.__tile_server.shutdown( )
+            self.__tile_server.server_close( )
+            self.__tile_server = None
+        if self.__plane_cache is not None:
+            self.__plane_cache.stop( )
+        with self.__img_lock:
+            if self.__img != None:
+                self.__img.close()
+                self.__img.done()
+                self.__img = None
+                self.__stokes_labels = None
 
     def fits_header( self ):
         return ( self.__fits_header, self.__fits_header_str )
@@ -526,42 +992,121 @@ class ImagePipe(DataPipe):
         if self.__mask_path and use_mask is not None:
             self.__mask_statistics = bool(use_mask)
 
+    def __beam_area( self, index ):
+        ###
+        ### restoring beam area in pixels, used to convert Jy/beam to Jy
+        ###
+        try:
+            beam = self.__img.restoringbeam( channel=index[1], polarization=index[0] )
+        except Exception:
+            beam = self.__img.restoringbeam( )
+        if not beam or 'major' not in beam:
+            return None
+        qa = ct.quanta( )
+        inc = self.__img.coordsys( ).increment( type='direction', format='q' )['quantity']
+        pixel = abs( qa.convert( inc['*1'], 'rad' )['value'] * qa.convert( inc['*2'], 'rad' )['value'] )
+        if pixel == 0:
+            return None
+        return np.pi / ( 4 * np.log(2) ) * qa.convert( beam['major'], 'rad' )['value'] * qa.convert( beam['minor'], 'rad' )['value'] / pixel
+
+    def __compute_statistics( self, index, use_mask ):
+        ###
+        ### statistics with the same keys and values as ia.statistics( ) for a box region
+        ### covering the channel, computed from the cached plane
+        ###
+        plane = np.squeeze( self.__get_chan(index) )
+        ### like ia.statistics( ) only the default pixel mask is applied (which
+        ### is not necessarily 'mask0')
+        with self.__img_lock:
+            default_mask = self.__img.maskhandler('default')
+            pixel_mask = np.squeeze( self.__img.getchunk( blc=[0,0] + index, trc=self.__chan_shape + index, getmask=True ) ) \
+                         if len(default_mask) > 0 and default_mask[0] else None
+
+        def position( flat ):
+            return [ int(i) for i in np.unravel_index( flat, plane.shape, order='F' ) ] + index
+        def world( pixel ):
+            with self.__img_lock:
+                return ', '.join( self.__img.toworld( pixel, 's' )['string'] )
+
+        blc = [ 0, 0 ] + index
+        trc = [ self.shape[0] - 1, self.shape[1] - 1 ] + index
+        result = { 'blc': blc, 'blcf': world(blc), 'trc': trc, 'trcf': world(trc) }
+
+        with self.__img_lock:
+            area = self.__beam_area( index ) if self.__img.brightnessunit( ).lower( ) == 'jy/beam' else None
+
+        if not use_mask and pixel_mask is None:
+            ### whole channel, the shared plane analysis has everything that is needed
+            summary = self.analysis( index )
+            npts, total, sumsq, m2 = summary['npts'], summary['sum'], summary['sumsq'], summary['m2']
+            vmin, vmax = summary['min'], summary['max']
+            minpos, maxpos = position( summary['minpos'] ), position( summary['maxpos'] )
+        else:
+            ### CASA iterates with the first axis varying fastest
+            include = np.isfinite(plane)
+            if pixel_mask is not None:
+                include &= pixel_mask
+            if use_mask:
+                include &= self.mask( index, True ) != 0
+            values = plane.ravel(order='F')[include.ravel(order='F')].astype(np.float64)
+            positions = np.flatnonzero( include.ravel(order='F') )
+            npts = len(values)
+            if npts > 0:
+                imin, imax = int(np.argmin(values)), int(np.argmax(values))
+                total, sumsq = float(values.sum( )), float(np.dot( values, values ))
+                m2 = self.__sum_squared_deviations( values, total )
+                vmin, vmax = float(values[imin]), float(values[imax])
+                minpos, maxpos = position( positions[imin] ), position( positions[imax] )
+
+        if npts == 0:
+            ### ia.statistics( ) returns empty values when no pixels are included
+            result.update( { 'npts': 0.0, 'sum': [ ], 'sumsq': [ ], 'min': [ ], 'max': [ ],
+                             'minpos': [ ], 'minposf': '', 'maxpos': [ ], 'maxposf': '',
+                             'mean': [ ], 'rms': [ ], 'sigma': [ ] } )
+            if area:
+                result['flux'] = [ ]
+            return result
+
+        mean = total / npts
+        result.update( { 'npts': float(npts), 'sum': total, 'sumsq': sumsq,
+                         'min': vmin, 'max': vmax,
+                         'minpos': minpos, 'minposf': world(minpos),
+                         'maxpos': maxpos, 'maxposf': world(maxpos),
+                         'mean': mean, 'rms': float(np.sqrt( sumsq / npts )),
+                         'sigma': float(np.sqrt( m2 / ( npts - 1 ) )) if npts > 1 else 0.0 } )
+        if area:
+            result['flux'] = total / area
+        return result
+
     def statistics( self, index ):
         """Retrieve statistics for one channel from the image cube. The `index`
         should be a two element list of integers. The first integer is the
         ''stokes'' axis in the image cube. The second integer is the ''channel''
-        axis in the image cube.
+        axis in the image cube. The statistics are calculated from the cached
+        channel (restricted to the mask when ``statistics_config( use_mask=True )``
+        is in effect) and are reused until the image or the mask changes.
 
         Parameters
         ----------
         index: [ int, int ]
             list containing first the ''stokes'' index and second the ''channel'' index
         """
-        def singleton( potential_nonlist ):
-            # convert a list of a single element to the element
-            return potential_nonlist if len(potential_nonlist) != 1 else potential_nonlist[0]
         def sort_result( unsorted_dictionary ):
             part = partition( lambda s: (s.startswith('trc') or s.startswith('blc')), sorted(unsorted_dictionary.keys( )) )
             return { k: unsorted_dictionary[k] for k in part[1] + part[0] }
 
-        reg = self.__rgn.box( [0,0] + index, self.__chan_shape + index )
-        ###
-        ### This seems like it should work:
-        ###
-        #      rawstats = self.__img.statistics( region=reg )
-        ###
-        ### but it does not so we have to create a one-use image tool (see CAS-13625)
-        ###
-        ia = imagetool( )
-        ia.open(self.__image_path)
-        if self.__mask_statistics:
-            ### mask is an LEL expression and quotes prevents a name containing
-            ### numbers from being interpreted as an expression
-            rawstats = ia.statistics( region=reg, mask=f'''"{self.__mask_path}"''' )
-        else:
-            rawstats = ia.statistics( region=reg )
-        ia.close( )
-        return sort_result( { k: singleton([ x.item( ) for x in v ]) if isinstance(v,np.ndarray) else v for k,v in rawstats.items( ) } )
+        index = self.__clamp_index( index )
+        use_mask = bool(self.__mask_statistics and self.__msk is not None)
+        ### the plane cache is cleared when the image changes so only the mask is part of the key
+        key = ( use_mask, self.__mask_generation if use_mask else None )
+        self.__get_chan(index)
+        extras = self.__plane_cache.extras( index )
+        if extras is not None and extras.get('statistics', (None,))[0] == key:
+            return dict(extras['statistics'][1])
+        result = sort_result( self.__compute_statistics( index, use_mask ) )
+        if extras is not None:
+            extras['statistics'] = ( key, result )
+        return dict(result)
 
     def histogram( self, index ):
         """Calculate histogram (Bokeh Quad) extents for update of colormap adjuster (or anything
@@ -575,7 +1120,10 @@ class ImagePipe(DataPipe):
         if not self._histogram_source:
             return { }
 
-        chan = self.__get_chan(index)
-        bins = np.linspace( chan.min( ), chan.max( ), len(self._histogram_source.data['top'])+1 )
-        hist, edges = np.histogram( chan, density=False, bins=bins )
+        hist, edges = self.analysis( index )['hist']
+        if len(hist) != len(self._histogram_source.data['top']):
+            ### analysis was done before the histogram source was created
+            chan = np.squeeze( self.__get_chan(index) )
+            chan = chan[np.isfinite(chan)]
+            hist, edges = np.histogram( chan, bins=len(self._histogram_source.data['top']), range=( edges[0], edges[-1] ) )
         return dict( left=list(edges[:-1]), right=list(edges[1:]), top=list(hist), bottom=[0]*len(hist) )
@@ -10,12 +10,12 @@ class MsData:
     Current backend implementation is PsData using xradio Processing Set.
     '''
 
-    def __init__(self, ms_path, logger):
+    def __init__(self, ms_path, logger, convert_selection=None, convert_config=None):
         self._ms_path = ms_path
         self._logger = logger
         self._data = None
         self._data_initialized = False
-        self._init_data(ms_path)
+        self._init_data(ms_path, convert_selection, convert_config)
 
     def is_valid(self):
         ''' Returns whether MS path has been set so data can be accessed. '''
@@ -145,6 +145,38 @@ class MsData:
         if self._data_initialized:
             self._data.clear_selection()
 
+    def close(self):
+        ''' Stop background MSv2 conversion, e.g. when MS is replaced. Conversion continues in a later session. '''
+        if self._data_initialized:
+            self._data.close()
+
+    def get_convert_config(self):
+        ''' Returns MSv2 conversion configuration dict, or None if MS was already converted to zarr. '''
+        if self._data_initialized:
+            return self._data.get_convert_config()
+        self._log_no_ms()
+        return None
+
+    def update_conversion(self, selection, wait=True):
+        ''' Convert MSv2 data needed for selection if not converted yet.
+                selection (dict): spw_name, field_name, and scan_name to convert
+                wait (bool): whether to wait for conversion of the spw to plot (selected or first spw)
+            Returns whether data was updated with converted data.
+        '''
+        if self._data_initialized:
+            return self._data.update_conversion(selection, wait)
+        self._log_no_ms()
+        return False
+
+    def is_conversion_complete(self, selection):
+        ''' Returns whether MSv2 data needed for selection is converted (True if MS was already converted).
+                selection (dict): spw_name, field_name, and scan_name
+        '''
+        if self._data_initialized:
+            return self._data.is_conversion_complete(selection)
+        self._log_no_ms()
+        return False
+
     def get_vis_stats(self, selection, vis_axis):
         ''' Returns statistics (min, max, mean, std) for data selected by selection.
                 selection (dict): fields and values to select
@@ -154,6 +186,17 @@ class MsData:
         self._log_no_ms()
         return None
 
+    def get_vis_quantiles(self, selection, vis_axis, quantiles, sample_fraction=None):
+        ''' Returns approximate quantile values for data selected by selection.
+                selection (dict): fields and values to select
+                quantiles (list): quantiles in range [0, 1]
+                sample_fraction (float): fraction of data to use, None for all
+        '''
+        if self._data_initialized:
+            return self._data.get_vis_quantiles(selection, vis_axis, quantiles, sample_fraction)
+        self._log_no_ms()
+        return None
+
     def get_correlated_data(self, data_group):
         ''' Returns name of correlated data variable in Processing Set data group '''
         if self._data_initialized:
@@ -168,11 +211,56 @@ class MsData:
         self._log_no_ms()
         return None
 
+    def get_lazy_raster_data(self, plot_inputs):
+        ''' Returns uncomputed raster data after applying plot inputs, for compute_raster_data '''
+        if self._data_initialized:
+            return self._data.get_lazy_raster_data(plot_inputs)
+        self._log_no_ms()
+        return None
+
+    def compute_raster_data(self, lazy_data):
+        ''' Returns list of xarray Dataset (None if all nan) computed together from list of lazy raster data '''
+        if self._data_initialized:
+            return self._data.compute_raster_data(lazy_data)
+        self._log_no_ms()
+        return None
+
+    def get_chunk_report(self, plot_inputs):
+        ''' Returns dict with estimate of bytes read from zarr chunks for raster data with plot_inputs. '''
+        if self._data_initialized:
+            return self._data.get_chunk_report(plot_inputs)
+        self._log_no_ms()
+        return None
+
+    def write_rechunked(self, zarr_path, data_group='base', plot_axes=None, target_chunk_mb=None):
+        ''' Write copy of data to zarr_path with chunks for raster plots.
+                zarr_path (str): path of new zarr store.
+                data_group (str): data group of correlated data used to set chunk sizes.
+                plot_axes (list): (x_axis, y_axis) tuples of raster plot orientations.
+                target_chunk_mb (float): maximum size of correlated data chunks in MB.
+            Returns dict of msv4 name: chunk sizes.
+        '''
+        if self._data_initialized:
+            return self._data.write_rechunked(zarr_path, data_group, plot_axes, target_chunk_mb)
+        self._log_no_ms()
+        return None
+
+    def build_overview(self, data_group='base', factors=None):
+        ''' Write averaged levels of correlated data next to the zarr store for overview raster plots.
+                data_group (str): data group of correlated data and flags to average.
+                factors (list): (time, frequency) averaging factor of each level.
+            Returns path of overview store.
+        '''
+        if self._data_initialized:
+            return self._data.build_overview(data_group, factors)
+        self._log_no_ms()
+        return None
+
     def _log_no_ms(self):
         self._logger.info("No MS path set, cannot access data")
 
-    def _init_data(self, ms_path):
+    def _init_data(self, ms_path, convert_selection=None, convert_config=None):
         ''' Data backend for MeasurementSet; currently xradio ProcessingSet '''
         if ms_path:
-            self._data = PsData(ms_path, self._logger)
+            self._data = PsData(ms_path, self._logger, convert_selection, convert_config)
             self._data_initialized = True
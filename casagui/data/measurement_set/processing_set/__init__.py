@@ -2,10 +2,24 @@
     Module to access MeasurementSet data using xradio ProcessingSetXdt and Xarray objects.
 '''
 
+from ._ps_baselines import (
+    BaselineIndex,
+)
+
+from ._ps_chunks import (
+    chunk_read_report,
+    write_rechunked_ps,
+)
+
 from ._ps_concat import (
     concat_ps_xdt,
 )
 
+from ._ps_convert import (
+    MsConverter,
+    check_convert_config,
+)
+
 from ._ps_coords import (
     set_coordinates,
     set_datetime_coordinate,
@@ -20,7 +34,14 @@ from ._ps_io import (
     get_processing_set,
 )
 
+from ._ps_overview import (
+    PsOverview,
+    write_overview,
+)
+
 from ._ps_raster_data import (
+    compute_raster_data,
+    lazy_raster_data,
     raster_data,
 )
 
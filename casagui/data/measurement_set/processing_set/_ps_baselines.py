@@ -0,0 +1,84 @@
+'''
+Index of antennas and baselines in an xradio ProcessingSet.
+'''
+
+import numpy as np
+
+def make_baseline_names(ant1_names, ant2_names):
+    ''' Return numpy array of baseline names "ant1 & ant2" for arrays of antenna names '''
+    return np.char.add(np.char.add(np.asarray(ant1_names, dtype=str), " & "), np.asarray(ant2_names, dtype=str))
+
+class BaselineIndex:
+    '''
+    Antenna and baseline index built once for a ProcessingSet, so that baseline names and antenna
+    selection use array indexing instead of string operations on every plot or selection.
+
+    Antennas are identified by their index in the sorted list of antenna names in all baselines.
+    For each msv4 dataset with a baseline_id dimension, the index holds its baseline_id values and
+    the antenna ids and names of each baseline. Datasets are identified by name, and baseline_id
+    values are unchanged by selection, so the index also applies to selected datasets.
+    '''
+
+    def __init__(self, ps_xdt):
+        self._baselines = {} # ms name -> {'baseline_id', 'antenna1', 'antenna2', 'name'} arrays
+
+        ant1_names = {}
+        ant2_names = {}
+        for name, ms_xdt in ps_xdt.items():
+            if 'baseline_id' not in ms_xdt.coords:
+                continue
+            ant1_names[name] = np.atleast_1d(ms_xdt.baseline_antenna1_name.values).astype(str)
+            ant2_names[name] = np.atleast_1d(ms_xdt.baseline_antenna2_name.values).astype(str)
+            self._baselines[name] = {'baseline_id': np.atleast_1d(ms_xdt.baseline_id.values)}
+
+        if self._baselines:
+            self._antenna_names = np.unique(np.concatenate(list(ant1_names.values()) + list(ant2_names.values())))
+        else:
+            self._antenna_names = np.array([], dtype=str)
+        self._antenna_ids = {name: idx for idx, name in enumerate(self._antenna_names.tolist())}
+
+        for name, baselines in self._baselines.items():
+            baselines['antenna1'] = np.searchsorted(self._antenna_names, ant1_names[name])
+            baselines['antenna2'] = np.searchsorted(self._antenna_names, ant2_names[name])
+            baselines['name'] = make_baseline_names(ant1_names[name], ant2_names[name])
+
+    def get_antenna_names(self):
+        ''' Return sorted numpy array of antenna names in baselines '''
+        return self._antenna_names
+
+    def get_antenna_id(self, antenna_name):
+        ''' Return antenna id for name, or -1 if antenna is not in any baseline '''
+        return self._antenna_ids.get(antenna_name, -1)
+
+    def has_baselines(self, ms_name):
+        ''' Return whether msv4 dataset is indexed (has baseline_id dimension) '''
+        return ms_name in self._baselines
+
+    def get_antenna_ids(self, ms_name, baseline_ids):
+        ''' Return (antenna1, antenna2) id arrays for baseline_id values in msv4 dataset '''
+        baselines = self._baselines[ms_name]
+        idx = self._get_baseline_index(baselines, baseline_ids)
+        return baselines['antenna1'][idx], baselines['antenna2'][idx]
+
+    def get_baseline_names(self, ms_name, baseline_ids):
+        ''' Return array of baseline names "ant1 & ant2" for baseline_id values in msv4 dataset '''
+        baselines = self._baselines[ms_name]
+        return baselines['name'][self._get_baseline_index(baselines, baseline_ids)]
+
+    def get_ps_baseline_names(self, ps_xdt):
+        ''' Return sorted numpy array of unique baseline names in (selected) ps_xdt '''
+        names = [self.get_baseline_names(name, ms_xdt.baseline_id.values)
+            for name, ms_xdt in ps_xdt.items() if 'baseline_id' in ms_xdt.coords and name in self._baselines]
+        if not names:
+            return np.array([], dtype=str)
+        return np.unique(np.concatenate(names))
+
+    def _get_baseline_index(self, baselines, baseline_ids):
+        ''' Return index into baseline arrays for baseline_id values '''
+        ids = baselines['baseline_id']
+        baseline_ids = np.atleast_1d(baseline_ids)
+        idx = np.searchsorted(ids, baseline_ids)
+        if idx.size and (idx.max() >= ids.size or not np.array_equal(ids[idx], baseline_ids)):
+            # baseline_id values are not sorted; not expected in msv4
+            idx = np.array([np.flatnonzero(ids == baseline_id)[0] for baseline_id in baseline_ids], dtype=int)
+        return idx
@@ -0,0 +1,154 @@
+'''
+Chunk layout of ProcessingSet data variables: estimate bytes read for a selection,
+and write a copy of the ProcessingSet rechunked for raster plot planes.
+'''
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Size of rechunked data variable chunks (uncompressed)
+DEFAULT_TARGET_CHUNK_MB = 64
+
+# Raster plot orientations (x_axis, y_axis) for rechunked store
+DEFAULT_PLOT_AXES = [('baseline', 'time'), ('frequency', 'time')]
+
+def chunk_read_report(ps_xdt, selected_ps_xdt, data_vars):
+    '''
+    Estimate bytes read from zarr chunks to load the selected data.
+        ps_xdt (xarray DataTree): ProcessingSet as opened from zarr.
+        selected_ps_xdt (xarray DataTree): selection of ps_xdt; msv4 datasets have same names.
+        data_vars (list): names of data variables which are read, e.g. correlated data and FLAG.
+    Returns: dict with total 'selected_bytes', 'read_bytes' (uncompressed bytes in chunks touched),
+        'num_chunks', 'efficiency' (selected/read), and 'ms' dict of the same values and 'chunks'
+        (chunk size by dimension) for each msv4 dataset.
+    '''
+    report = {'selected_bytes': 0, 'read_bytes': 0, 'num_chunks': 0, 'ms': {}}
+    for name, selected_xdt in selected_ps_xdt.items():
+        if name not in ps_xdt:
+            continue
+        xds = ps_xdt[name].ds
+        selected_xds = selected_xdt.ds
+        ms_report = {'selected_bytes': 0, 'read_bytes': 0, 'num_chunks': 0, 'chunks': {}}
+        for var in data_vars:
+            if var not in xds.data_vars or var not in selected_xds.data_vars:
+                continue
+            xda = xds[var]
+            selected_bytes = read_bytes = xda.dtype.itemsize
+            num_chunks = 1
+            for dim, dim_chunks in zip(xda.dims, get_store_chunks(xda)):
+                positions = _get_selected_positions(xds, selected_xds, dim)
+                chunk_idx = np.unique(np.searchsorted(np.cumsum(dim_chunks), positions, side='right'))
+                selected_bytes *= positions.size
+                read_bytes *= int(np.asarray(dim_chunks)[chunk_idx].sum())
+                num_chunks *= chunk_idx.size
+                ms_report['chunks'][dim] = dim_chunks[0]
+            ms_report['selected_bytes'] += selected_bytes
+            ms_report['read_bytes'] += read_bytes
+            ms_report['num_chunks'] += num_chunks
+        ms_report['efficiency'] = _efficiency(ms_report)
+        report['ms'][name] = ms_report
+        for key in ['selected_bytes', 'read_bytes', 'num_chunks']:
+            report[key] += ms_report[key]
+    report['efficiency'] = _efficiency(report)
+    return report
+
+def get_store_chunks(xda):
+    ''' Return chunk sizes along each dimension of xarray DataArray as stored:
+        zarr chunks from encoding, else dask chunks, else one chunk. '''
+    store_chunks = xda.encoding.get('chunks')
+    if store_chunks and len(store_chunks) == xda.ndim:
+        return tuple(_split_dim(size, chunk) for size, chunk in zip(xda.shape, store_chunks))
+    if xda.chunks:
+        return xda.chunks
+    return tuple((size,) for size in xda.shape)
+
+def plane_chunks(sizes, itemsize, plane_dims, target_bytes):
+    '''
+    Return chunk size by dimension for raster planes of plane_dims.
+    Dimensions which are not plotted have chunk size 1, so that a plane does not read other planes.
+    Plotted dimensions start whole and the largest is halved until a chunk fits in target_bytes.
+        sizes (dict): dimension sizes of data variable.
+        itemsize (int): bytes per value.
+        plane_dims (list): dimensions which are x or y axis of a raster plot.
+        target_bytes (int): maximum uncompressed chunk size.
+    '''
+    chunks = {dim: size if dim in plane_dims else 1 for dim, size in sizes.items()}
+    chunked_dims = [dim for dim in plane_dims if dim in chunks]
+    while chunked_dims and np.prod(list(chunks.values())) * itemsize > target_bytes:
+        dim = max(chunked_dims, key=lambda dim: chunks[dim])
+        if chunks[dim] == 1:
+            break
+        chunks[dim] = (chunks[dim] + 1) // 2
+    return chunks
+
+def write_rechunked_ps(ps_xdt, zarr_path, correlated_data, logger, plot_axes=None,
+    target_chunk_mb=DEFAULT_TARGET_CHUNK_MB):
+    '''
+    Write copy of ProcessingSet to zarr with main data variables rechunked for raster plots.
+        ps_xdt (xarray DataTree): ProcessingSet to copy.
+        zarr_path (str): path of new zarr store; must not exist.
+        correlated_data (str): name of correlated data variable, for chunk size calculation.
+        plot_axes (list): (x_axis, y_axis) tuples of raster plot orientations.
+            Default [('baseline', 'time'), ('frequency', 'time')].
+        target_chunk_mb (float): maximum uncompressed size of correlated data chunk in MB.
+    Returns: dict of msv4 name: chunk sizes by dimension.
+    '''
+    if os.path.exists(zarr_path):
+        raise RuntimeError(f"Cannot write rechunked ProcessingSet: {zarr_path} exists")
+
+    plot_axes = plot_axes if plot_axes else DEFAULT_PLOT_AXES
+    target_bytes = target_chunk_mb * 1024 * 1024
+
+    rechunked_xdt = ps_xdt.copy()
+    ms_chunks = {}
+    for name, ms_xdt in ps_xdt.items():
+        xds = ms_xdt.ds
+        if correlated_data not in xds.data_vars:
+            continue
+        xda = xds[correlated_data]
+        plane_dims = _get_plane_dims(plot_axes, xda.dims)
+        chunks = plane_chunks(dict(zip(xda.dims, xda.shape)), xda.dtype.itemsize, plane_dims, target_bytes)
+        logger.info(f"Rechunking {name} {dict(zip(xda.dims, xda.shape))} with chunks {chunks}")
+
+        rechunked_xds = xds.chunk({dim: size for dim, size in chunks.items() if dim in xds.dims})
+        for var in rechunked_xds.variables.values():
+            # Write with new dask chunks, not the chunks of the input store
+            for key in ['chunks', 'preferred_chunks', 'shards']:
+                var.encoding.pop(key, None)
+        rechunked_xdt[name].dataset = rechunked_xds
+        ms_chunks[name] = chunks
+
+    logger.info(f"Writing rechunked ProcessingSet to {zarr_path}")
+    rechunked_xdt.to_zarr(zarr_path, mode="w-")
+    return ms_chunks
+
+def _get_plane_dims(plot_axes, dims):
+    ''' Return data dimensions used as plot axes; baseline axis is baseline_id or antenna_name dimension '''
+    plane_dims = []
+    for axes in plot_axes:
+        for axis in axes:
+            dim = 'baseline_id' if axis == 'baseline' else axis
+            if dim == 'baseline_id' and dim not in dims:
+                dim = 'antenna_name'
+            if dim in dims and dim not in plane_dims:
+                plane_dims.append(dim)
+    return plane_dims
+
+def _get_selected_positions(xds, selected_xds, dim):
+    ''' Return index positions in xds of dimension values in selected_xds '''
+    if dim not in xds.coords:
+        return np.arange(selected_xds.sizes.get(dim, 1))
+    if dim not in selected_xds.coords:
+        return np.arange(xds.sizes[dim])
+    positions = pd.Index(xds[dim].values).get_indexer(np.atleast_1d(selected_xds[dim].values))
+    return positions[positions >= 0]
+
+def _split_dim(size, chunk):
+    ''' Return tuple of chunk sizes along dimension of size '''
+    num_full, remainder = divmod(size, chunk)
+    return (chunk,) * num_full + ((remainder,) if remainder else ())
+
+def _efficiency(report):
+    return report['selected_bytes'] / report['read_bytes'] if report['read_bytes'] else 1.0
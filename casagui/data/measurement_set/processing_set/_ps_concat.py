@@ -2,12 +2,14 @@
 Concat ProcessingSet xarray DataSets into single xds by time dimension (in order)
 '''
 
+import numpy as np
 import xarray as xr
 
 from casagui.data.measurement_set.processing_set._ps_coords import set_coordinates
 
-def concat_ps_xdt(ps_xdt, logger):
+def concat_ps_xdt(ps_xdt, logger, baseline_index=None):
     ''' Concatenate xarray Datasets in ProcessingSet by time dimension.
+        baseline_index (BaselineIndex): baseline names for baseline coordinate, None to create names.
         Return concat xds. '''
     if len(ps_xdt) == 0:
         raise RuntimeError("Processing set empty after selection.")
@@ -15,7 +17,10 @@ def concat_ps_xdt(ps_xdt, logger):
     ps = {}
     for name, ms_xdt in ps_xdt.items():
         # Set units to str not list and set baseline coordinate.  Returns xarray.Dataset
-        ps[name] = set_coordinates(ms_xdt)
+        baseline_names = None
+        if baseline_index is not None and baseline_index.has_baselines(name) and 'baseline_id' in ms_xdt.coords:
+            baseline_names = baseline_index.get_baseline_names(name, ms_xdt.baseline_id.values)
+        ps[name] = set_coordinates(ms_xdt, baseline_names)
 
     if len(ps) == 1:
         logger.debug("Processing set contains one dataset, nothing to concat.")
@@ -33,66 +38,38 @@ def concat_ps_xdt(ps_xdt, logger):
     if len(xds_list) > len(ps_xdt):
         logger.debug(f"Split {len(ps_xdt)} datasets by time gap into {len(xds_list)} datasets.")
 
-    # Create sorted xds list using sorted times
-    time_list.sort()
-    sorted_xds = [None] * len(time_list)
-
-    for xds in xds_list:
-        try:
-            first_xds_time = xds.time.values[0]
-        except IndexError: # only one value
-            first_xds_time = xds.time.values
-
-        for idx, value in enumerate(time_list):
-            if value == first_xds_time and sorted_xds[idx] is None:
-                if "baseline" in xds.coords:
-                    # Cannot concat with non-dim string coord
-                    xds = xds.drop("baseline_antenna1_name")
-                    xds = xds.drop("baseline_antenna2_name")
-                # Convert MeasurementSetXds to xr Dataset for concat
-                # (TypeError: MeasurementSetXds.__init__() got an unexpected keyword argument 'coords')
-                sorted_xds[idx] = xr.Dataset(xds.data_vars, xds.coords, xds.attrs)
-                break
+    # Order xds by first time; stable sort keeps ps order for equal times
+    sorted_xds = []
+    for idx in np.argsort(np.array(time_list), kind='stable'):
+        xds = xds_list[idx]
+        if "baseline" in xds.coords:
+            # Cannot concat with non-dim string coord
+            xds = xds.drop("baseline_antenna1_name")
+            xds = xds.drop("baseline_antenna2_name")
+        # Convert MeasurementSetXds to xr Dataset for concat
+        # (TypeError: MeasurementSetXds.__init__() got an unexpected keyword argument 'coords')
+        sorted_xds.append(xr.Dataset(xds.data_vars, xds.coords, xds.attrs))
     return xr.concat(sorted_xds, dim='time')
 
 def _get_sorted_times(ps):
-    values = []
-    for key in ps:
-        time_values = ps[key].time.values
-        if time_values.size > 1:
-            values.extend(time_values.tolist())
-        else:
-            values.append(time_values)
-    return sorted(values)
+    ''' Return sorted numpy array of times in all xds (including duplicates) '''
+    return np.sort(np.concatenate([ps[key].time.values.ravel() for key in ps]))
 
 def _split_xds_by_time_gap(xds, sorted_times):
-    ''' Split xds where there is a gap in sorted times.
+    ''' Split xds where there is a gap in sorted times, i.e. where another xds has
+        a time between (or equal to) consecutive xds times.
         Return list of xds and first time in each one. '''
     times = xds.time.values.ravel()
-    xds_list = []
-    first_times = [times[0]]
-
     if len(times) == 1:
-        xds_list.append(xds)
-    else:
-        sorted_time_idx = sorted_times.index(times[0])
-        idx = xds_start_idx = 0 # start for iselection
+        return [xds], [times[0]]
 
-        for idx, time in enumerate(times):
-            if time == sorted_times[sorted_time_idx]:
-                # No time gap, go to next time
-                sorted_time_idx += 1
-                continue
-
-            # Found time gap, select xds
-            xds_list.append(xds.isel(time=slice(xds_start_idx, idx)))
-
-            # start next xds with new first time, find idx in sorted times (skip ahead)
-            xds_start_idx = idx
-            first_times.append(times[idx])
-            sorted_time_idx = sorted_times.index(time) + 1 # for next time
-
-        # add last time range xds
-        xds_list.append(xds.isel(time=slice(xds_start_idx, idx + 1)))
+    # Index of each time in sorted times; consecutive times without a gap have consecutive indexes
+    sorted_idx = np.searchsorted(sorted_times, times, side='left')
+    split_idx = (np.flatnonzero(np.diff(sorted_idx) != 1) + 1).tolist()
 
+    xds_list = []
+    first_times = []
+    for start, end in zip([0] + split_idx, split_idx + [len(times)]):
+        xds_list.append(xds.isel(time=slice(start, end)) if split_idx else xds)
+        first_times.append(times[start])
     return xds_list, first_times
@@ -0,0 +1,582 @@
+'''
+    Convert MSv2 to xradio ProcessingSet zarr in the background, in parallel by partition.
+
+    The MSv2 is divided into partitions (one per data description, observation mode, and the keys in
+    the partition scheme) which are converted to msv4 datasets by a pool of worker processes, or by the
+    workers of the active dask client (e.g. started with toolviper).  Partitions needed for a selection
+    (spw_name, field_name, scan_name) are converted first; the rest only when requested.
+    Converted partitions are recorded in a json file next to the zarr store (<name>.ps.zarr.convert.json),
+    so that msv4 datasets can be opened as soon as they are written and a later session only converts
+    what is missing.  When all partitions are converted the store is finalized (marked as a processing set)
+    and the file removed.  The progress file is written before the store is created, and a store is only
+    complete once it is finalized.
+    Only one converter (in any process) converts a store at a time: it holds a lock on <name>.ps.zarr.convert.lock.
+    Converters are closed at interpreter exit, so that a script does not wait for the whole MSv2 to be converted:
+    queued partitions are cancelled and partitions being converted are completed.
+
+    Partitions are read and converted with xradio internals which are not part of its public API:
+    convert_and_write_partition and msv4_name (xradio.measurement_set._utils._msv2.conversion) and
+    create_partitions (xradio.measurement_set._utils._msv2.partition_queries), as used by
+    convert_msv2_to_processing_set in xradio 1.2 (checked with xradio 1.2.5).
+'''
+
+import atexit
+import fcntl
+import json
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import xarray as xr
+import zarr
+
+try:
+    from casacore.tables import table
+    _HAVE_CASACORE = True
+except ImportError:
+    _HAVE_CASACORE = False
+
+try:
+    # private xradio functions, which may be moved or renamed in other xradio versions
+    from xradio.measurement_set._utils._msv2.conversion import convert_and_write_partition, msv4_name
+    from xradio.measurement_set._utils._msv2.partition_queries import create_partitions
+    _XRADIO_IMPORT_ERROR = None
+except ImportError as _import_error:
+    _XRADIO_IMPORT_ERROR = str(_import_error)
+
+try:
+    from distributed import get_client
+    _HAVE_DISTRIBUTED = True
+except ImportError:
+    _HAVE_DISTRIBUTED = False
+
+_PROGRESS_SUFFIX = ".convert.json"
+_LOCK_SUFFIX = ".convert.lock"
+
+# Seconds between progress messages while waiting for conversion
+_PROGRESS_INTERVAL = 10
+
+# Default conversion configuration, see check_convert_config
+DEFAULT_CONVERT_CONFIG = {
+    'n_workers': min(4, os.cpu_count() or 1),
+    'partition_scheme': [],
+    'compressor': 'lz4',
+    'main_chunksize': None,
+    'use_dask_client': True,
+}
+
+_PARTITION_KEYS = ["FIELD_ID", "SCAN_NUMBER", "STATE_ID", "SOURCE_ID", "SUB_SCAN_NUMBER", "ANTENNA1"]
+_COMPRESSORS = ['lz4', 'lz4hc', 'zstd', 'zlib', 'blosclz']
+
+def check_convert_config(config):
+    '''
+        Return conversion configuration with defaults for keys not in config.
+            n_workers (int): number of worker processes. Ignored when the active dask client is used.
+            partition_scheme (list): MSv2 columns to partition by in addition to data description and
+                observation mode: "FIELD_ID", "SCAN_NUMBER", "STATE_ID", "SOURCE_ID", "SUB_SCAN_NUMBER", "ANTENNA1".
+                Finer partitions give more parallelism and finer selection for partial conversion.
+            compressor (str, None, or zarr codec): Blosc compressor name, None for no compression,
+                or zarr bytes-to-bytes codec.  Default 'lz4'.
+            main_chunksize (dict, float, None): chunk sizes of msv4 dimensions, or chunk size in GiB.
+                Default None: xradio chooses time chunks of about 128 MiB.
+            use_dask_client (bool): convert on the workers of the active dask client if there is one.
+        Raises TypeError or ValueError for invalid config.
+    '''
+    config = config if config else {}
+    if not isinstance(config, dict):
+        raise TypeError("Invalid parameter type: convert_config must be dictionary.")
+    for key in config:
+        if key not in DEFAULT_CONVERT_CONFIG:
+            raise ValueError(f"Invalid parameter value: convert_config key {key} must be one of {list(DEFAULT_CONVERT_CONFIG)}.")
+    config = DEFAULT_CONVERT_CONFIG | config
+
+    n_workers = config['n_workers']
+    if not isinstance(n_workers, int) or n_workers < 1:
+        raise ValueError("Invalid parameter value: n_workers must be a positive integer.")
+
+    partition_scheme = config['partition_scheme']
+    if partition_scheme is None:
+        partition_scheme = []
+    if not isinstance(partition_scheme, (list, tuple)):
+        raise TypeError("Invalid parameter type: partition_scheme must be a list.")
+    for key in partition_scheme:
+        if key not in _PARTITION_KEYS:
+            raise ValueError(f"Invalid parameter value: partition_scheme key {key} must be one of {_PARTITION_KEYS}.")
+    config['partition_scheme'] = list(partition_scheme)
+
+    compressor = config['compressor']
+    if isinstance(compressor, str) and compressor not in _COMPRESSORS:
+        raise ValueError(f"Invalid parameter value: compressor {compressor} must be None, a zarr codec, or one of {_COMPRESSORS}.")
+
+    main_chunksize = config['main_chunksize']
+    if main_chunksize is not None and not isinstance(main_chunksize, (dict, int, float)):
+        raise TypeError("Invalid parameter type: main_chunksize must be None, dict, or float (GiB).")
+    return config
+
+class PartitionFilter:
+    '''
+        Select MSv2 partitions by data description ids, and optionally field ids and scan numbers.
+        A partition is selected if it contains any of the selected values.
+    '''
+
+    def __init__(self, ddis=None, fields=None, scans=None):
+        self.ddis = ddis
+        self.fields = fields
+        self.scans = scans
+
+    def __call__(self, partition):
+        if self.ddis is not None and not np.isin(partition['DATA_DESC_ID'], self.ddis).any():
+            return False
+        if self.fields is not None and not np.isin(partition['FIELD_ID'], self.fields).any():
+            return False
+        if self.scans is not None and not np.isin(partition['SCAN_NUMBER'], self.scans).any():
+            return False
+        return True
+
+class MsConverter:
+    '''
+        Convert MSv2 to zarr ProcessingSet in the background, by partition, with a pool of worker processes
+        or the active dask client.  Conversion of the partitions for a selection is started with request(),
+        and wait() blocks until they are written.  Partitions which failed to convert are submitted again
+        by the next request() which needs them.  Call close() to stop conversion; converters which are
+        not closed are closed at exit.
+    '''
+
+    def __init__(self, ms_path, zarr_path, logger, config=None):
+        if not _HAVE_CASACORE:
+            raise RuntimeError("Cannot convert MSv2 to xradio zarr file: python-casacore not installed.")
+        if _XRADIO_IMPORT_ERROR is not None:
+            raise RuntimeError("Cannot convert MSv2 to xradio zarr file: xradio internals convert_and_write_partition "
+                "and msv4_name (xradio.measurement_set._utils._msv2.conversion) or create_partitions "
+                "(xradio.measurement_set._utils._msv2.partition_queries) cannot be imported, they are used as in "
+                f"xradio 1.2: {_XRADIO_IMPORT_ERROR}")
+
+        self._ms_path = ms_path
+        self._zarr_path = zarr_path
+        self._progress_path = zarr_path + _PROGRESS_SUFFIX
+        self._logger = logger
+        self._config = check_convert_config(config)
+
+        self._executor = None
+        self._client = None
+        self._lock = threading.Lock()
+        self._partitions = None # MSv2 partition descriptions, read by a worker
+        self._partitions_future = None
+        self._queued = [] # filters requested before partitions were read
+        self._submitted = set() # partition indices
+        self._futures = {} # partition index: future, for partitions being converted
+        self._failed = {} # partition index: error, for partitions which failed to convert
+        self._error = None # error reading partitions, or partitions do not match progress
+        self._finalize_future = None
+        self._closed = False
+
+        self._spw_ids, self._field_ids, self._dd_spw_ids = _read_ms_ids(ms_path)
+
+        # Progress file and store are only written by the session holding the lock
+        self._lock_file = _acquire_store_lock(zarr_path)
+        _open_converters.add(self)
+
+        if not os.path.exists(zarr_path) and os.path.exists(self._progress_path):
+            # zarr store was removed, progress is stale
+            os.remove(self._progress_path)
+        self._progress = _read_progress(self._progress_path)
+        if self._progress['partition_scheme'] is None:
+            self._progress['partition_scheme'] = self._config['partition_scheme']
+        elif self._progress['partition_scheme'] != self._config['partition_scheme']:
+            self._logger.warning(f"Continuing conversion of {zarr_path} with partition scheme "
+                f"{self._progress['partition_scheme']} used to start conversion.")
+
+    @staticmethod
+    def is_converted(zarr_path):
+        ''' Return whether zarr store exists and is complete: marked as a processing set, which is done
+            when all partitions are converted (see _finalize_store) '''
+        if not os.path.exists(zarr_path):
+            return False
+        try:
+            return zarr.open_group(zarr_path, mode="r").attrs.get("type") == "processing_set"
+        except Exception: # pylint: disable=broad-exception-caught
+            return False
+
+    def get_config(self):
+        ''' Return conversion configuration dict '''
+        return self._config.copy()
+
+    def request(self, selection=None):
+        '''
+            Start conversion of the MSv2 partitions needed for selection (spw_name, field_name, and scan_name),
+            or all partitions if None.  Does not wait for conversion.
+        '''
+        partition_filter = self._get_partition_filter(selection)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Cannot convert {self._ms_path}: converter is closed.")
+            if self._partitions is None:
+                self._queued.append(partition_filter)
+                self._read_partitions()
+                return
+        self._submit(partition_filter)
+
+    def wait(self, selection=None, min_partitions=None, timeout=None):
+        '''
+            Request and wait for conversion of the partitions needed for selection, with progress messages.
+            If min_partitions is set, return when that many of them are converted.
+            Returns list of names of msv4 datasets which have been written.
+            Raises RuntimeError if conversion failed for partitions needed for selection
+            (so that fewer than min_partitions can be converted).
+        '''
+        self.request(selection)
+        partition_filter = self._get_partition_filter(selection)
+        start = last_message = time.time()
+
+        while True:
+            with self._lock:
+                if self._error:
+                    raise RuntimeError(f"MSv2 conversion failed: {self._error}")
+                if self._partitions is not None:
+                    needed = [idx for idx, partition in enumerate(self._partitions) if partition_filter(partition)]
+                    num_done = sum(idx in self._progress['converted'] for idx in needed)
+                    num_needed = len(needed) if min_partitions is None else min(min_partitions, len(needed))
+                    if num_done >= num_needed:
+                        return self._progress['partitions'].copy()
+                    failed = [idx for idx in needed if idx in self._failed]
+                    if len(needed) - len(failed) < num_needed:
+                        raise RuntimeError(f"MSv2 conversion failed for partitions {failed}: {self._failed[failed[0]]}")
+                    message = f"{num_done} of {len(needed)} partitions converted"
+                else:
+                    message = "reading MSv2 partitions"
+            if timeout is not None and time.time() - start > timeout:
+                return self.get_partitions()
+            if time.time() - last_message > _PROGRESS_INTERVAL:
+                self._logger.info(f"Converting MSv2: {message} ({time.time() - start:.0f}s)")
+                last_message = time.time()
+            time.sleep(0.2)
+
+    def get_spw_selection(self, selection=None):
+        '''
+            Return selection of the spw to plot for selection: spw_name if selected, else the spw with the lowest id
+            which has data in selection (field_name and scan_name), which is plotted by default.
+            Waits for MSv2 partitions to be read.  Returns None if selection has no data.
+        '''
+        if selection and selection.get('spw_name'):
+            return {'spw_name': selection['spw_name']}
+        self.wait(selection, min_partitions=0)
+        partition_filter = self._get_partition_filter(selection)
+        with self._lock:
+            ddis = {int(ddi) for partition in self._partitions if partition_filter(partition)
+                for ddi in np.atleast_1d(partition['DATA_DESC_ID'])}
+        if not ddis:
+            return None
+        first_spw_id = min(self._dd_spw_ids[ddi] for ddi in ddis)
+        first_ddi = min(ddi for ddi in ddis if self._dd_spw_ids[ddi] == first_spw_id)
+        # msv4 name <name>_<id> is longer than the MSv2 name, which may not be unique
+        return {'spw_name': max(self._spw_ids[first_ddi], key=len)}
+
+    def is_complete(self, selection=None):
+        ''' Return whether all partitions needed for selection (spw_name, field_name, and scan_name) are converted.
+            False if MSv2 partitions have not been read yet. '''
+        partition_filter = self._get_partition_filter(selection)
+        with self._lock:
+            if self._partitions is None:
+                return False
+            return all(idx in self._progress['converted']
+                for idx, partition in enumerate(self._partitions) if partition_filter(partition))
+
+    def get_partitions(self):
+        ''' Return list of names of msv4 datasets which have been written '''
+        with self._lock:
+            return self._progress['partitions'].copy()
+
+    def open_processing_set(self):
+        ''' Return xarray DataTree of msv4 datasets which have been written '''
+        children = {}
+        for name in self.get_partitions():
+            children[name] = xr.open_datatree(os.path.join(self._zarr_path, name), engine="zarr", chunks={},
+                chunked_array_type="dask")
+        ps_xdt = xr.DataTree(children=children)
+        ps_xdt.attrs['type'] = 'processing_set'
+        return ps_xdt
+
+    def close(self):
+        '''
+            Cancel queued conversion and shut down worker processes; conversion continues in a later session.
+            Finalizing a converted store is completed.  Partitions being converted are completed and recorded
+            in the background, then the store lock is released.
+        '''
+        with self._lock:
+            if self._closed:
+                return
+            # store is finalized in a later session if running partitions complete it
+            self._closed = True
+            futures = list(self._futures.values())
+            if self._partitions_future is not None and not self._partitions_future.done():
+                futures.append(self._partitions_future)
+        _open_converters.discard(self)
+        if self._finalize_future is not None:
+            self._finalize_future.exception() # wait; error is logged by callback
+        for future in futures:
+            future.cancel() # queued tasks only
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._release_if_idle()
+
+    def _get_partition_filter(self, selection):
+        ''' Return PartitionFilter for selection of spw_name, field_name, and scan_name '''
+        selection = selection if selection else {}
+        ddis = fields = scans = None
+        if selection.get('spw_name'):
+            spw_names = set(_as_list(selection['spw_name']))
+            ddis = [ddi for ddi, names in self._spw_ids.items() if names & spw_names]
+        if selection.get('field_name'):
+            field_names = set(_as_list(selection['field_name']))
+            fields = [field_id for field_id, names in self._field_ids.items() if names & field_names]
+        if selection.get('scan_name'):
+            scans = [int(scan) for scan in _as_list(selection['scan_name'])]
+        return PartitionFilter(ddis, fields, scans)
+
+    def _submit_task(self, func, *args):
+        ''' Run func in worker process or on dask client (called with lock); returns future,
+            or None if converter is closed so that no executor is started after close '''
+        if self._closed:
+            return None
+        if self._executor is None and self._client is None:
+            if self._config['use_dask_client'] and _HAVE_DISTRIBUTED:
+                try:
+                    self._client = get_client()
+                    self._logger.info(f"Converting MSv2 with dask client {self._client}")
+                except ValueError:
+                    self._client = None # no active client
+            if self._client is None:
+                context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self._config['n_workers'], mp_context=context)
+                self._logger.info(f"Converting MSv2 with {self._config['n_workers']} worker processes")
+        if self._client is not None:
+            return self._client.submit(func, *args, pure=False)
+        return self._executor.submit(func, *args)
+
+    def _read_partitions(self):
+        ''' Read MSv2 partitions and create zarr store in worker (called with lock) '''
+        if self._partitions_future is None:
+            # Progress file must exist before the store, else an interrupted session leaves
+            # a store which is not distinguished from a complete conversion
+            _write_progress(self._progress_path, self._progress)
+            self._error = None
+            self._partitions_future = self._submit_task(_read_partitions, self._ms_path, self._zarr_path,
+                self._progress['partition_scheme'])
+            if self._partitions_future is not None:
+                self._partitions_future.add_done_callback(self._partitions_read)
+
+    def _partitions_read(self, future):
+        with self._lock:
+            closed = self._closed
+        if future.cancelled() or closed:
+            # converter closed, a read which completes after close does not submit queued filters
+            self._release_if_idle()
+            return
+        try:
+            partitions = future.result()
+        except Exception as e: # pylint: disable=broad-exception-caught
+            self._logger.error(f"Reading MSv2 partitions failed: {e}")
+            with self._lock:
+                self._error = str(e)
+                self._partitions_future = None # read again with next request
+            return
+        with self._lock:
+            if self._closed:
+                queued = [] # closed while reading result
+            elif self._progress['num_partitions'] not in (None, len(partitions)):
+                self._error = (f"MSv2 has {len(partitions)} partitions, zarr store was started "
+                    f"with {self._progress['num_partitions']}. Remove {self._zarr_path} to convert again.")
+                self._logger.error(f"MSv2 conversion failed: {self._error}")
+                return
+            else:
+                self._partitions = partitions
+                self._progress['num_partitions'] = len(partitions)
+                queued = self._queued
+                self._queued = []
+                # previous session may have stopped before the store was finalized
+                self._finalize_if_converted()
+        for partition_filter in queued:
+            self._submit(partition_filter)
+
+    def _submit(self, partition_filter):
+        ''' Submit conversion of partitions selected by filter which are not converted or submitted '''
+        with self._lock:
+            if self._closed:
+                return
+            indices = [idx for idx, partition in enumerate(self._partitions)
+                if partition_filter(partition) and idx not in self._submitted and idx not in self._progress['converted']]
+            self._submitted.update(indices)
+            for idx in indices:
+                self._failed.pop(idx, None) # retry
+            id_len = len(str(len(self._partitions) - 1))
+            config = self._config | {'partition_scheme': self._progress['partition_scheme']}
+        if indices:
+            self._logger.info(f"Converting {len(indices)} MSv2 partitions to {self._zarr_path}")
+        for pos, idx in enumerate(indices):
+            ms_v4_id = f"{idx:0>{id_len}}"
+            with self._lock:
+                # submitted and recorded together so that close cancels it
+                future = self._submit_task(_convert_partition, self._ms_path, self._zarr_path, ms_v4_id,
+                    self._partitions[idx], config)
+                if future is None:
+                    self._submitted.difference_update(indices[pos:])
+                    return # converter closed
+                self._futures[idx] = future
+            future.add_done_callback(lambda future, idx=idx: self._partition_converted(future, idx))
+
+    def _partition_converted(self, future, idx):
+        try:
+            self._record_partition(future, idx)
+        finally:
+            with self._lock:
+                self._futures.pop(idx, None)
+            self._release_if_idle()
+
+    def _record_partition(self, future, idx):
+        ''' Record converted partition in progress file, or failed partition '''
+        if future.cancelled():
+            with self._lock:
+                self._submitted.discard(idx)
+            return # converter closed
+        try:
+            name = future.result()
+        except Exception as e: # pylint: disable=broad-exception-caught
+            self._logger.error(f"MSv2 conversion failed for partition {idx}: {e}")
+            with self._lock:
+                self._failed[idx] = str(e)
+                self._submitted.discard(idx) # submitted again by next request which needs it
+            return
+        with self._lock:
+            self._progress['converted'].append(idx)
+            self._progress['partitions'] = sorted(self._progress['partitions'] + [name])
+            _write_progress(self._progress_path, self._progress)
+            self._finalize_if_converted()
+        self._logger.debug(f"Converted msv4 dataset {name}")
+
+    def _release_if_idle(self):
+        ''' Release store lock when converter is closed and no partitions are being converted '''
+        with self._lock:
+            if not self._closed or self._futures or self._lock_file is None:
+                return
+            if self._partitions_future is not None and not self._partitions_future.done():
+                return
+            lock_file = self._lock_file
+            self._lock_file = None
+        lock_file.close() # releases lock
+
+    def _finalize_if_converted(self):
+        ''' Finalize store in worker when all partitions are converted (called with lock) '''
+        if self._closed:
+            return
+        if self._finalize_future is None and len(self._progress['converted']) == self._progress['num_partitions']:
+            self._finalize_future = self._submit_task(_finalize_store, self._zarr_path)
+            if self._finalize_future is not None:
+                self._finalize_future.add_done_callback(self._store_finalized)
+
+    def _store_finalized(self, future):
+        try:
+            future.result()
+        except Exception as e: # pylint: disable=broad-exception-caught
+            # msv4 datasets can still be opened; finalized again in a later session
+            self._logger.error(f"Finalizing {self._zarr_path} failed: {e}")
+            return
+        # Complete store is opened without progress file in later sessions
+        os.remove(self._progress_path)
+        os.remove(self._zarr_path + _LOCK_SUFFIX) # lock is held until closed
+        self._logger.info(f"Finished converting {self._ms_path} to {self._zarr_path}")
+
+def _acquire_store_lock(zarr_path):
+    ''' Return open lock file holding exclusive lock for converting zarr store.
+        Raises RuntimeError if the store is being converted by another converter. '''
+    lock_path = zarr_path + _LOCK_SUFFIX
+    lock_file = open(lock_path, "a", encoding="utf-8") # pylint: disable=consider-using-with
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError as exc:
+        lock_file.close()
+        raise RuntimeError(f"{zarr_path} is being converted by another session. "
+            f"Close it or open the MS when conversion is complete ({lock_path}).") from exc
+    return lock_file
+
+# Converters which have not been closed, closed at exit
+_open_converters = weakref.WeakSet()
+
+def _close_converters():
+    for converter in list(_open_converters):
+        converter.close()
+
+# Close before the concurrent.futures exit handler, which waits for all queued tasks.
+# Threading exit handlers run in reverse order of registration, before atexit handlers.
+if hasattr(threading, "_register_atexit"):
+    threading._register_atexit(_close_converters) # pylint: disable=protected-access
+else:
+    atexit.register(_close_converters)
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple, set, np.ndarray)) else [value]
+
+def _read_ms_ids(ms_path):
+    ''' Return dicts of data description id: set of spw names, field id: set of field names,
+        and data description id: spw id.
+        Names include the MSv2 name and the msv4 name <name>_<id>, or spw_<id> if spw has no name. '''
+    with table(os.path.join(ms_path, "SPECTRAL_WINDOW"), ack=False) as spw_table:
+        spw_names = spw_table.getcol("NAME")
+    with table(os.path.join(ms_path, "DATA_DESCRIPTION"), ack=False) as dd_table:
+        dd_spw_ids = dd_table.getcol("SPECTRAL_WINDOW_ID")
+    with table(os.path.join(ms_path, "FIELD"), ack=False) as field_table:
+        field_names = field_table.getcol("NAME")
+
+    spw_ids = {}
+    for ddi, spw_id in enumerate(dd_spw_ids):
+        name = spw_names[spw_id]
+        spw_ids[ddi] = {name, f"{name}_{spw_id}"} if name and name != "none" else {f"spw_{spw_id}"}
+    field_ids = {field_id: {name, f"{name}_{field_id}"} for field_id, name in enumerate(field_names)}
+    return spw_ids, field_ids, {ddi: int(spw_id) for ddi, spw_id in enumerate(dd_spw_ids)}
+
+def _read_progress(progress_path):
+    try:
+        with open(progress_path, encoding="utf-8") as progress_file:
+            return json.load(progress_file)
+    except (OSError, ValueError):
+        return {'partition_scheme': None, 'num_partitions': None, 'converted': [], 'partitions': []}
+
+def _write_progress(progress_path, progress):
+    tmp_path = progress_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as progress_file:
+        json.dump(progress, progress_file, indent=1)
+    os.replace(tmp_path, progress_path)
+
+def _read_partitions(ms_path, zarr_path, partition_scheme):
+    ''' Create zarr store if needed and return list of MSv2 partition descriptions (worker) '''
+    if not os.path.exists(zarr_path):
+        xr.DataTree().to_zarr(store=zarr_path, mode="w-")
+    return create_partitions(ms_path, partition_scheme=partition_scheme)
+
+def _convert_partition(ms_path, zarr_path, ms_v4_id, partition_info, config):
+    ''' Convert MSv2 partition to msv4 dataset in zarr store and return its name (worker) '''
+    compressor = config['compressor']
+    if isinstance(compressor, str):
+        compressor = zarr.codecs.BloscCodec(cname=compressor, clevel=5, shuffle="noshuffle")
+    convert_and_write_partition(
+        ms_path,
+        zarr_path,
+        ms_v4_id,
+        partition_info=partition_info,
+        use_table_iter=False,
+        partition_scheme=config['partition_scheme'],
+        main_chunksize=config['main_chunksize'],
+        compressor=compressor,
+        persistence_mode="a",
+    )
+    return msv4_name(ms_path, ms_v4_id)
+
+def _finalize_store(zarr_path):
+    ''' Mark zarr store as processing set and consolidate metadata, as convert_msv2_to_processing_set does (worker) '''
+    root_group = zarr.open(zarr_path, mode="r+")
+    root_group.attrs["type"] = "processing_set"
+    zarr.consolidate_metadata(root_group.store)
@@ -5,13 +5,17 @@ Modify/add xarray Dataset coordinates for plotting.
 import numpy as np
 from pandas import to_datetime
 
-def set_coordinates(ms_xdt):
+from casagui.data.measurement_set.processing_set._ps_baselines import make_baseline_names
+
+def set_coordinates(ms_xdt, baseline_names=None):
     ''' Convert coordinate units and add baseline coordinate for plotting.
+            baseline_names (numpy array): baseline name for each baseline_id, e.g. from BaselineIndex.
+                Default None: create names from baseline antenna names.
         Returns xarray.Dataset
     '''
     _set_coordinate_unit(ms_xdt)
     _set_frequency_unit(ms_xdt)
-    return _add_baseline_coordinate(ms_xdt)
+    return _add_baseline_coordinate(ms_xdt, baseline_names)
 
 def set_datetime_coordinate(ms_xds):
     ''' Convert float time to datetime for plotting. '''
@@ -54,7 +58,7 @@ def _set_frequency_unit(ms_xdt):
         frequency_xda = frequency_xda.assign_attrs(frequency_attrs)
         ms_xdt.coords['frequency'] = frequency_xda
 
-def _add_baseline_coordinate(ms_xdt):
+def _add_baseline_coordinate(ms_xdt, baseline_names=None):
     '''
         Replace "baseline_id" (int) with "baseline" (string) coordinate "ant1 & ant2".
         Baseline ids are not consistent across ms_xdts. 
@@ -65,14 +69,12 @@ def _add_baseline_coordinate(ms_xdt):
     if 'baseline_id' not in baseline_ms_xdt.coords:
         return baseline_ms_xdt
 
-    ant1_names = ms_xdt.baseline_antenna1_name.values
-    ant2_names = ms_xdt.baseline_antenna2_name.values
-    if ant1_names.size == 1:
-        baseline_names = f"{ant1_names.item()} & {ant2_names.item()}"
-        baseline_ms_xdt = baseline_ms_xdt.assign_coords({"baseline": np.array(baseline_names)})
+    if baseline_names is None:
+        baseline_names = make_baseline_names(ms_xdt.baseline_antenna1_name.values, ms_xdt.baseline_antenna2_name.values)
+    if np.size(baseline_names) == 1:
+        baseline_ms_xdt = baseline_ms_xdt.assign_coords({"baseline": np.array(np.ravel(baseline_names)[0])})
     else:
-        baseline_names = [f"{ant1_names[idx]} & {ant2_names[idx]}" for idx in range(len(ant1_names))]
-        baseline_ms_xdt = baseline_ms_xdt.assign_coords({"baseline": ("baseline_id", np.array(baseline_names))})
+        baseline_ms_xdt = baseline_ms_xdt.assign_coords({"baseline": ("baseline_id", np.asarray(baseline_names))})
         baseline_ms_xdt = baseline_ms_xdt.swap_dims({"baseline_id": "baseline"})
     baseline_ms_xdt = baseline_ms_xdt.drop("baseline_id")
     return baseline_ms_xdt
@@ -8,9 +8,15 @@ import pandas as pd
 try:
     from casagui.data.measurement_set.processing_set._ps_io import get_processing_set
     _HAVE_XRADIO = True
+    from casagui.data.measurement_set.processing_set._ps_baselines import BaselineIndex
+    from casagui.data.measurement_set.processing_set._ps_chunks import (chunk_read_report, write_rechunked_ps,
+        DEFAULT_TARGET_CHUNK_MB)
+    from casagui.data.measurement_set.processing_set._ps_convert import MsConverter
+    from casagui.data.measurement_set.processing_set._ps_overview import PsOverview, write_overview
     from casagui.data.measurement_set.processing_set._ps_select import select_ps
-    from casagui.data.measurement_set.processing_set._ps_stats import calculate_ps_stats
-    from casagui.data.measurement_set.processing_set._ps_raster_data import raster_data
+    from casagui.data.measurement_set.processing_set._ps_stats import calculate_ps_stats, calculate_ps_quantiles
+    from casagui.data.measurement_set.processing_set._ps_stats_cache import stats_key, get_cached_stats, set_cached_stats
+    from casagui.data.measurement_set.processing_set._ps_raster_data import raster_data, lazy_raster_data, compute_raster_data
     from casagui.data.measurement_set.processing_set._xds_data import get_correlated_data
 except ImportError as e:
     _HAVE_XRADIO = False
@@ -21,7 +27,7 @@ class PsData:
     Class implementing data backend using xradio Processing Set for accessing and selecting MeasurementSet data.
     '''
 
-    def __init__(self, ms, logger):
+    def __init__(self, ms, logger, convert_selection=None, convert_config=None):
         if not _HAVE_XRADIO:
             raise RuntimeError("xradio package not available for reading MeasurementSet")
 
@@ -29,20 +35,42 @@ class PsData:
             raise RuntimeError("MS path not available for reading MeasurementSet")
 
         # Open processing set from zarr
-        # Converts msv2 if ms path is not zarr
-        self._ps_xdt, self._zarr_path = get_processing_set(ms, logger)
+        # Converts msv2 if ms path is not zarr, starting with convert_selection
+        self._ps_xdt, self._zarr_path, self._converter = get_processing_set(ms, logger, convert_selection,
+            convert_config)
+
+        # Antenna and baseline index used for baseline names and antenna selection
+        self._baseline_index = BaselineIndex(self._ps_xdt)
 
         self._logger = logger
         self._selection = {}
         self._selected_ps_xdt = None # cumulative selection
 
+        # Memoized summary and metadata for original and selected ps_xdt; selected is cleared with selection
+        self._ps_metadata = {}
+        self._selected_ps_metadata = {}
+
+        # Averaged levels for overview plots, opened when first plotted
+        self._overview = None
+        self._overview_opened = False
+
     def get_path(self):
         ''' Return path to zarr file (input or converted from msv2) '''
         return self._zarr_path
 
+    def get_convert_config(self):
+        ''' Return MSv2 conversion configuration, or None if zarr file was already converted '''
+        return self._converter.get_config() if self._converter else None
+
+    def close(self):
+        ''' Stop MSv2 conversion; converted data can still be accessed '''
+        if self._converter is not None:
+            self._converter.close()
+
     def summary(self, data_group='base', columns=None):
         ''' Print full or selected summary of Processing Set metadata, optionally by ms '''
-        ps_summary = self._ps_xdt.xr_ps.summary(data_group=data_group)
+        ps_summary = self._get_metadata(('summary', data_group),
+            lambda: self._ps_xdt.xr_ps.summary(data_group=data_group), self._ps_metadata)
         pd.set_option("display.max_rows", len(self._ps_xdt))
         pd.set_option("display.max_columns", len(ps_summary.columns))
         pd.set_option("display.max_colwidth", None)
@@ -77,7 +105,7 @@ class PsData:
 
     def get_summary(self):
         ''' Return summary of original ps '''
-        return self._ps_xdt.xr_ps.summary()
+        return self._get_metadata('summary', self._ps_xdt.xr_ps.summary, self._ps_metadata)
 
     def get_data_groups(self):
         ''' Returns set of data group names in Processing Set data. '''
@@ -108,8 +136,7 @@ class PsData:
 
     def get_max_dims(self):
         ''' Returns maximum length of data dimensions in selected ps_xdt (if selected) '''
-        ps_xdt = self._get_ps_xdt()
-        return ps_xdt.xr_ps.get_max_dims()
+        return dict(self._get_metadata('max_dims', self._get_ps_xdt().xr_ps.get_max_dims))
 
     def get_data_dimensions(self):
         ''' Return the maximum dimensions in selected ps_xdt (if selected) '''
@@ -120,19 +147,20 @@ class PsData:
 
     def get_dimension_values(self, dimension):
         ''' Return sorted list of unique values for input dimension in ProcessingSet. '''
+        return list(self._get_metadata(('dimension_values', dimension), lambda: self._get_dimension_values(dimension)))
+
+    def _get_dimension_values(self, dimension):
+        ''' Return sorted list of unique values for input dimension in selected ps_xdt '''
         ps_xdt = self._get_ps_xdt()
+        if dimension == 'baseline':
+            return self._baseline_index.get_ps_baseline_names(ps_xdt).tolist()
+
         dim_values = []
         for ms_xdt in ps_xdt.values():
-            if dimension == 'baseline':
-                ant1_names = ms_xdt.baseline_antenna1_name.values
-                ant2_names = ms_xdt.baseline_antenna2_name.values
-                for baseline_id in ms_xdt.baseline_id:
-                    dim_values.append(f"{ant1_names[baseline_id]} & {ant2_names[baseline_id]}")
-            else:
-                try:
-                    dim_values.extend([value.item() for value in ms_xdt[dimension].values])
-                except TypeError:
-                    dim_values.append(ms_xdt[dimension].values.item())
+            try:
+                dim_values.extend([value.item() for value in ms_xdt[dimension].values])
+            except TypeError:
+                dim_values.append(ms_xdt[dimension].values.item())
         return sorted(set(dim_values))
 
     def get_dimension_attrs(self, dim):
@@ -142,19 +170,12 @@ class PsData:
 
     def get_first_spw(self):
         ''' Return first spw name by id '''
-        spw_id_names = {}
-        ps_xdt = self._get_ps_xdt()
-        for ms_xdt in ps_xdt.values():
-            freq_xds = ms_xdt.frequency
-            spw_id_names[freq_xds.spectral_window_id] = freq_xds.spectral_window_name
-
+        spw_id_names = self._get_metadata('spw_id_names', self._get_spw_id_names)
         first_spw_id = min(spw_id_names)
         first_spw_name = spw_id_names[first_spw_id]
 
-        summary = self.get_summary()
-        spw_df = summary[summary['spw_name'] == first_spw_name]
-        start_freq = spw_df.at[spw_df.index[0], 'start_frequency']
-        end_freq = spw_df.at[spw_df.index[0], 'end_frequency']
+        start_freq, end_freq = self._get_metadata('spw_frequency_ranges', self._get_spw_frequency_ranges,
+            self._ps_metadata)[first_spw_name]
         self._logger.info(f"Selecting first spw {first_spw_name} (id {first_spw_id}) with frequency range {start_freq:e} - {end_freq:e}")
         return first_spw_name
 
@@ -163,7 +184,9 @@ class PsData:
             If previous selection done, apply to selected ps_xdt.
             Add selection to previous selections. '''
         ps_xdt = self._get_ps_xdt()
-        self._selected_ps_xdt = select_ps(ps_xdt, selection, self._logger)
+        self._selected_ps_xdt = select_ps(ps_xdt, selection, self._logger, self._baseline_index,
+            self._get_ps_summary())
+        self._selected_ps_metadata = {}
         if self._selection:
             self._selection |= selection
         else:
@@ -173,14 +196,92 @@ class PsData:
         ''' Clear previous selections and use original ps_xdt '''
         self._selection = None
         self._selected_ps_xdt = None
+        self._selected_ps_metadata = {}
+
+    def update_conversion(self, selection, wait=True):
+        ''' Convert MSv2 data needed for selection (spw_name, field_name, scan_name) if not converted.
+            If wait, waits for conversion of all data in the spw to plot: the selected spw, or the first spw
+            with data in selection, which is plotted by default.  Plot, stats, and color limits use the whole spw.
+            Else the remaining data is converted in the background; use is_conversion_complete() to check.
+            Reopens ProcessingSet and clears selection if msv4 datasets were added.
+            Returns whether ProcessingSet was updated. '''
+        if self._converter is None:
+            return False
+        self._converter.request(selection)
+        if wait:
+            spw_selection = self._converter.get_spw_selection(selection)
+            if spw_selection:
+                self._converter.wait(spw_selection)
+        partitions = self._converter.get_partitions()
+        if len(partitions) == len(self._ps_xdt):
+            return False
+
+        self._logger.info(f"Reopening processing set with {len(partitions)} converted msv4 datasets.")
+        self._ps_xdt = self._converter.open_processing_set()
+        self._baseline_index = BaselineIndex(self._ps_xdt)
+        self._ps_metadata = {}
+        self._overview = None
+        self._overview_opened = False
+        self.clear_selection()
+        return True
+
+    def is_conversion_complete(self, selection):
+        ''' Returns whether MSv2 data needed for selection (spw_name, field_name, scan_name) is converted. '''
+        if self._converter is None:
+            return True
+        return self._converter.is_complete(selection)
 
     def get_vis_stats(self, selection, vis_axis):
         ''' Returns statistics (min, max, mean, std) for data selected by selection.
+            Stats are stored in a sidecar file next to the zarr store and reused
+            until the zarr store is modified.
                 selection (dict): fields and values to select
         '''
-        stats_ps_xdt = select_ps(self._ps_xdt, selection, self._logger)
-        data_group = selection['data_group'] if 'data_group' in selection else 'base'
-        return calculate_ps_stats(stats_ps_xdt, self._zarr_path, vis_axis, data_group, self._logger)
+        data_group = selection.get('data_group', selection.get('data_group_name', 'base'))
+        key = stats_key(selection, data_group, vis_axis)
+        cached = get_cached_stats(self._zarr_path, key, self._logger)
+        if cached is not None:
+            self._logger.debug(f"Using saved stats for {key}")
+            if cached['count'] == 0:
+                return None
+            return cached['min'], cached['max'], cached['mean'], cached['std']
+
+        stats_ps_xdt = select_ps(self._ps_xdt, selection, self._logger, self._baseline_index, self.get_summary())
+        stats = calculate_ps_stats(stats_ps_xdt, self._zarr_path, vis_axis, data_group, self._logger, include_count=True)
+        if stats is None:
+            set_cached_stats(self._zarr_path, key, {'count': 0}, self._logger)
+            return None
+        data_min, data_max, data_mean, data_std, data_count = stats
+        set_cached_stats(self._zarr_path, key,
+            {'min': float(data_min), 'max': float(data_max), 'mean': float(data_mean), 'std': float(data_std), 'count': data_count},
+            self._logger)
+        return data_min, data_max, data_mean, data_std
+
+    def get_vis_quantiles(self, selection, vis_axis, quantiles, sample_fraction=None):
+        ''' Returns approximate quantile values for unflagged data selected by selection,
+            or None if all data is flagged. Quantiles are saved like stats (see get_vis_stats).
+                selection (dict): fields and values to select
+                vis_axis (str): visibility component (amp, phase, real, imag, weight, sigma)
+                quantiles (list): quantiles in range [0, 1]
+                sample_fraction (float): fraction of the time chunks of each msv4 dataset to use, None for all
+        '''
+        data_group = selection.get('data_group', selection.get('data_group_name', 'base'))
+        key = stats_key(selection, data_group, vis_axis) + f" quantiles={list(quantiles)} sample={sample_fraction}"
+        cached = get_cached_stats(self._zarr_path, key, self._logger)
+        if cached is not None:
+            self._logger.debug(f"Using saved quantiles for {key}")
+            return cached['quantiles']
+
+        # Saved stats are only used to skip selections with no unflagged data
+        stats = get_cached_stats(self._zarr_path, stats_key(selection, data_group, vis_axis), self._logger)
+        if stats is not None and stats['count'] == 0:
+            values = None
+        else:
+            stats_ps_xdt = select_ps(self._ps_xdt, selection, self._logger, self._baseline_index, self.get_summary())
+            values = calculate_ps_quantiles(stats_ps_xdt, self._zarr_path, vis_axis, data_group, quantiles, self._logger,
+                sample_fraction)
+        set_cached_stats(self._zarr_path, key, {'quantiles': values}, self._logger)
+        return values
 
     def get_correlated_data(self, data_group):
         ''' Returns name of 'correlated_data' in Processing Set data_group '''
@@ -194,13 +295,96 @@ class PsData:
         ''' Returns xarray Dataset after applying plot inputs and raster plane selection '''
         return raster_data(self._get_ps_xdt(),
             plot_inputs,
-            self._logger
+            self._logger,
+            self._baseline_index,
+            self._get_ps_summary(),
+            self._get_overview()
+        )
+
+    def get_lazy_raster_data(self, plot_inputs):
+        ''' Returns lazy raster data (see get_raster_data) to compute with compute_raster_data '''
+        return lazy_raster_data(self._get_ps_xdt(),
+            plot_inputs,
+            self._logger,
+            self._baseline_index,
+            self._get_ps_summary(),
+            self._get_overview()
         )
 
+    def compute_raster_data(self, lazy_data):
+        ''' Returns list of xarray Dataset (None if all nan) computed together from list of lazy raster data '''
+        return compute_raster_data(lazy_data, self._logger)
+
+    def get_chunk_report(self, plot_inputs):
+        ''' Returns estimate of bytes read from zarr chunks for raster data with plot_inputs (see chunk_read_report).
+            Uses current selection and raster plane selection (dim_selection) set by get_raster_data.
+            Returns None if overview data was plotted. '''
+        if plot_inputs.get('overview_level'):
+            return None
+        ps_xdt = self._get_ps_xdt()
+        if plot_inputs.get('dim_selection'):
+            ps_xdt = select_ps(ps_xdt, plot_inputs['dim_selection'], self._logger, self._baseline_index,
+                self._get_ps_summary())
+        return chunk_read_report(self._ps_xdt, ps_xdt, [plot_inputs['correlated_data'], 'FLAG'])
+
+    def write_rechunked(self, zarr_path, data_group='base', plot_axes=None, target_chunk_mb=None):
+        ''' Write copy of ProcessingSet to zarr_path with data chunked for raster plots of plot_axes.
+            Returns dict of msv4 name: chunk sizes. '''
+        correlated_data = self.get_correlated_data(data_group)
+        if target_chunk_mb is None:
+            target_chunk_mb = DEFAULT_TARGET_CHUNK_MB
+        return write_rechunked_ps(self._ps_xdt, zarr_path, correlated_data, self._logger, plot_axes, target_chunk_mb)
+
+    def build_overview(self, data_group='base', factors=None):
+        ''' Write averaged levels of correlated data next to the zarr store, used for raster plots
+            which have fewer pixels than data samples along the time or frequency axis.
+            factors (list): (time, frequency) averaging factor of each level, None for default.
+            Returns path of overview store. '''
+        if self._converter is not None and not MsConverter.is_converted(self._zarr_path):
+            raise RuntimeError("Cannot build overview until MSv2 conversion is complete.")
+        overview_path = write_overview(self._ps_xdt, self._zarr_path, data_group, self._logger, factors)
+        self._overview = PsOverview.open(self._zarr_path, self._logger)
+        self._overview_opened = True
+        return overview_path
+
+    def _get_overview(self):
+        ''' Returns PsOverview for zarr store, or None if not built or out of date '''
+        if not self._overview_opened:
+            self._overview = PsOverview.open(self._zarr_path, self._logger)
+            self._overview_opened = True
+        return self._overview
+
     def _get_ps_xdt(self):
         ''' Returns selected ps_xdt if selection has been done, else original ps_xdt '''
         return self._selected_ps_xdt if self._selected_ps_xdt else self._ps_xdt
 
+    def _get_metadata(self, key, calculate, metadata=None):
+        ''' Return memoized value for key in metadata dict (default: for selected ps_xdt if selected),
+            calling calculate() if not set '''
+        if metadata is None:
+            metadata = self._selected_ps_metadata if self._selected_ps_xdt else self._ps_metadata
+        if key not in metadata:
+            metadata[key] = calculate()
+        return metadata[key]
+
+    def _get_ps_summary(self):
+        ''' Returns summary of selected ps_xdt if selection has been done, else original ps_xdt '''
+        return self._get_metadata('summary', self._get_ps_xdt().xr_ps.summary)
+
+    def _get_spw_id_names(self):
+        ''' Returns dict of spw id: spw name in selected ps_xdt '''
+        spw_id_names = {}
+        for ms_xdt in self._get_ps_xdt().values():
+            freq_xds = ms_xdt.frequency
+            spw_id_names[freq_xds.spectral_window_id] = freq_xds.spectral_window_name
+        return spw_id_names
+
+    def _get_spw_frequency_ranges(self):
+        ''' Returns dict of spw name: (start frequency, end frequency) from original ps summary '''
+        summary = self.get_summary()
+        spw_df = summary.drop_duplicates('spw_name')
+        return dict(zip(spw_df['spw_name'], zip(spw_df['start_frequency'], spw_df['end_frequency'])))
+
     def _get_unique_values(self, df_col):
         ''' Return unique values in pandas Dataframe column, for summary '''
         values = df_col.to_numpy()
@@ -6,21 +6,21 @@ import os.path
 
 from xradio.measurement_set.open_processing_set import open_processing_set
 
-try:
-    # requires python-casacore
-    from xradio.measurement_set.convert_msv2_to_processing_set import convert_msv2_to_processing_set
-    __HAVE_CASACORE = True
-except ImportError:
-    __HAVE_CASACORE = False
-
-def get_processing_set(ms_path, logger):
+from casagui.data.measurement_set.processing_set._ps_convert import MsConverter
+
+def get_processing_set(ms_path, logger, convert_selection=None, convert_config=None):
     '''
-    Read msv2 or zarr file into processing set
+    Read msv2 or zarr file into processing set.
+    MSv2 is converted to zarr in the background by worker processes; returns when the first
+    partition of the data in convert_selection (spw_name, field_name, scan_name) has been written.
+    Remaining data is converted when requested with the converter.
 
     Args:
         ms_path (str): path to MSv2 or MSv4 zarr file
+        convert_selection (dict): selection of MSv2 data to convert first, default all.
+        convert_config (dict): MSv2 conversion configuration, see check_convert_config.
     Returns:
-        xradio ProcessingSet
+        xradio ProcessingSet, path to zarr file, MsConverter (None if complete zarr file)
     '''
 
     if not os.path.exists(ms_path):
@@ -30,26 +30,30 @@ def get_processing_set(ms_path, logger):
     if ms_path[-1] == '/':
         ms_path = ms_path[:-1]
 
+    converter = None
     basename, ext = os.path.splitext(ms_path)
     if ext == ".zarr":
         zarr_path = ms_path
     else:
-        if not __HAVE_CASACORE:
-            raise RuntimeError("Cannot convert MSv2 to xradio zarr file: python-casacore not installed.")
         zarr_path = basename + ".ps.zarr"
-        if not os.path.exists(zarr_path):
+        if not MsConverter.is_converted(zarr_path):
             logger.info(f"Converting input MS {ms_path} to zarr {zarr_path}")
-            convert_msv2_to_processing_set(
-                in_file=ms_path,
-                out_file=zarr_path
-                )
-
-    if not os.path.exists(zarr_path):
-        raise RuntimeError("Zarr file does not exist")
+            converter = MsConverter(ms_path, zarr_path, logger, convert_config)
+            try:
+                converter.wait(convert_selection, min_partitions=1)
+            except RuntimeError:
+                converter.close()
+                raise
+
+    if converter:
+        ps = converter.open_processing_set()
+    else:
+        if not os.path.exists(zarr_path):
+            raise RuntimeError("Zarr file does not exist")
+        ps = open_processing_set(zarr_path)
 
-    ps = open_processing_set(zarr_path)
     if not ps or len(ps) == 0:
         raise RuntimeError("Failed to read measurement set into processing set.")
     logger.info(f"Processing set contains {len(ps)} msv4 datasets.")
 
-    return ps, zarr_path
+    return ps, zarr_path, converter
@@ -0,0 +1,257 @@
+'''
+    Overview levels of ProcessingSet correlated data: reduced-resolution copies for fast raster plots.
+
+    Each level averages the correlated data in blocks of time and/or frequency samples.
+    The correlated data is the mean of the unflagged data (the mean of all data if the whole block is flagged),
+    AMPLITUDE is the mean amplitude of the unflagged data, FLAG_FRACTION is the fraction of flagged data,
+    and the flag is set only if the whole block is flagged.
+    Levels are written to a zarr store next to the ProcessingSet (<name>.ps.zarr.overview.zarr), with a group
+    for each level containing a dataset for each msv4.  The overview records a fingerprint of the ProcessingSet
+    store and is ignored when the store is modified.
+
+    A raster plot uses the coarsest level with at least one sample per plot pixel along each averaged axis,
+    for the size of exported plots, or DEFAULT_PLOT_PIXELS when the plot size is not known.
+    Only time and frequency plot axes are averaged: a plot with a time or frequency selection (zoom),
+    or with time or frequency selected or aggregated, uses the full resolution data.
+'''
+
+import os
+
+import numpy as np
+import xarray as xr
+
+from casagui.data.measurement_set.processing_set._ps_stats_cache import store_fingerprint
+from casagui.data.measurement_set.processing_set._xds_data import get_axis_data, get_frequency_scale, get_vis_units
+from casagui.plot.ms_plot._ms_plot_constants import VIS_AXIS_OPTIONS
+
+_OVERVIEW_SUFFIX = ".overview.zarr"
+_OVERVIEW_VERSION = 1
+
+# (time, frequency) averaging factors of overview levels
+DEFAULT_OVERVIEW_FACTORS = [(8, 1), (64, 1), (1, 8), (1, 64), (8, 8), (64, 64)]
+
+# (x, y) plot size in pixels used to choose overview level when the plot size is not known
+DEFAULT_PLOT_PIXELS = (900, 600)
+
+def get_overview_path(zarr_path):
+    ''' Return path of overview store for ProcessingSet zarr store '''
+    return zarr_path.rstrip(os.sep) + _OVERVIEW_SUFFIX
+
+def check_overview_factors(factors):
+    ''' Return list of (time, frequency) averaging factors, default DEFAULT_OVERVIEW_FACTORS.
+        Raises TypeError or ValueError for invalid factors. '''
+    if factors is None:
+        return DEFAULT_OVERVIEW_FACTORS.copy()
+    if not isinstance(factors, (list, tuple)) or not factors:
+        raise TypeError("Invalid parameter type: overview factors must be a list of (time, frequency) tuples.")
+    checked = []
+    for level_factors in factors:
+        if not isinstance(level_factors, (list, tuple)) or len(level_factors) != 2:
+            raise TypeError("Invalid parameter type: overview factors must be a list of (time, frequency) tuples.")
+        if not all(isinstance(factor, (int, np.integer)) and factor > 0 for factor in level_factors):
+            raise ValueError(f"Invalid parameter value: overview factors {level_factors} must be positive integers.")
+        if tuple(level_factors) == (1, 1):
+            raise ValueError("Invalid parameter value: overview factors (1, 1) do not average data.")
+        checked.append((int(level_factors[0]), int(level_factors[1])))
+    return checked
+
+def write_overview(ps_xdt, zarr_path, data_group, logger, factors=None):
+    '''
+    Write overview levels of ProcessingSet correlated data next to the zarr store, replacing any existing overview.
+        ps_xdt (xarray DataTree): ProcessingSet opened from zarr_path.
+        zarr_path (str): path of ProcessingSet zarr store.
+        data_group (str): data group of correlated data and flags to average.
+        factors (list): (time, frequency) averaging factor of each level. Default DEFAULT_OVERVIEW_FACTORS.
+    Returns path of overview store.
+    '''
+    factors = check_overview_factors(factors)
+    overview_path = get_overview_path(zarr_path)
+
+    levels = {}
+    children = {}
+    correlated_data = None
+    for time_factor, freq_factor in factors:
+        level = f"time{time_factor}_freq{freq_factor}"
+        levels[level] = {'time': time_factor, 'frequency': freq_factor}
+        for name, ms_xdt in ps_xdt.items():
+            if data_group not in ms_xdt.attrs.get('data_groups', {}):
+                continue
+            correlated_data = ms_xdt.attrs['data_groups'][data_group]['correlated_data']
+            children[f"{level}/{name}"] = _overview_xds(ms_xdt.ds, data_group, levels[level])
+    if not children:
+        raise RuntimeError(f"Cannot build overview: no msv4 datasets with data group {data_group}")
+
+    overview_xdt = xr.DataTree.from_dict(children)
+    overview_xdt.attrs = {
+        'type': 'ps_overview',
+        'version': _OVERVIEW_VERSION,
+        'fingerprint': store_fingerprint(zarr_path),
+        'data_group': data_group,
+        'correlated_data': correlated_data,
+        'levels': levels,
+    }
+
+    # Levels are computed together so that the ProcessingSet data is read once
+    logger.info(f"Writing overview levels {list(levels)} to {overview_path}")
+    overview_xdt.to_zarr(overview_path, mode="w", compute=False).compute()
+    return overview_path
+
+class PsOverview:
+    '''
+    Overview levels of ProcessingSet correlated data written by write_overview, to plot instead of the full
+    resolution data when the plot has fewer pixels than data samples along its time or frequency axis.
+    '''
+
+    def __init__(self, overview_path):
+        self._overview_xdt = xr.open_datatree(overview_path, engine="zarr", chunks={}, chunked_array_type="dask")
+        self._levels = self._overview_xdt.attrs['levels']
+
+    @staticmethod
+    def open(zarr_path, logger):
+        ''' Return PsOverview for ProcessingSet zarr store, or None if there is no overview or the store
+            has been modified since the overview was written. '''
+        overview_path = get_overview_path(zarr_path)
+        if not os.path.exists(overview_path):
+            return None
+        try:
+            overview = PsOverview(overview_path)
+        except (OSError, KeyError, ValueError) as exc:
+            logger.warning(f"Cannot open overview {overview_path}: {exc}")
+            return None
+        attrs = overview.get_attrs()
+        if attrs.get('version') != _OVERVIEW_VERSION or attrs.get('fingerprint') != store_fingerprint(zarr_path):
+            logger.info(f"Ignoring overview {overview_path}: ProcessingSet has been modified. Rebuild overview to use it.")
+            return None
+        logger.debug(f"Using overview levels {list(overview.get_levels())} from {overview_path}")
+        return overview
+
+    def get_attrs(self):
+        ''' Return overview store attributes (data_group, correlated_data, levels) '''
+        return dict(self._overview_xdt.attrs)
+
+    def get_levels(self):
+        ''' Return dict of level name: {'time': factor, 'frequency': factor} '''
+        return self._levels.copy()
+
+    def select(self, raster_xdt, plot_inputs, logger, plot_pixels=None):
+        '''
+        Select overview data for raster plot.
+            raster_xdt (xarray DataTree): full resolution msv4 datasets selected for raster plane.
+            plot_inputs (dict): user inputs for plot.
+            plot_pixels (tuple): (x, y) plot size in pixels, default DEFAULT_PLOT_PIXELS if not known.
+        Returns (overview DataTree with the same msv4 names and selection, level name),
+            or (raster_xdt, None) if no level can be used for the plot.
+        '''
+        level = self._choose_level(raster_xdt, plot_inputs, plot_pixels or DEFAULT_PLOT_PIXELS)
+        if level is None:
+            return raster_xdt, None
+
+        factors = self._levels[level]
+        children = {}
+        for name, ms_xdt in raster_xdt.items():
+            overview_xds = self._overview_xdt[level][name].ds
+            # Select non-averaged dimensions by value, as in the full resolution selection
+            for dim in overview_xds.dims:
+                if factors.get(dim, 1) == 1 and dim in ms_xdt.coords:
+                    overview_xds = _select_dim(overview_xds, ms_xdt, dim)
+            children[name] = xr.DataTree(overview_xds)
+        logger.info(f"Plotting overview level {level} (time and frequency averaged by {factors['time']} and "
+            f"{factors['frequency']} samples). Select a time or frequency range to plot full resolution data.")
+        return xr.DataTree(children=children), level
+
+    def _choose_level(self, raster_xdt, plot_inputs, plot_pixels):
+        ''' Return name of coarsest level with at least one sample per pixel on averaged plot axes, or None '''
+        attrs = self._overview_xdt.attrs
+        if (plot_inputs['selection'].get('data_group_name') != attrs['data_group']
+            or plot_inputs['correlated_data'] != attrs['correlated_data']
+            or plot_inputs['vis_axis'] not in VIS_AXIS_OPTIONS
+            or plot_inputs.get('rasterize')):
+            # Rasterized plots re-aggregate full resolution data on zoom
+            return None
+
+        axis_pixels = {plot_inputs['x_axis']: plot_pixels[0], plot_inputs['y_axis']: plot_pixels[1]}
+        selection = plot_inputs['selection']
+        coarsest = None
+        for level, factors in self._levels.items():
+            if any(name not in self._overview_xdt[level] for name in raster_xdt):
+                continue
+            usable = True
+            for dim, factor in factors.items():
+                if factor == 1:
+                    continue
+                if dim not in axis_pixels or dim in selection:
+                    usable = False
+                elif _averaged_size(raster_xdt, dim, factor) < axis_pixels[dim]:
+                    usable = False
+            if usable and (coarsest is None or np.prod(list(factors.values())) >
+                np.prod(list(self._levels[coarsest].values()))):
+                coarsest = level
+        return coarsest
+
+def get_overview_axis_data(xds, axis, data_group=None):
+    ''' Get vis axis data from overview xarray Dataset: mean amplitude for amp, else from mean correlated data.
+        AMPLITUDE has the units of the correlated data it was averaged from. '''
+    if axis == 'amp' and 'AMPLITUDE' in xds.data_vars:
+        return xds.AMPLITUDE.assign_attrs(units=get_vis_units(xds.AMPLITUDE))
+    return get_axis_data(xds, axis, data_group)
+
+def _averaged_size(raster_xdt, dim, factor):
+    ''' Return number of averaged samples along plot axis: times are concatenated, frequencies are not '''
+    sizes = [-(-ms_xdt.sizes[dim] // factor) for ms_xdt in raster_xdt.values() if dim in ms_xdt.dims]
+    if not sizes:
+        return 0
+    return sum(sizes) if dim == 'time' else max(sizes)
+
+def _select_dim(overview_xds, ms_xdt, dim):
+    ''' Select values of dim in ms_xdt from overview xds.  Float values are matched to the nearest value,
+        in the same units: frequency may have been converted for plotting. '''
+    values = ms_xdt[dim].values
+    if values.dtype.kind != 'f':
+        return overview_xds.sel({dim: values})
+    if dim == 'frequency':
+        values = values * (get_frequency_scale(ms_xdt[dim]) / get_frequency_scale(overview_xds[dim]))
+    return overview_xds.sel({dim: values}, method='nearest')
+
+def _overview_xds(xds, data_group, factors):
+    ''' Return lazy xarray Dataset of correlated data in xds averaged by factors {dim: factor} '''
+    group_info = xds.attrs['data_groups'][data_group]
+    correlated_data = group_info['correlated_data']
+    flag = group_info['flag']
+    xda = xds[correlated_data]
+    windows = {dim: factor for dim, factor in factors.items() if factor > 1 and dim in xda.dims}
+
+    # Coordinates which cannot be averaged (e.g. scan_name) are set from the first sample in each block
+    block_coords = [name for name, coord in xda.coords.items()
+        if name not in coord.dims and set(coord.dims) & set(windows)]
+    xda = xda.drop_vars(block_coords)
+    flag_xda = xds[flag].drop_vars(block_coords, errors='ignore')
+
+    flag_fraction = _block_mean(flag_xda.astype(np.float32), windows)
+    all_flagged = flag_fraction == 1.0
+    mean_xda = _block_mean(xda.where(~flag_xda), windows).where(~all_flagged, _block_mean(xda, windows))
+    amp_xda = np.absolute(xda)
+    mean_amp_xda = _block_mean(amp_xda.where(~flag_xda), windows).where(~all_flagged, _block_mean(amp_xda, windows))
+
+    overview_xds = xr.Dataset({
+            correlated_data: mean_xda,
+            'AMPLITUDE': mean_amp_xda.assign_attrs(units=get_vis_units(xda)),
+            'FLAG_FRACTION': flag_fraction,
+            flag: all_flagged,
+        }, attrs=xds.attrs)
+    for name in block_coords:
+        coord = xds[name]
+        first = coord.isel({dim: slice(None, None, windows[dim]) for dim in coord.dims if dim in windows})
+        overview_xds = overview_xds.assign_coords({name: (coord.dims, first.values, coord.attrs)})
+
+    # Write uniform chunks of the averaged data, not the chunks of the input store
+    chunks = {}
+    for dim, dim_chunks in zip(xda.dims, xda.chunks or [(size,) for size in xda.shape]):
+        chunks[dim] = max(1, dim_chunks[0] // windows.get(dim, 1))
+    overview_xds = overview_xds.chunk(chunks)
+    for var in overview_xds.variables.values():
+        var.encoding = {}
+    return overview_xds
+
+def _block_mean(xda, windows):
+    ''' Mean of xda in blocks of windows {dim: size}; the last block may be partial. NaN values are skipped. '''
+    return xda.coarsen(windows, boundary='pad').mean(keep_attrs=True)
@@ -2,34 +2,69 @@
 Functions to create a raster xarray Dataset from xradio ProcessingSet after applying plot inputs
 '''
 
+import dask
 import numpy as np
 
 from xradio.measurement_set._utils._utils.stokes_types import stokes_types
 
+from casagui.data.measurement_set.processing_set._ps_baselines import BaselineIndex
 from casagui.data.measurement_set.processing_set._ps_concat import concat_ps_xdt
 from casagui.data.measurement_set.processing_set._ps_coords import set_datetime_coordinate
+from casagui.data.measurement_set.processing_set._ps_overview import get_overview_axis_data, DEFAULT_PLOT_PIXELS
 from casagui.data.measurement_set.processing_set._ps_select import select_ps
 from casagui.data.measurement_set.processing_set._xds_data import get_axis_data
 
-def raster_data(ps_xdt, plot_inputs, logger):
+def raster_data(ps_xdt, plot_inputs, logger, baseline_index=None, ps_summary=None, overview=None):
     '''
     Create raster xds: y_axis vs x_axis for vis axis.
         ps_xdt (xarray DataTree): input datasets.
-        plot_inputs (dict): user inputs for plot
+        plot_inputs (dict): user inputs for plot, including 'plot_pixels' (width, height) of the plot if known,
+            used to choose the overview level (default DEFAULT_PLOT_PIXELS).
         logger (graphviper logger): logger
-    Returns: selected xarray Dataset of visibility component and updated selection
+        baseline_index (BaselineIndex): antenna and baseline index for ps_xdt, None to create it.
+        ps_summary (pandas DataFrame): ps_xdt summary, if already computed.
+        overview (PsOverview): averaged levels of ps_xdt to plot if the plot does not need full resolution.
+    Returns: selected xarray Dataset of visibility component and updated selection.
+        The selection, concat, vis axis, and aggregation steps are lazy (dask);
+        the Dataset is computed once at the end so that the selected data is read once.
     '''
-    raster_xdt, dim_selection = _select_raster_ps_xdt(ps_xdt, plot_inputs, logger)
+    lazy_data = lazy_raster_data(ps_xdt, plot_inputs, logger, baseline_index, ps_summary, overview)
+    raster_xds = compute_raster_data([lazy_data], logger)[0]
+    if raster_xds is None:
+        raise RuntimeError("Plot failed: raster plane selection yielded data with all nan values.")
+    return raster_xds
+
+def lazy_raster_data(ps_xdt, plot_inputs, logger, baseline_index=None, ps_summary=None, overview=None):
+    '''
+    Create raster xds as in raster_data without computing it.
+    Sets plot_inputs 'dim_selection', 'overview_level' (None if full resolution data is plotted),
+    and 'overview_pixels' (plot size the overview level was chosen for, None if full resolution data is plotted).
+    Returns: (lazy xarray Dataset, lazy count of selected data) for compute_raster_data.
+    '''
+    if baseline_index is None:
+        baseline_index = BaselineIndex(ps_xdt)
+
+    raster_xdt, dim_selection = _select_raster_ps_xdt(ps_xdt, plot_inputs, baseline_index, ps_summary, logger)
     plot_inputs['dim_selection'] = dim_selection
 
+    # Replace selected data with averaged data if plot does not need full resolution
+    overview_level = None
+    plot_pixels = plot_inputs.get('plot_pixels') or DEFAULT_PLOT_PIXELS
+    if overview is not None:
+        raster_xdt, overview_level = overview.select(raster_xdt, plot_inputs, logger, plot_pixels)
+    plot_inputs['overview_level'] = overview_level
+    plot_inputs['overview_pixels'] = plot_pixels if overview_level else None
+
     # Create xds from concat ms_xds in ps
-    raster_xds = concat_ps_xdt(raster_xdt, logger)
+    raster_xds = concat_ps_xdt(raster_xdt, logger, baseline_index)
     correlated_data = plot_inputs['correlated_data']
-    if raster_xds[correlated_data].count() == 0:
-        raise RuntimeError("Plot failed: raster plane selection yielded data with all nan values.")
+
+    # Count of selected data before aggregation, computed with the raster data
+    data_count = raster_xds[correlated_data].count()
 
     # Set complex component of vis data
-    raster_xds[correlated_data] = get_axis_data(raster_xds,
+    axis_data = get_overview_axis_data if overview_level else get_axis_data
+    raster_xds[correlated_data] = axis_data(raster_xds,
         plot_inputs['vis_axis'],
         plot_inputs['selection']['data_group_name']
     )
@@ -40,10 +75,28 @@ def raster_data(ps_xdt, plot_inputs, logger):
     # Apply aggregator
     raster_xds = aggregate_data(raster_xds, plot_inputs, logger)
 
-    logger.debug(f"Plotting visibility data with shape: {raster_xds[correlated_data].shape}")
-    return raster_xds
+    # Only the vis data and flags are plotted; do not read other data variables
+    return raster_xds[[correlated_data, 'FLAG']], data_count
 
-def _select_raster_ps_xdt(ps_xdt, plot_inputs, logger):
+def compute_raster_data(lazy_data, logger):
+    '''
+    Compute raster xds from lazy_raster_data with a single dask compute, so that
+    the raster planes of several plots (e.g. iteration plots) are read in parallel.
+        lazy_data (list): (lazy xarray Dataset, lazy count) tuples
+        logger (graphviper logger): logger
+    Returns: list of computed xarray Dataset, or None where selected data is all nan.
+    '''
+    computed = dask.compute(*lazy_data)
+    raster_xds_list = []
+    for raster_xds, data_count in computed:
+        if data_count == 0:
+            raster_xds_list.append(None)
+            continue
+        logger.debug(f"Plotting visibility data with dimensions: {dict(raster_xds.sizes)}")
+        raster_xds_list.append(raster_xds)
+    return raster_xds_list
+
+def _select_raster_ps_xdt(ps_xdt, plot_inputs, baseline_index, ps_summary, logger):
     ''' Select default dimensions if needed for raster data '''
     # Determine which dims must be selected, add to selection, and do selection
     input_selection = plot_inputs['selection']
@@ -55,12 +108,12 @@ def _select_raster_ps_xdt(ps_xdt, plot_inputs, logger):
             # Select first value (by index) and add to dim selection, or apply iter_axis value
             # (user selection would have been applied previously)
             if dim not in input_selection:
-                dim_selection[dim] = _get_first_dim_value(ps_xdt, dim, plot_inputs, logger)
+                dim_selection[dim] = _get_first_dim_value(ps_xdt, dim, plot_inputs, baseline_index, ps_summary, logger)
             elif dim == plot_inputs['iter_axis']:
                 dim_selection[dim] = input_selection[dim]
         if dim_selection:
             logger.info(f"Applying raster plane selection (using first index or iter value): {dim_selection}")
-            return select_ps(ps_xdt, dim_selection, logger), dim_selection
+            return select_ps(ps_xdt, dim_selection, logger, baseline_index, ps_summary), dim_selection
     return ps_xdt, dim_selection
 
 def _get_raster_selection_dims(plot_inputs):
@@ -76,14 +129,14 @@ def _get_raster_selection_dims(plot_inputs):
             data_dims.remove(axis)
     return data_dims
 
-def _get_first_dim_value(ps_xdt, dim, plot_inputs, logger):
+def _get_first_dim_value(ps_xdt, dim, plot_inputs, baseline_index, ps_summary, logger):
     ''' Return value of first dimension by index for polarization or by value for others. '''
     # If iter_axis, get first dim value after iter value is selected to avoid empty selected ps
     iter_axis = plot_inputs['iter_axis'] if 'iter_axis' in plot_inputs else None
     iter_ps = ps_xdt
     if iter_axis:
         iter_selection = {iter_axis: plot_inputs['selection'][iter_axis]}
-        iter_ps = select_ps(ps_xdt, iter_selection, logger)
+        iter_ps = select_ps(ps_xdt, iter_selection, logger, baseline_index, ps_summary)
 
     values = []
     if dim == "polarization":
@@ -97,12 +150,7 @@ def _get_first_dim_value(ps_xdt, dim, plot_inputs, logger):
         return stokes[sorted_values[0]]
 
     if dim == 'baseline':
-        for ms_xdt in iter_ps.values():
-            ant1_names = ms_xdt.baseline_antenna1_name.values
-            ant2_names = ms_xdt.baseline_antenna2_name.values
-            for baseline_id in ms_xdt.baseline_id.values:
-                values.append(ant1_names[baseline_id] + " & " + ant2_names[baseline_id])
-            return sorted(list(set(values)))[0]
+        return baseline_index.get_ps_baseline_names(iter_ps)[0].item()
 
     # Get sorted values list
     for ms_xdt in iter_ps.values():
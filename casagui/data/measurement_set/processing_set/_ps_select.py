@@ -1,9 +1,16 @@
 ''' Apply selection dict to ProcessingSet and MeasurementSetXds '''
 
-def select_ps(ps_xdt, selection, logger):
+import numpy as np
+
+from casagui.data.measurement_set.processing_set._ps_baselines import BaselineIndex
+
+def select_ps(ps_xdt, selection, logger, baseline_index=None, ps_summary=None):
     '''
         Apply selection dict to Processing Set.
         Select Processing Set first (ps summary columns), then each MeasurementSetXds (data_group etc.).
+        baseline_index (BaselineIndex): antenna index for baseline/antenna selection.
+            Default None: create index for ps_xdt if needed.
+        ps_summary (pandas DataFrame): ps_xdt summary, if already computed.
         Returns dict of selected name, ms_xdt.
         Throws exception for empty Processing Set (null selection).
     '''
@@ -11,7 +18,8 @@ def select_ps(ps_xdt, selection, logger):
         return ps_xdt
 
     # Separate PS selection and MS selection
-    ps_summary = ps_xdt.xr_ps.summary()
+    if ps_summary is None:
+        ps_summary = ps_xdt.xr_ps.summary()
     ps_selection_keys = list(ps_summary.columns.array)
     ps_selection_keys.append('data_group')
 
@@ -45,9 +53,11 @@ def select_ps(ps_xdt, selection, logger):
         selected_ps_xdt = ps_xdt.copy()
 
     # Do MSXdt selection
-    return _select_ms_xdt(selected_ps_xdt, ms_selection, antenna_selection, logger)
+    if antenna_selection and baseline_index is None:
+        baseline_index = BaselineIndex(selected_ps_xdt)
+    return _select_ms_xdt(selected_ps_xdt, ms_selection, antenna_selection, baseline_index, logger)
 
-def _select_ms_xdt(ps_xdt, ms_selection, antenna_selection, logger):
+def _select_ms_xdt(ps_xdt, ms_selection, antenna_selection, baseline_index, logger):
     ''' Apply selection to each MeasurementSetXds and return ProcessingSet.
         Remove ms_xds which do not contain selection.
     '''
@@ -63,18 +73,31 @@ def _select_ms_xdt(ps_xdt, ms_selection, antenna_selection, logger):
     for name, ms_xdt in ps_xdt.items():
         try:
             if antenna_selection:
-                for antenna, val in antenna_selection.items():
-                    if antenna == 'antenna1':
-                        ms_xdt = ms_xdt.sel(baseline_id=ms_xdt.baseline_antenna1_name==val)
-                    else:
-                        ms_xdt = ms_xdt.sel(baseline_id=ms_xdt.baseline_antenna2_name==val)
+                if not baseline_index.has_baselines(name):
+                    # no baseline_id dimension
+                    names_to_drop.append(name)
+                    continue
 
-                if ms_xdt.baseline_id.size == 1:
+                # Select baselines by antenna id
+                ant1_ids, ant2_ids = baseline_index.get_antenna_ids(name, ms_xdt.baseline_id.values)
+                baseline_mask = np.ones(ant1_ids.size, dtype=bool)
+                for antenna, val in antenna_selection.items():
+                    antenna_ids = ant1_ids if 'antenna1' in antenna else ant2_ids
+                    baseline_mask &= antenna_ids == baseline_index.get_antenna_id(val)
+
+                if not ms_xdt.baseline_id.dims:
+                    # Single baseline already selected
+                    if not baseline_mask[0]:
+                        names_to_drop.append(name)
+                        continue
+                elif baseline_mask.sum() == 1:
                     # Select baseline_id to remove dimension
-                    ms_xdt = ms_xdt.sel(baseline_id=ms_xdt.baseline_id.item())
-                elif ms_xdt.baseline_id.size == 0:
+                    ms_xdt = ms_xdt.isel(baseline_id=np.flatnonzero(baseline_mask)[0])
+                elif not baseline_mask.any():
                     names_to_drop.append(name)
                     continue
+                else:
+                    ms_xdt = ms_xdt.isel(baseline_id=np.flatnonzero(baseline_mask))
 
             ms_xdt = ms_xdt.xr_ms.sel(**ms_selection)
             ps_xdt[name] = ms_xdt
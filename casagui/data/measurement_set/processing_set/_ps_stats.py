@@ -2,6 +2,9 @@
    Calculate statistics on xradio ProcessingSet data.
 '''
 
+import math
+import zlib
+
 import dask
 import numpy as np
 
@@ -19,46 +22,124 @@ except ImportError:
 
 from casagui.data.measurement_set.processing_set._xds_data import get_correlated_data, get_axis_data
 
-def calculate_ps_stats(ps_xdt, ps_store, vis_axis, data_group, logger):
+def calculate_ps_stats(ps_xdt, ps_store, vis_axis, data_group, logger, include_count=False):
     '''
         Calculate stats for unflagged visibilities: min, max, mean, std
         ps_xdt (xarray.DataTree): input MeasurementSet opened from zarr file
         ps_store (str): path to visibility zarr file
         vis_axis (str): complex component (amp, phase, real, imag)
-        Returns: stats tuple (min, max, mean, stddev) or None if all data flagged (count=0)
+        include_count (bool): append number of unflagged visibilities to stats tuple
+        Returns: stats tuple (min, max, mean, stddev[, count]) or None if all data flagged (count=0)
+    '''
+    input_params = _get_input_params(ps_xdt, ps_store, vis_axis, data_group)
+    mapping = _get_task_data_mapping(ps_xdt, _get_n_threads(logger))
+
+    data_min, data_max, data_count, data_mean, data_m2, _ = _calc_stats(ps_xdt, mapping, input_params, logger)
+    if data_count == 0:
+        logger.debug("stats: no unflagged data")
+        return None
+    data_min, data_max = min(0.0, data_min), max(0.0, data_max)
+    data_stddev = (data_m2 / data_count) ** 0.5
+    logger.debug(f"stats: min={data_min:.4f}, max={data_max:.4f}, count={data_count} mean={data_mean:.4f}, stddev={data_stddev:.4f}")
+    stats = (data_min, data_max, data_mean, data_stddev)
+    if include_count:
+        stats += (int(data_count),)
+    return stats
+
+def calculate_ps_quantiles(ps_xdt, ps_store, vis_axis, data_group, quantiles, logger, sample_fraction=None):
+    '''
+        Calculate approximate quantiles for unflagged visibilities using a histogram
+        which is accumulated while reading the data and merged across chunks, so the
+        data is read once.
+        ps_xdt (xarray.DataTree): input MeasurementSet opened from zarr file
+        ps_store (str): path to visibility zarr file
+        vis_axis (str): visibility component (amp, phase, real, imag, weight, sigma)
+        quantiles (list): quantiles in range [0, 1]
+        sample_fraction (float): if set, use a random (reproducible) subset of this fraction
+            of the time chunks of each msv4 dataset, for a faster estimate of large datasets
+        Returns: list of quantile values or None if all data flagged (count=0)
     '''
+    input_params = _get_input_params(ps_xdt, ps_store, vis_axis, data_group)
+    input_params['histogram'] = True
+    if sample_fraction is not None and 0 < sample_fraction < 1:
+        input_params['sample_fraction'] = sample_fraction
+        logger.debug(f"Sampling {sample_fraction} of the time chunks of each msv4 dataset for quantiles.")
+    mapping = _get_task_data_mapping(ps_xdt, _get_n_threads(logger))
+
+    data_min, data_max, data_count, _, _, histogram = _calc_stats(ps_xdt, mapping, input_params, logger)
+    if data_count == 0 or histogram is None:
+        logger.debug("quantiles: no unflagged data")
+        return None
+    values = np.clip(_histogram_quantiles(histogram, quantiles), data_min, data_max).tolist()
+    logger.debug(f"quantiles: {dict(zip(quantiles, values))} from {data_count} values")
+    return values
+
+def _get_input_params(ps_xdt, ps_store, vis_axis, data_group):
+    ''' Return input_params for stats map/reduce '''
     input_params = {}
     input_params['input_data_store'] = ps_store
     input_params['xdt'] = ps_xdt
     input_params['vis_axis'] = vis_axis
     input_params['data_group'] = data_group
+    input_params['histogram'] = False
+    input_params['sample_fraction'] = None
     for ms_xdt in ps_xdt.values():
         if data_group in ms_xdt.attrs['data_groups']:
             input_params['correlated_data'] = get_correlated_data(ms_xdt.ds, data_group)
             break
+    return input_params
 
+def _get_n_threads(logger):
     if _HAVE_TOOLVIPER:
         active_client = get_client() # could be None if not set up outside casagui
     else:
         active_client = None
     n_threads = active_client.thread_info()['n_threads'] if active_client is not None else 4
     logger.debug(f"Setting {n_threads} n_chunks for parallel coords.")
-    mapping = _get_task_data_mapping(ps_xdt, n_threads)
+    return n_threads
+
+# Minimum number of time blocks a dataset is divided into for sampling, so that
+# datasets stored in a single time chunk can still be sampled
+_SAMPLE_TIME_BLOCKS = 16
 
-    data_min, data_max, data_mean = _calc_basic_stats(ps_xdt, mapping, input_params, logger)
-    if np.isfinite(data_mean):
-        input_params['mean'] = data_mean
-        data_stddev = _calc_stddev(ps_xdt, mapping, input_params, logger)
-        return data_min, data_max, data_mean, data_stddev
-    return None
+def _sample_selection(data_selection, xdt, correlated_data, sample_fraction):
+    ''' Return list of data selections which each select one time block (a zarr time chunk
+        or smaller) of an msv4 dataset in data_selection, for a random subset of sample_fraction
+        of the blocks of each dataset. The generator is seeded by the dataset name and
+        selection so that the same blocks are used each time. '''
+    selections = []
+    for name, slices in data_selection.items():
+        xda = xdt[name].ds[correlated_data]
+        time_slice = slices.get('time', slice(None))
+        start, stop, _ = time_slice.indices(xda.sizes['time'])
+        n_times = stop - start
+        if n_times <= 0:
+            continue
+        if xda.chunks:
+            chunk = xda.chunksizes['time'][0]
+        elif 'chunks' in xda.encoding:
+            chunk = xda.encoding['chunks'][xda.dims.index('time')]
+        else:
+            chunk = n_times
+        block = max(1, min(chunk, math.ceil(n_times / _SAMPLE_TIME_BLOCKS)))
+        n_blocks = math.ceil(n_times / block)
+        n_sample = max(1, math.ceil(sample_fraction * n_blocks))
+        rng = np.random.default_rng([zlib.crc32(name.encode()), zlib.crc32(repr(sorted(slices.items())).encode())])
+        for index in sorted(rng.choice(n_blocks, size=n_sample, replace=False)):
+            block_start = start + int(index) * block
+            selections.append({name: {**slices, 'time': slice(block_start, min(block_start + block, stop))}})
+    return selections
 
 def _get_task_data_mapping(ps_xdt, n_threads):
     frequencies = ps_xdt.xr_ps.get_freq_axis()
     parallel_coords = {"frequency": make_parallel_coord(coord=frequencies, n_chunks=n_threads)}
     return interpolate_data_coords_onto_parallel_coords(parallel_coords, ps_xdt)
 
-def _calc_basic_stats(ps_xdt, mapping, input_params, logger):
-    ''' Calculate min, max, mean using graph map/reduce '''
+def _calc_stats(ps_xdt, mapping, input_params, logger):
+    ''' Calculate min, max, count, mean, sum of squared differences from the mean,
+        and (if input_params['histogram']) a histogram of the data in a single
+        graph map/reduce so that the data is read once.  If input_params['sample_fraction']
+        is set, only that fraction of the time chunks of each dataset is read. '''
     graph = graph_map(
         input_data=ps_xdt,
         node_task_data_mapping=mapping,
@@ -71,35 +152,7 @@ def _calc_basic_stats(ps_xdt, mapping, input_params, logger):
     dask_graph = generate_dask_workflow(reduce_map)
     #dask_graph.visualize(filename='stats.png')
     results = dask.compute(dask_graph)
-
-    data_min, data_max, data_sum, data_count = results[0]
-    if data_count == 0.0:
-        logger.debug("stats: no unflagged data")
-        return (data_min, data_max, np.inf)
-
-    data_mean = data_sum / data_count
-    logger.debug(f"basic stats: min={data_min:.4f}, max={data_max:.4f}, sum={data_sum:.4f}, count={data_count} mean={data_mean:.4f}")
-    return data_min, data_max, data_mean
-
-def _calc_stddev(ps_xdt, mapping, input_params, logger):
-    ''' Calculate stddev using graph map/reduce '''
-    graph = graph_map(
-        input_data=ps_xdt,
-        node_task_data_mapping=mapping,
-        node_task=_map_variance,
-        input_params=input_params
-    )
-    reduce_map = graph_reduce(
-        graph, _reduce_variance, input_params, mode='tree'
-    )
-    dask_graph = generate_dask_workflow(reduce_map)
-    results = dask.compute(dask_graph)
-
-    var_sum, var_count = results[0]
-    data_variance = var_sum / var_count
-    data_stddev = data_variance ** 0.5
-    logger.debug(f"stats: variance={data_variance:.4f}, stddev={data_stddev:.4f}")
-    return data_stddev
+    return results[0]
 
 def _get_stats_xda(xds, vis_axis, data_group):
     ''' Return xda with only unflagged cross-corr visibility data '''
@@ -119,100 +172,142 @@ def _get_stats_xda(xds, vis_axis, data_group):
     # return xda with nan where flagged
     return unflagged_xda
 
-def _map_stats(input_params):
-    ''' Return min, max, sum, and count of data chunk '''
-    vis_axis = input_params['vis_axis']
-    data_group = input_params['data_group']
-    correlated_data = input_params['correlated_data']
-    min_vals = []
-    max_vals = []
-    sum_vals = []
-    count_vals = []
-
-    ps_iter = ProcessingSetIterator(
-        input_params['data_selection'],
-        input_params['input_data_store'],
-        input_params['xdt'],
-        input_params['data_group'],
-        include_variables=[correlated_data, 'FLAG'],
-        load_sub_datasets=False
-    )
+def _chunk_stats(values, histogram=False):
+    ''' Return (min, max, count, mean, m2, histogram) for the non-nan values in numpy array,
+        where m2 is the sum of squared differences from the mean and histogram is None
+        unless histogram is True '''
+    values = values[~np.isnan(values)]
+    count = values.size
+    if count == 0:
+        return (np.nan, np.nan, 0, 0.0, 0.0, None)
+    mean = values.mean(dtype=np.float64)
+    diff = values - mean
+    values_min, values_max = values.min(), values.max()
+    chunk_histogram = _chunk_histogram(values, values_min, values_max) if histogram else None
+    return (values_min, values_max, count, mean, float(np.dot(diff, diff)), chunk_histogram)
 
-    for xds in ps_iter:
-        xda = _get_stats_xda(xds, vis_axis, data_group)
-        if xda.count() > 0:
-            xda_data = xda.values.ravel()
-            try:
-                min_vals.append(xda_data[np.nanargmin(xda_data)])
-            except ValueError:
-                pass
-            try:
-                max_vals.append(xda_data[np.nanargmax(xda_data)])
-            except ValueError:
-                pass
-            sum_vals.append(np.nansum(xda))
-            count_vals.append(xda.count().values)
-    try:
-        min_value = np.nanmin(min_vals)
-    except ValueError:
-        min_value = np.nan
-    try:
-        max_value = np.nanmax(max_vals)
-    except ValueError:
-        max_value = np.nan
-    return (min_value, max_value, sum(sum_vals), sum(count_vals))
+def _merge_stats(stats1, stats2):
+    ''' Combine two (min, max, count, mean, m2, histogram) tuples using the parallel
+        variance algorithm of Chan et al. '''
+    min1, max1, count1, mean1, m2_1, hist1 = stats1
+    min2, max2, count2, mean2, m2_2, hist2 = stats2
+    if count1 == 0:
+        return stats2
+    if count2 == 0:
+        return stats1
+    count = count1 + count2
+    delta = mean2 - mean1
+    mean = mean1 + delta * count2 / count
+    m2 = m2_1 + m2_2 + delta * delta * count1 * count2 / count
+    return (np.nanmin([min1, min2]), np.nanmax([max1, max2]), count, mean, m2, _merge_histograms(hist1, hist2))
 
-# pylint: disable=unused-argument
-def _reduce_stats(graph_inputs, input_params):
-    ''' Compute min, max, sum, and count of all data.
-        input_parameters seems to be required although unused. '''
-    data_min = 0.0
-    mins = [values[0] for values in graph_inputs]
-    if not np.isnan(mins).all():
-        data_min = min(0.0, np.nanmin(mins))
-
-    data_max = 0.0
-    maxs = [values[1] for values in graph_inputs]
-    if not np.isnan(maxs).all():
-        data_max = max(0.0, np.nanmax(maxs))
-
-    data_sum = sum(values[2] for values in graph_inputs)
-    data_count = sum(values[3] for values in graph_inputs)
-    return (data_min, data_max, data_sum, data_count)
-# pylint: enable=unused-argument
+# Maximum number of bins in histograms used to estimate quantiles
+_HISTOGRAM_BINS = 4096
+
+# Histogram bins are at least 2**-_HISTOGRAM_PRECISION of the largest value so that bin
+# indexes fit in int64
+_HISTOGRAM_PRECISION = 40
 
-def _map_variance(input_params):
-    ''' Return sum, count, of (xda - mean) squared '''
+# Histograms are (exponent, offset, counts) where bin i counts values in
+# [(offset + i) * 2**exponent, (offset + i + 1) * 2**exponent).  Each chunk is binned
+# in its own range without a global range up front, and because bin edges are multiples
+# of a power of two, histograms with different ranges are merged exactly by summing
+# adjacent bins into the wider bins of the larger exponent.
+
+def _chunk_histogram(values, values_min, values_max):
+    ''' Return (exponent, offset, counts) histogram of non-nan values in numpy array
+        with at most _HISTOGRAM_BINS bins covering [values_min, values_max] '''
+    low, high = float(values_min), float(values_max)
+    magnitude = max(abs(low), abs(high))
+    exponent = math.frexp(magnitude)[1] - _HISTOGRAM_PRECISION if magnitude > 0 else 0
+    if high > low:
+        exponent = max(exponent, math.ceil(math.log2((high - low) / _HISTOGRAM_BINS)))
+    while math.floor(math.ldexp(high, -exponent)) - math.floor(math.ldexp(low, -exponent)) >= _HISTOGRAM_BINS:
+        exponent += 1
+    indexes = np.floor(np.ldexp(values, -exponent)).astype(np.int64)
+    offset = math.floor(math.ldexp(low, -exponent))
+    return (exponent, offset, np.bincount(indexes - offset))
+
+def _coarsen_histogram(histogram, exponent):
+    ''' Return histogram with bins combined for the larger (or equal) exponent '''
+    hist_exponent, offset, counts = histogram
+    shift = exponent - hist_exponent
+    if shift == 0:
+        return histogram
+    # floor division by 2**shift, for negative indexes too
+    indexes = np.right_shift(offset + np.arange(len(counts), dtype=np.int64), shift)
+    new_offset = offset >> shift
+    return (exponent, new_offset, np.bincount(indexes - new_offset, weights=counts).astype(np.int64))
+
+def _merge_histograms(hist1, hist2):
+    ''' Combine two (exponent, offset, counts) histograms into the smallest exponent for
+        which the combined range fits in _HISTOGRAM_BINS bins.  Bins are only ever summed,
+        so the result does not depend on the number or order of merges. '''
+    if hist1 is None:
+        return hist2
+    if hist2 is None:
+        return hist1
+    exponent = max(hist1[0], hist2[0])
+    while True:
+        _, offset1, counts1 = _coarsen_histogram(hist1, exponent)
+        _, offset2, counts2 = _coarsen_histogram(hist2, exponent)
+        low = min(offset1, offset2)
+        high = max(offset1 + len(counts1), offset2 + len(counts2))
+        if high - low <= _HISTOGRAM_BINS:
+            break
+        exponent += 1
+    counts = np.zeros(high - low, dtype=np.int64)
+    counts[offset1 - low:offset1 - low + len(counts1)] += counts1
+    counts[offset2 - low:offset2 - low + len(counts2)] += counts2
+    return (exponent, low, counts)
+
+def _histogram_quantiles(histogram, quantiles):
+    ''' Return values for quantiles (0-1) interpolated within histogram bins '''
+    exponent, offset, counts = histogram
+    edges = np.ldexp(np.arange(offset, offset + len(counts) + 1, dtype=np.float64), exponent)
+    cumulative = np.cumsum(counts)
+    targets = np.clip(np.asarray(quantiles, dtype=float), 0.0, 1.0) * cumulative[-1]
+    bins = np.minimum(np.searchsorted(cumulative, targets), len(counts) - 1)
+    below = np.where(bins > 0, cumulative[bins - 1], 0)
+    fraction = (targets - below) / np.maximum(counts[bins], 1)
+    return (edges[bins] + fraction * (edges[bins + 1] - edges[bins])).tolist()
+
+def _map_stats(input_params):
+    ''' Return min, max, count, mean, m2, and histogram of data chunk '''
     vis_axis = input_params['vis_axis']
     data_group = input_params['data_group']
     correlated_data = input_params['correlated_data']
-    mean = input_params['mean']
-
-    sq_diff_sum = 0.0
-    sq_diff_count = 0
-
-    ps_iter = ProcessingSetIterator(
-        input_params['data_selection'],
-        input_params['input_data_store'],
-        input_params['xdt'],
-        input_params['data_group'],
-        include_variables=[correlated_data, 'FLAG'],
-        load_sub_datasets=False
-    )
+    stats = (np.nan, np.nan, 0, 0.0, 0.0, None)
 
-    for xds in ps_iter:
+    for xds in _iter_stats_data(input_params, input_params['data_selection'], correlated_data):
         xda = _get_stats_xda(xds, vis_axis, data_group)
-        if xda.size > 0:
-            sq_diff = (xda - mean) ** 2
-            sq_diff_sum += np.nansum(sq_diff)
-            sq_diff_count += sq_diff.count().values
-    return (sq_diff_sum, sq_diff_count)
+        stats = _merge_stats(stats, _chunk_stats(xda.values.ravel(), input_params['histogram']))
+    return stats
+
+def _iter_stats_data(input_params, data_selection, correlated_data):
+    ''' Return iterator over the msv4 datasets of data_selection, or over a sample of their
+        time chunks if input_params['sample_fraction'] is set '''
+    selections = [data_selection]
+    if input_params['sample_fraction'] is not None:
+        selections = _sample_selection(data_selection, input_params['xdt'], correlated_data,
+            input_params['sample_fraction'])
+    for selection in selections:
+        yield from ProcessingSetIterator(
+            selection,
+            input_params['input_data_store'],
+            input_params['xdt'],
+            input_params['data_group'],
+            include_variables=[correlated_data, 'FLAG'],
+            load_sub_datasets=False
+        )
 
 # pylint: disable=unused-argument
-def _reduce_variance(graph_inputs, input_params):
-    ''' Compute sum and count of all (xda-mean) squared data.
+def _reduce_stats(graph_inputs, input_params):
+    ''' Combine min, max, count, mean, m2, and histogram of all data.
+        Min and max are nan if there is no unflagged data.
         input_parameters seems to be required although unused. '''
-    sq_diff_sum = sum(values[0] for values in graph_inputs)
-    sq_diff_count = sum(values[1] for values in graph_inputs)
-    return (sq_diff_sum, sq_diff_count)
+    stats = (np.nan, np.nan, 0, 0.0, 0.0, None)
+    for values in graph_inputs:
+        stats = _merge_stats(stats, values)
+    return stats
 # pylint: enable=unused-argument
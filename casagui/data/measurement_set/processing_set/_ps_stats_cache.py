@@ -0,0 +1,96 @@
+'''
+    Persistent cache of ProcessingSet visibility statistics.
+
+    Statistics are stored in a json sidecar file next to the zarr store
+    (<name>.ps.zarr.stats.json) so that they can be reused by later sessions.
+    The sidecar records a fingerprint of the zarr store; when the store is
+    modified the fingerprint changes and the cached statistics are discarded.
+    Statistics are also kept in memory so that they are shared by all users
+    of the same zarr store within a process.
+'''
+
+import hashlib
+import json
+import os
+
+_SIDECAR_SUFFIX = ".stats.json"
+_SIDECAR_VERSION = 1
+
+# zarr path -> {'fingerprint': str, 'stats': {key: stats dict}}
+_stats_cache = {}
+
+def stats_key(selection, data_group, vis_axis):
+    ''' Return cache key string for stats computed with selection, data group, and vis axis '''
+    return json.dumps({'selection': selection, 'data_group': data_group, 'vis_axis': vis_axis},
+        sort_keys=True, default=str)
+
+def get_cached_stats(zarr_path, key, logger):
+    '''
+        Return stats dict stored for key, or None if not cached or zarr store has been modified.
+    '''
+    entry = _get_entry(zarr_path, logger)
+    return entry['stats'].get(key)
+
+def set_cached_stats(zarr_path, key, stats, logger):
+    '''
+        Store stats dict for key in memory and in the sidecar file.
+        Failure to write the sidecar (e.g. read-only location) is not an error.
+    '''
+    entry = _get_entry(zarr_path, logger)
+    entry['stats'][key] = stats
+    sidecar = _sidecar_path(zarr_path)
+    try:
+        tmp_path = sidecar + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as sidecar_file:
+            json.dump({'version': _SIDECAR_VERSION, 'fingerprint': entry['fingerprint'], 'stats': entry['stats']},
+                sidecar_file, indent=1)
+        os.replace(tmp_path, sidecar)
+        logger.debug(f"Saved stats to {sidecar}")
+    except OSError as exc:
+        logger.debug(f"Could not save stats to {sidecar}: {exc}")
+
+def _get_entry(zarr_path, logger):
+    ''' Return in-memory cache entry for zarr store, loading sidecar if needed. '''
+    fingerprint = store_fingerprint(zarr_path)
+    entry = _stats_cache.get(zarr_path)
+    if entry is not None and entry['fingerprint'] == fingerprint:
+        return entry
+
+    entry = {'fingerprint': fingerprint, 'stats': {}}
+    sidecar = _sidecar_path(zarr_path)
+    try:
+        with open(sidecar, encoding="utf-8") as sidecar_file:
+            saved = json.load(sidecar_file)
+        if saved.get('version') == _SIDECAR_VERSION and saved.get('fingerprint') == fingerprint:
+            entry['stats'] = saved.get('stats', {})
+            logger.debug(f"Loaded stats from {sidecar}")
+        else:
+            logger.debug(f"Ignoring stats in {sidecar}: zarr store has been modified")
+    except (OSError, ValueError):
+        pass
+    _stats_cache[zarr_path] = entry
+    return entry
+
+def _sidecar_path(zarr_path):
+    return zarr_path.rstrip(os.sep) + _SIDECAR_SUFFIX
+
+def store_fingerprint(zarr_path):
+    ''' Return string describing modification state of zarr store.
+        Zarr metadata is rewritten when arrays are added, resized, or replaced, so the
+        modification times of the store, its msv4 datasets, and their immediate contents
+        identify changes without walking every chunk file. '''
+    parts = []
+    try:
+        with os.scandir(zarr_path) as entries:
+            top = sorted(entries, key=lambda entry: entry.name)
+        for entry in top:
+            stat = entry.stat()
+            parts.append(f"{entry.name}:{stat.st_mtime_ns}:{stat.st_size}")
+            if entry.is_dir():
+                with os.scandir(entry.path) as sub_entries:
+                    for sub_entry in sorted(sub_entries, key=lambda sub: sub.name):
+                        sub_stat = sub_entry.stat()
+                        parts.append(f"{entry.name}/{sub_entry.name}:{sub_stat.st_mtime_ns}:{sub_stat.st_size}")
+    except OSError:
+        return ""
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
@@ -6,10 +6,23 @@ import xarray as xr
 
 from casagui.plot.ms_plot._ms_plot_constants import SPECTRUM_AXIS_OPTIONS, UVW_AXIS_OPTIONS, VIS_AXIS_OPTIONS, WEIGHT_AXIS_OPTIONS
 
+# Scale frequency to Hz
+_FREQUENCY_SCALE = {'Hz': 1.0, 'kHz': 1.0e3, 'MHz': 1.0e6, 'GHz': 1.0e9}
+
 def get_correlated_data(xds, data_group):
     ''' Return correlated_data value in data_group dict '''
     return xds.attrs['data_groups'][data_group]['correlated_data']
 
+def get_vis_units(xda):
+    ''' Return units of correlated data from units attribute, default Jy '''
+    units = xda.attrs.get('units', 'Jy')
+    return units[0] if isinstance(units, list) else units
+
+def get_frequency_scale(freq_xda):
+    ''' Return scale of frequency values to Hz from units attribute; frequency may have been converted for plotting '''
+    freq_units = freq_xda.attrs.get('units', 'Hz')
+    return _FREQUENCY_SCALE.get(freq_units[0] if isinstance(freq_units, list) else freq_units, 1.0)
+
 def get_axis_data(xds, axis, data_group=None):
     ''' Get requested axis data from xarray dataset.
             xds (dict): msv4 xarray.Dataset
@@ -75,23 +88,24 @@ def _calc_vis_axis(xds, axis, group_info):
     ''' Calculate axis from correlated data '''
     correlated_data = group_info['correlated_data']
     xda = xds[correlated_data]
+    units = get_vis_units(xda)
 
     # Single dish spectrum
     if correlated_data == "SPECTRUM":
         if axis in SPECTRUM_AXIS_OPTIONS:
-            return xda.assign_attrs(units='Jy')
+            return xda.assign_attrs(units=units)
         raise RuntimeError(f"Vis axis {axis} invalid for SPECTRUM dataset, select from {SPECTRUM_AXIS_OPTIONS}")
 
     # Interferometry visibilities
     if axis == 'amp':
-        return np.absolute(xda).assign_attrs(units='Jy')
+        return np.absolute(xda).assign_attrs(units=units)
     if axis == 'phase':
         # np.angle(xda) returns ndarray not xr.DataArray
         return (np.arctan2(xda.imag, xda.real) * 180.0/np.pi).assign_attrs(units="deg")
     if axis == 'real':
-        return np.real(xda.assign_attrs(units='Jy'))
+        return np.real(xda.assign_attrs(units=units))
     if axis == 'imag':
-        return np.imag(xda.assign_attrs(units='Jy'))
+        return np.imag(xda.assign_attrs(units=units))
     return None
 
 def _calc_uvw_axis(xds, axis, group_info):
@@ -114,19 +128,20 @@ def _calc_uvw_axis(xds, axis, group_info):
     return np.sqrt(np.square(u_xda) + np.square(v_xda))
 
 def _calc_wave_axis(xds, axis, group_info):
+    ''' Calculate uvw axis in wavelengths, broadcast over frequency.
+        Returns lazy xarray DataArray with uvw dims (time, baseline) and frequency dim. '''
     wave_axes = {'uwave': 'u', 'vwave': 'v', 'wwave': 'w', 'uvwave': 'uvdist'}
     if axis not in wave_axes:
         raise ValueError(f"Invalid wave axis {axis}")
-    uvwdist_array = _calc_uvw_axis(xds, wave_axes[axis], group_info).values / constants.c
-    uvwdist_len = len(uvwdist_array)
-    freq_array = xds.frequency.values
-    wave = np.zeros(shape=(len(freq_array), uvwdist_len), dtype=np.double)
+    uvw_xda = _calc_uvw_axis(xds, wave_axes[axis], group_info)
 
-    for i, in range(uvwdist_len):
-        wave[:, i] = uvwdist_array[i] * freq_array
+    # Frequency may have been converted to GHz for plotting
+    freq_xda = xds.frequency
+    freq_scale = get_frequency_scale(freq_xda)
 
-    wave_xda = xr.DataArray(wave, dims=['frequency', 'uvw_label'])
-    return wave_xda
+    # Broadcast multiply keeps uvw dims and chunks and adds frequency dim
+    wave_xda = uvw_xda * (freq_xda * (freq_scale / constants.c.to_value('m/s')))
+    return wave_xda.assign_attrs(units='lambda')
 
 def _calc_weight_axis(xds, axis, group_info):
     weight = xds[group_info['weight']]
@@ -2,6 +2,7 @@
 Base class for ms plots
 '''
 
+from contextlib import contextmanager
 import os
 import time
 
@@ -17,7 +18,7 @@ try:
 except ImportError:
     _HAVE_TOOLVIPER = False
 
-from casagui.data.measurement_set._ms_data import MsData
+from casagui.plot.ms_plot._ms_plot_export import PlotExporter, get_export_format, raise_export_errors
 from casagui.toolbox import AppContext
 from casagui.utils._logging import get_logger
 
@@ -25,7 +26,8 @@ class MsPlot:
 
     ''' Base class for MS plots with common functionality '''
 
-    def __init__(self, ms=None, log_level="info", show_gui=False, app_name="MsPlot"):
+    def __init__(self, ms=None, log_level="info", show_gui=False, app_name="MsPlot", convert_selection=None,
+        convert_config=None):
         if not ms and not show_gui:
             raise RuntimeError("Must provide ms/zarr path if gui not shown.")
 
@@ -56,9 +58,15 @@ class MsPlot:
         self._plots_locked = False
         self._plots = []
 
-        # Set data (if ms)
+        # Save plots to file as they are created instead of adding to plot list
+        self._stream_exporter = None
+        self._stream_info = {}
+
+        # Set data (if ms); MSv2 is converted to zarr with convert_config, starting with convert_selection
         self._data = None
         self._ms_info = {}
+        self._convert_selection = convert_selection
+        self._convert_config = convert_config
         self._set_ms(ms)
 
     def summary(self, data_group='base', columns=None):
@@ -93,6 +101,40 @@ class MsPlot:
         '''
         self._data.plot_phase_centers(data_group, label_fields)
 
+    def rechunk(self, filename='', data_group='base', plot_axes=None, target_chunk_mb=None):
+        ''' Write copy of MS zarr data with chunks for raster plots, so that a plot reads fewer and smaller chunks.
+            Set ms to the copy to plot it.
+                filename (str): path of new zarr store. Default '{ms name}.raster.ps.zarr' next to the MS zarr.
+                data_group (str): data group of correlated data used to set chunk sizes.
+                plot_axes (list): (x_axis, y_axis) tuples of plot orientations.
+                    Default [('baseline', 'time'), ('frequency', 'time')].
+                target_chunk_mb (float): maximum size of correlated data chunks in MB. Default 64.
+            Returns path of rechunked zarr store.
+        '''
+        if not self._data or not self._data.is_valid():
+            raise RuntimeError("Cannot rechunk MS: input MS path is invalid or missing.")
+        if not filename:
+            filename = os.path.join(os.path.dirname(self._ms_info['ms']), f"{self._ms_info['basename']}.raster.ps.zarr")
+        self._data.write_rechunked(filename, data_group, plot_axes, target_chunk_mb)
+        self._logger.info(f"Wrote rechunked MS to {filename}")
+        return filename
+
+    def build_overview(self, data_group='base', factors=None):
+        ''' Write time and frequency averaged levels of MS zarr data next to the MS zarr ('{zarr path}.overview.zarr').
+            Raster plots with fewer pixels than data samples along a time or frequency axis use the coarsest level
+            with enough samples; plots with a time or frequency selection use the full resolution data.
+            The overview is not used after the MS zarr is modified.
+                data_group (str): data group of correlated data and flags to average.
+                factors (list): (time, frequency) averaging factor of each level.
+                    Default [(8, 1), (64, 1), (1, 8), (1, 64), (8, 8), (64, 64)].
+            Returns path of overview zarr store.
+        '''
+        if not self._data or not self._data.is_valid():
+            raise RuntimeError("Cannot build overview: input MS path is invalid or missing.")
+        overview_path = self._data.build_overview(data_group, factors)
+        self._logger.info(f"Wrote MS overview to {overview_path}")
+        return overview_path
+
     def clear_plots(self):
         ''' Clear plot list '''
         while self._plots_locked:
@@ -130,13 +172,15 @@ class MsPlot:
         self._plots_locked = False
         show(plot)
 
-    def save(self, filename='ms_plot.png', fmt='auto', width=900, height=600):
+    def save(self, filename='ms_plot.png', fmt='auto', width=900, height=600, n_workers=4):
         '''
         Save plot to file with filename, format, and size.
         If iteration plots were created:
             If subplots is a grid, the layout plot will be saved to a single file.
             If subplots is a single plot, iteration plots will be saved individually,
                 with a plot index appended to the filename: {filename}_{index}.{ext}.
+                Plots are saved by n_workers threads.
+                Raises RuntimeError listing the files which could not be saved.
         '''
         if not self._plots:
             raise RuntimeError("No plot to save.  Run plot() to create plot.")
@@ -158,18 +202,60 @@ class MsPlot:
                 hvplot.save(layout_plot.opts(width=width, height=height), filename=filename, fmt=fmt)
                 self._logger.info("Saved plot to %s.", filename)
             else:
+                filename, fmt = get_export_format(filename, fmt)
                 name, ext = os.path.splitext(filename)
                 iter_range = self._plot_inputs['iter_range'] # None or (start, end)
                 plot_idx = 0 if iter_range is None else iter_range[0]
 
-                for plot in self._plots:
-                    exportname = f"{name}_{plot_idx}.{ext}"
-                    hvplot.save(plot.opts(width=width, height=height), filename=exportname, fmt=fmt)
-                    self._logger.info("Saved plot to %s.", exportname)
-                    plot_idx += 1
+                exporter = PlotExporter(self._logger, n_workers)
+                try:
+                    for plot in self._plots:
+                        exporter.submit(plot, f"{name}_{plot_idx}{ext}", fmt, width, height)
+                        plot_idx += 1
+                finally:
+                    errors = exporter.close()
+                raise_export_errors(errors)
+
+        self._logger.debug("Save elapsed time: %.2fs.", time.time() - start_time)
 
+    @contextmanager
+    def stream_plots(self, filename='ms_plot.png', fmt='auto', width=900, height=600, n_workers=4):
+        '''
+        Save plots to file as they are created, instead of keeping them for show() or save().
+        Use for a large number of iteration plots, e.g. in a pipeline:
+            with msr.stream_plots('raster.png'):
+                msr.plot(iter_axis='baseline', iter_range=(0, -1))
+        Plots are saved with a plot index appended to the filename: {filename}_{index}.{ext},
+        by n_workers threads. Subplots are ignored.
+        Raises RuntimeError listing the files which could not be saved.
+        '''
+        if self._show_gui:
+            raise RuntimeError("Cannot stream plots to file when gui is shown.")
+        filename, fmt = get_export_format(filename, fmt)
+        name, ext = os.path.splitext(filename)
+        start_time = time.time()
+        exporter = PlotExporter(self._logger, n_workers)
+        self._stream_exporter = exporter
+        self._stream_info = {'name': name, 'ext': ext, 'fmt': fmt, 'width': width, 'height': height, 'index': 0}
+        try:
+            yield exporter
+        finally:
+            self._stream_exporter = None
+            errors = exporter.close()
+        raise_export_errors(errors)
         self._logger.debug("Save elapsed time: %.2fs.", time.time() - start_time)
 
+    def _add_plot(self, plot):
+        ''' Add plot to plot list, or save it if streaming plots to file '''
+        if self._stream_exporter is None:
+            self._plots.append(plot)
+            return
+
+        info = self._stream_info
+        exportname = f"{info['name']}_{info['index']}{info['ext']}"
+        self._stream_exporter.submit(plot, exportname, info['fmt'], info['width'], info['height'])
+        info['index'] += 1
+
     def _layout_plots(self, subplots):
         subplots = (1, 1) if subplots is None else subplots
         num_plots = len(self._plots)
@@ -197,9 +283,15 @@ class MsPlot:
         ms_changed = ms and (not self._data or not self._data.is_ms_path(ms))
 
         if ms_changed:
+            # Imported here: the data package imports plot constants from this package
+            # pylint: disable=import-outside-toplevel
+            from casagui.data.measurement_set._ms_data import MsData
+            if self._data:
+                # Stop converting replaced MS
+                self._data.close()
             try:
                 # Set new MS data
-                self._data = MsData(ms, self._logger)
+                self._data = MsData(ms, self._logger, self._convert_selection, self._convert_config)
                 ms_path = self._data.get_path()
                 self._ms_info['ms'] = ms_path
                 root, ext = os.path.splitext(os.path.basename(ms_path))
@@ -18,5 +18,16 @@ MS_SELECTION_OPTIONS = ['Data Group', 'Time', 'Baseline', 'Antenna1', 'Antenna2'
 
 AGGREGATOR_OPTIONS = ['None', 'max', 'mean', 'median', 'min', 'std', 'sum', 'var']
 
+# Percentiles of unflagged data used for 'auto' color limits
+AUTO_COLOR_PERCENTILES = (0.5, 99.5)
+
+# Maximum number of iteration plots whose data is computed together
+ITER_PLOT_BATCH_SIZE = 16
+
+# Suggest rechunk() when less than this fraction of the data read for a plot is plotted,
+# and at least RECHUNK_MIN_BYTES is read
+RECHUNK_EFFICIENCY = 0.1
+RECHUNK_MIN_BYTES = 256 * 1024 * 1024
+
 DEFAULT_UNFLAGGED_CMAP = "Viridis"
 DEFAULT_FLAGGED_CMAP = "Reds"
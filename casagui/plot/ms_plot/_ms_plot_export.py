@@ -0,0 +1,136 @@
+'''
+Export MS plots to files using a pool of worker threads.
+'''
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bokeh.embed import file_html
+from bokeh.resources import CDN
+import holoviews as hv
+import hvplot
+
+class PlotExporter:
+    '''
+    Save plots to png or html files with a pool of worker threads.
+
+    Plots are rendered to Bokeh models in the calling thread and written to file by a worker.
+    Each worker creates one headless browser (webdriver) which it reuses for all of its png exports.
+    At most max_pending plots are waiting to be saved; submit() blocks until a worker is free,
+    so plots can be streamed to disk without keeping them in memory.
+    Other formats (svg, gif) are saved with hvplot in the calling thread.
+
+    Use as a context manager, or call close() to wait for all exports and stop the browsers.
+    '''
+
+    def __init__(self, logger, n_workers=4, max_pending=None):
+        self._logger = logger
+        n_workers = max(1, n_workers)
+        self._pool = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="PlotExporter")
+        self._pending = threading.BoundedSemaphore(max_pending if max_pending else 2 * n_workers)
+        self._local = threading.local() # webdriver for each worker thread
+        self._lock = threading.Lock()
+        self._webdrivers = []
+        self._num_submitted = 0
+        self._num_saved = 0
+        self._errors = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, plot, filename, fmt='auto', width=900, height=600):
+        '''
+        Save holoviews plot to file with format and size.
+            fmt (str): 'png', 'html', 'svg', or 'gif'. Default 'auto': inferred from filename extension, else 'png'.
+        '''
+        filename, fmt = get_export_format(filename, fmt)
+        with self._lock:
+            self._num_submitted += 1
+        plot = plot.opts(width=width, height=height)
+
+        if fmt not in ('png', 'html'):
+            hvplot.save(plot, filename=filename, fmt=fmt)
+            self._saved(filename)
+            return
+
+        model = hv.render(plot)
+        self._pending.acquire()
+        try:
+            self._pool.submit(self._export, model, filename, fmt)
+        except RuntimeError:
+            self._pending.release()
+            raise
+
+    def close(self):
+        '''
+        Wait for queued exports and stop the webdrivers.
+        Returns list of (filename, error) for plots which could not be saved.
+        '''
+        self._pool.shutdown(wait=True)
+        if self._webdrivers:
+            # pylint: disable=import-outside-toplevel
+            from bokeh.io.webdriver import webdriver_control
+            for webdriver in self._webdrivers:
+                webdriver_control.terminate(webdriver)
+            self._webdrivers.clear()
+        if self._errors:
+            self._logger.error("Failed to save %d of %d plots.", len(self._errors), self._num_submitted)
+        return self._errors
+
+    def _export(self, model, filename, fmt):
+        ''' Save Bokeh model to file (worker thread) '''
+        try:
+            if fmt == 'png':
+                # pylint: disable=import-outside-toplevel
+                from bokeh.io.export import export_png
+                export_png(model, filename=filename, webdriver=self._get_webdriver())
+            else:
+                with open(filename, 'w', encoding='utf-8') as html_file:
+                    html_file.write(file_html(model, CDN, title=os.path.basename(filename)))
+            self._saved(filename)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            self._logger.error("Failed to save plot to %s: %s", filename, str(e))
+            with self._lock:
+                self._errors.append((filename, str(e)))
+        finally:
+            self._pending.release()
+
+    def _get_webdriver(self):
+        ''' Return webdriver for worker thread, created on first use (requires selenium) '''
+        webdriver = getattr(self._local, 'webdriver', None)
+        if webdriver is None:
+            # pylint: disable=import-outside-toplevel
+            from bokeh.io.webdriver import webdriver_control
+            webdriver = webdriver_control.create()
+            self._local.webdriver = webdriver
+            with self._lock:
+                self._webdrivers.append(webdriver)
+        return webdriver
+
+    def _saved(self, filename):
+        with self._lock:
+            self._num_saved += 1
+            num_saved, num_submitted = self._num_saved, self._num_submitted
+        self._logger.info("Saved plot to %s (%d of %d).", filename, num_saved, num_submitted)
+
+def get_export_format(filename, fmt='auto'):
+    ''' Return (filename, fmt) with format inferred from extension if 'auto'.
+        If filename has no extension, .png is appended for 'auto' format. '''
+    name, ext = os.path.splitext(filename)
+    if fmt == 'auto':
+        if ext:
+            fmt = ext[1:].lower()
+        else:
+            fmt = 'png'
+            filename = name + '.png'
+    return filename, fmt
+
+def raise_export_errors(errors):
+    ''' Raise RuntimeError listing the files in errors, the (filename, error) list returned by PlotExporter.close() '''
+    if errors:
+        filenames = ", ".join(filename for filename, _ in errors)
+        raise RuntimeError(f"Failed to save {len(errors)} plot(s): {filenames}. First error: {errors[0][1]}")
@@ -10,6 +10,13 @@ import hvplot.xarray
 import hvplot.pandas
 # pylint: enable=unused-import
 
+try:
+    # Used by holoviews to rasterize plots
+    import datashader # pylint: disable=unused-import
+    _HAVE_DATASHADER = True
+except ImportError:
+    _HAVE_DATASHADER = False
+
 from casagui.bokeh.format import get_time_formatter
 from casagui.data.measurement_set.processing_set._ps_coords import set_index_coordinates
 from casagui.plot.ms_plot._xds_plot_axes import get_axis_labels, get_vis_axis_labels, get_coordinate_labels
@@ -56,6 +63,7 @@ class RasterPlot:
         '''
         self._plot_params['data']['correlated_data'] = plot_inputs['correlated_data']
         self._plot_params['data']['aggregator'] = plot_inputs['aggregator']
+        self._plot_params['plot']['rasterize'] = plot_inputs['rasterize']
 
         color_mode = plot_inputs['color_mode']
         if color_mode == 'manual':
@@ -96,6 +104,10 @@ class RasterPlot:
         data_params = self._plot_params['data']
         plot_params = self._plot_params['plot']
 
+        if plot_params['rasterize'] and not _HAVE_DATASHADER:
+            logger.warning('datashader is not installed, plotting without rasterize.')
+            plot_params['rasterize'] = False
+
         x_axis = plot_params['axis_labels']['x']['axis']
         y_axis = plot_params['axis_labels']['y']['axis']
         c_axis = plot_params['axis_labels']['c']['axis']
@@ -108,7 +120,8 @@ class RasterPlot:
         if data_params['aggregator']:
             xda_name = "_".join([data_params['aggregator'], xda_name])
 
-        # Plot unflagged and flagged data
+        # Plot unflagged and flagged data.
+        # Data has been computed by raster_data, so flag split and min/max do not read data again.
         xda = xds[data_params['correlated_data']].where(xds.FLAG == 0.0).rename(xda_name)
         unflagged_plot = self._plot_xda(xda)
         flagged_xda = xds[data_params['correlated_data']].where(xds.FLAG == 1.0).rename("flagged_" + xda_name)
@@ -117,9 +130,10 @@ class RasterPlot:
         if is_gui: # update data range for colorbar
             self._plot_params['data']['data_range'] = (xda.min().values.item(), xda.max().values.item())
 
-        # Make Overlay plot with hover tools
+        # Make Overlay plot with hover tools (rasterized plots are Images)
         return (flagged_plot * unflagged_plot).opts(
-            hv.opts.QuadMesh(tools=['hover'])
+            hv.opts.QuadMesh(tools=['hover']),
+            hv.opts.Image(tools=['hover'])
         )
 
     def _get_plot_title(self, data, plot_inputs, ms_name, include_selections=False):
@@ -246,7 +260,11 @@ class RasterPlot:
             plot_params['unflagged_colorbar'] = show_colorbar
 
         if xda[x_axis].size > 1 and xda[y_axis].size > 1:
-            # Raster 2D data
+            # Raster 2D data.
+            # If rasterize, datashader aggregates the data to the plot size (mean of the
+            # cells in each pixel) and is rerun on zoom, so the browser receives a fixed-size
+            # image with data values for hover rather than every cell.
+            rasterize_params = {'rasterize': True, 'dynamic': True, 'aggregator': 'mean'} if plot_params['rasterize'] else {}
             plot = xda.hvplot.quadmesh(
                 x_axis,
                 y_axis,
@@ -263,6 +281,7 @@ class RasterPlot:
                 rot=45, # angle for x axis labels
                 colorbar=show_colorbar,
                 responsive=True, # resize to fill browser window if True
+                **rasterize_params
             )
         else:
             # Cannot raster 1D data, use scatter from pandas dataframe
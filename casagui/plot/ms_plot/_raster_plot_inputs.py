@@ -103,6 +103,11 @@ def _check_color_inputs(inputs):
         if not (isinstance(inputs['color_range'], tuple) and len(inputs['color_range']) == 2):
             raise ValueError("Invalid parameter type: color_range must be None or a tuple of (min, max).")
 
+    if 'color_sample' in inputs and inputs['color_sample'] is not None:
+        color_sample = inputs['color_sample']
+        if not isinstance(color_sample, (int, float)) or not 0 < color_sample <= 1:
+            raise ValueError("Invalid parameter value: color_sample must be None or a fraction in range (0, 1].")
+
 def _check_other_inputs(inputs):
     if inputs['iter_range']:
         if not (isinstance(inputs['iter_range'], tuple) and len(inputs['iter_range']) == 2):
@@ -114,3 +119,6 @@ def _check_other_inputs(inputs):
 
     if inputs['title'] and not isinstance(inputs['title'], str):
         raise TypeError("Invalid parameter type: title must be None or a string.")
+
+    if 'rasterize' in inputs and not isinstance(inputs['rasterize'], bool):
+        raise TypeError("Invalid parameter type: rasterize must be a bool.")
@@ -42,11 +42,11 @@ import websockets
 from contextlib import asynccontextmanager
 from bokeh.core.enums import HatchPattern as _hatch_patterns
 from bokeh.core.enums import DashPattern as _dash_patterns
-from bokeh.events import SelectionGeometry, MouseEnter, MouseLeave, MouseMove, LODStart, LODEnd, ValueSubmit
+from bokeh.events import SelectionGeometry, MouseEnter, MouseLeave, MouseMove, LODStart, LODEnd, ValueSubmit, RangesUpdate
 from bokeh.models import PolyAnnotation
 from bokeh.models import CustomJS, CustomAction, Slider, Div, Span, HoverTool, TableColumn, \
                          DataTable, Select, ColorPicker, Spinner, Select, Button, PreText, Dropdown, \
-                         LinearColorMapper, TextInput, Spacer, InlineStyleSheet, Quad
+                         LinearColorMapper, TextInput, Spacer, InlineStyleSheet, Quad, TMSTileSource, Range1d
 from bokeh.models import WheelZoomTool, PanTool, ResetTool, PolySelectTool, LassoSelectTool, BoxSelectTool, SaveTool, ResetTool
 from bokeh.models import BasicTickFormatter
 from bokeh.plotting import ColumnDataSource, figure
@@ -54,7 +54,7 @@ from casagui.bokeh.sources import ImageDataSource, ImagePipe, DataPipe
 from casagui.bokeh.format import WcsTicks
 from casagui.bokeh.models import EditSpan
 from ..data import casaimage
-from ..utils import pack_arrays, find_ws_address, set_attributes, resource_manager, polygon_indexes, is_notebook
+from ..utils import pack_arrays, find_ws_address, set_attributes, resource_manager, polygon_mask, is_notebook
 from ..bokeh.models import EvTextInput
 from ..bokeh.tools import CBResetTool
 from ..bokeh.state import available_palettes, find_palette, default_palette
@@ -154,6 +154,7 @@ class CubeMask:
         self._status_div = None                                # status line (used to report problems)
         self._pixel_tracking_text = None                       # cursor tracking pixel value
         self._chan_image = None                                # channel image
+        self._tile_source = None                               # channel tiles (when image is displayed with tiles)
         self._bitmask = None                                   # bitmask image
         self._bitmask_contour = None                           # bitmask MultiPolygon contour
         self._bitmask_contour_ds = None                        # bitmask MultiPolygon contour data source
@@ -301,22 +302,24 @@ class CubeMask:
     def set_all_mask_pixels( self, value ):
         '''Set all pixels to the specified boolean value.
         '''
-        shape = self._pipe['image'].shape
-        for stokes in range(shape[2]):
-            for chan in range(shape[3]):
-                mask = self._pipe['image'].mask( [stokes,chan], True )
-                mask[:] = 1.0 if value else 0.0
-                self._pipe['image'].put_mask( [stokes,chan], mask )
+        self._pipe['image'].fill_mask( 1.0 if value else 0.0 )
+
+    def image_modified( self ):
+        '''Signal that the image on disk has been modified (e.g. by a major cycle)
+        so that cached image planes are not reused.
+        '''
+        if self._pipe['image'] is not None:
+            self._pipe['image'].image_modified( )
 
     def set_channelcb( self, callback ):
         self._channel_callback = callback
 
-    def _init_image_source( self ):
+    def _init_image_source( self, tiles=False, view_size=None ):
         if self._image_source is None:
             self._init_pipes( )
-            self._image_source = ImageDataSource( image_source=self._pipe['image'] )
+            self._image_source = ImageDataSource( image_source=self._pipe['image'], tiles=tiles, view_size=view_size )
 
-    def image( self, maxanno=50, grid=True, channelcb=None, **kw ):
+    def image( self, maxanno=50, grid=True, channelcb=None, tiles=False, **kw ):
         '''Create the 2D raster display which displays image planes. This widget is should be
         created for all ``cube_mask`` objects because this is the GUI component that ties
         all of the other GUIs together.
@@ -327,6 +330,12 @@ class CubeMask:
             maximum number of masks that can be drawn in each image channel
         grid: Boolean
             display grid lines on the image if True, do not display grid lines if False
+        tiles: Boolean
+            if True the channel is displayed with 256x256 PNG tiles fetched from a tile server
+            run by the ``ImagePipe`` so only the visible part of large images is rendered at
+            the resolution required by the display, if False whole channels are sent to the
+            browser. The tile server uses its own port (see ``ImagePipe.tile_address``) which
+            must also be forwarded when the GUI is displayed on another host
         kw: keyword and value
             extra keyword/value paramaters passed on to ``figure``
         '''
@@ -359,13 +368,13 @@ class CubeMask:
                     shape = self._pipe['image'].shape
                     if msg['action'] == 'addition' or msg['action'] == 'subtract':
                         if 'xs' in msg['value'] and 'ys' in msg['value']:
-                            indices = tuple(np.array(list(polygon_indexes( msg['value']['xs'], msg['value']['ys'], shape[:2] ))).T)
-                            if len(indices) == 0 and len(msg['value']['xs']) > 0 and len(msg['value']['xs']) == len(msg['value']['ys']):
+                            indices = polygon_mask( msg['value']['xs'], msg['value']['ys'], shape[:2] )
+                            if not indices.any( ) and len(msg['value']['xs']) > 0 and len(msg['value']['xs']) == len(msg['value']['ys']):
                                 ### this can happen if the entire region is within a single pixel
                                 xs = set(map(int,msg['value']['xs']))
                                 ys = set(map(int,msg['value']['ys']))
                                 if len(xs) == len(ys) and len(xs) == 1:
-                                    indices = ( np.array([xs.pop()]), np.array([ys.pop( )]) )
+                                    indices[xs.pop( ), ys.pop( )] = True
                             if msg['scope'] == 'chan':
                                 ### modifying single channel with mouse selected region
                                 mask = self._pipe['image'].mask( msg['value']['chan'], True )
@@ -375,11 +384,8 @@ class CubeMask:
                                 return dict( result='success', update={ } )
                             elif msg['scope'] == 'cube':
                                 ### modifying all channels with mouse selected region
-                                stokes = msg['value']['chan'][0]
-                                for c in range(shape[3]):
-                                    mask = self._pipe['image'].mask( [stokes,c], True )
-                                    mask[indices] = 0 if msg['action'] == 'subtract' else 1
-                                    self._pipe['image'].put_mask( [stokes,c], mask )
+                                self._pipe['image'].set_mask_region( msg['value']['chan'][0], indices,
+                                                                     0 if msg['action'] == 'subtract' else 1 )
                                 self._mask_id = str(uuid4( ))                   ### new mask identifier
                                 return dict( result='success', update={ } )
                         elif 'src' in msg['value']:
@@ -407,25 +413,9 @@ class CubeMask:
 
                             elif msg['scope'] == 'cube':
                                 ### modifying all channels with mask from another channel
-                                modifier_index = msg['value']['src']
-                                modifier = self._pipe['image'].mask( modifier_index, True )
-                                stokes = msg['value']['chan'][0]
-                                if msg['action'] == 'addition':
-                                    ### addition
-                                    for c in range(shape[3]):
-                                        ### do not add/subtract the modifier mask with itself
-                                        if stokes != modifier_index[0] or c != modifier_index[1]:
-                                            mask = self._pipe['image'].mask( [stokes,c], True )
-                                            mask = np.logical_or( mask, modifier )
-                                            self._pipe['image'].put_mask( [stokes,c], mask )
-                                else:
-                                    ### subtraction
-                                    for c in range(shape[3]):
-                                        ### do not add/subtract the modifier mask with itself
-                                        if stokes != modifier_index[0] or c != modifier_index[1]:
-                                            mask = self._pipe['image'].mask( [stokes,c], True )
-                                            mask = np.logical_and( mask, np.logical_not(modifier) )
-                                            self._pipe['image'].put_mask( [stokes,c], mask )
+                                ### (the modifier mask is not added/subtracted with itself)
+                                self._pipe['image'].combine_mask( msg['value']['chan'][0], msg['value']['src'],
+                                                                  'or' if msg['action'] == 'addition' else 'andnot' )
                                 self._mask_id = str(uuid4( ))                   ### new mask identifier
                                 return dict( result='success', update={ } )
                             else:
@@ -433,14 +423,12 @@ class CubeMask:
                         else:
                             err = "internal error: bad add/subtract message"
                     elif msg['action'] == 'not':
-                        notf = np.vectorize(lambda x: 0.0 if x != 0 else 1.0)
                         if msg['scope'] == 'chan':
                             ### invert single channel
                             ### ctrl.send( ids['mask-mod'], { scope: 'chan', action: 'not',
                             ###                               value: { chan: source.cur_chan } },
                             ###            mask_mod_result )
-                            mask = self._pipe['image'].mask( msg['value']['chan'], True )
-                            self._pipe['image'].put_mask( msg['value']['chan'], notf(mask) )
+                            self._pipe['image'].invert_mask( *msg['value']['chan'] )
                             self._mask_id = str(uuid4( ))                   ### new mask identifier
                             return dict( result='success', update={ } )
                         elif msg['scope'] == 'cube':
@@ -448,10 +436,7 @@ class CubeMask:
                             ### ctrl.send( ids['mask-mod'], { scope: 'cube', action: 'not',
                             ###                               value: { chan: source.cur_chan } },
                             ###            mask_mod_result )
-                            stokes = msg['value']['chan'][0]
-                            for c in range(shape[3]):
-                                mask = self._pipe['image'].mask( [stokes,c], True )
-                                self._pipe['image'].put_mask( [stokes,c], notf(mask) )
+                            self._pipe['image'].invert_mask( msg['value']['chan'][0] )
                             self._mask_id = str(uuid4( ))                   ### new mask identifier
                             return dict( result='success', update={ } )
                         else:
@@ -467,12 +452,19 @@ class CubeMask:
 
 
             self._pipe['control'].register( self._ids['done'], receive_return_value )
-            self._init_image_source( )
+            self._init_image_source( tiles, ( kw['width'], kw['height'] ) if 'width' in kw and 'height' in kw else None )
 
             ### fetch stokes labels for all stokes drop
             self._stokes_labels = self._image_source.stokes_labels( )
 
-            self._image = set_attributes( figure( height=self._pipe['image'].shape[1], width=self._pipe['image'].shape[0],
+            shape = self._pipe['image'].shape
+            ###
+            ### tile renderers do not contribute to the bounds of DataRange1d so with tiles the
+            ### ranges must be given explicitly for the initial view and for Reset
+            ###
+            ranges = dict( x_range=Range1d( 0, shape[0], bounds=( 0, shape[0] ) ),
+                           y_range=Range1d( 0, shape[1], bounds=( 0, shape[1] ) ) ) if tiles else { }
+            self._image = set_attributes( figure( height=shape[1], width=shape[0], **ranges,
                                                   ###
                                                   ### using webgl resulted in at least one case of unresponsive spans in the colormap
                                                   ### adjust interface due to the GPU being unresponsive (perhaps because it is being
@@ -519,13 +511,68 @@ class CubeMask:
             self._image.yaxis.formatter = WcsTicks( axis="y", image_source=self._image_source )
             self._image.xaxis.major_label_orientation = math.pi/8
 
-            self._image.x_range.range_padding = self._image.y_range.range_padding = 0
+            if not tiles:
+                self._image.x_range.range_padding = self._image.y_range.range_padding = 0
 
-            shape = self._pipe['image'].shape
-            self._chan_image = self._image.image( image="img", x=0, y=0,
-                               dw=shape[0], dh=shape[1],
-                               palette=default_palette( True ), level="image",
-                               source=self._image_source )
+            if tiles:
+                ###
+                ### tiles are rendered by the ImagePipe, the stokes/channel, palette and version
+                ### (which changes when the image or colormap adjustments change) are part of the
+                ### tile URL so the displayed tiles are refreshed when the channel data is updated
+                ###
+                tiling = self._pipe['image'].tiling( )
+                self._tile_source = TMSTileSource( url=self._pipe['image'].tile_url( ),
+                                                   min_zoom=0, max_zoom=tiling.zoom_levels( reverse=True )[0],
+                                                   initial_resolution=tiling.units_per_pixel(0),
+                                                   wrap_around=False, x_origin_offset=0, y_origin_offset=0,
+                                                   extra_url_vars=dict( S=0, C=0, P=default_palette( ),
+                                                                        V=self._pipe['image'].tile_version( ) ) )
+                self._chan_image = self._image.add_tile( self._tile_source, level="image", smoothing=False )
+                self._image_source.js_on_change( 'data', CustomJS( args=dict( tiles=self._tile_source ),
+                                                                   code='''if ( 'tile' in cb_obj.data && cb_obj.data.tile.length > 0 ) {
+                                                                               tiles.extra_url_vars = { ...tiles.extra_url_vars,
+                                                                                                        S: String(cb_obj.cur_chan[0]),
+                                                                                                        C: String(cb_obj.cur_chan[1]),
+                                                                                                        V: cb_obj.data.tile[0] }
+                                                                           }''' ) )
+            else:
+                self._chan_image = self._image.image( image="img", x=0, y=0,
+                                   dw=shape[0], dh=shape[1],
+                                   palette=default_palette( True ), level="image",
+                                   source=self._image_source )
+            ###
+            ### large images (and masks) are sent at reduced resolution until the user zooms in far
+            ### enough to see individual pixels, so the visible range is reported after each zoom/pan
+            ### (with tiles only the masks are affected because tiles already match the display)
+            ###
+            self._image.js_on_event( RangesUpdate, CustomJS( args=dict( source=self._image_source, fig=self._image ),
+                                                             code='''source.update_view( cb_obj.x0, cb_obj.x1, cb_obj.y0, cb_obj.y1,
+                                                                                         fig.inner_width, fig.inner_height )''' ) )
+            ###
+            ### the initial channel is embedded at the resolution chosen for the initial plot size
+            ### (see ImageDataSource), RangesUpdate is not emitted for the initial render so the
+            ### actual size is reported when the data ranges are computed after layout (the fixed
+            ### ranges used with tiles do not change so the plot size is also watched); after the
+            ### first report the callback detaches itself and RangesUpdate reports later changes
+            ###
+            initial_view = CustomJS( args=dict( source=self._image_source, fig=self._image ),
+                                     code='''let width = 0, height = 0
+                                             try { width = fig.inner_width; height = fig.inner_height } catch ( e ) { return }
+                                             const range = [ fig.x_range.start, fig.x_range.end, fig.y_range.start, fig.y_range.end ]
+                                             if ( width > 0 && height > 0 && range.every( Number.isFinite ) ) {
+                                                 for ( const model of [ fig, fig.x_range, fig.y_range ] ) {
+                                                     const callbacks = { }
+                                                     for ( const [ key, cbs ] of Object.entries( model.js_property_callbacks ) )
+                                                         callbacks[key] = cbs.filter( cb => cb !== callback )
+                                                     model.js_property_callbacks = callbacks
+                                                 }
+                                                 source.update_view( ...range, width, height )
+                                             }''' )
+            initial_view.args = dict( initial_view.args, callback=initial_view )
+            self._image.x_range.js_on_change( 'end', initial_view )
+            self._image.y_range.js_on_change( 'end', initial_view )
+            self._image.js_on_change( 'inner_width', initial_view )
+            self._image.js_on_change( 'inner_height', initial_view )
             if self._mask_path is not None and path.isdir(self._mask_path):
                 ##
                 ## LinearColorMapper must be used because otherwise a bitmask that is
@@ -764,13 +811,19 @@ class CubeMask:
                                                           sizing_mode='scale_height', menu=available_palettes( ) ), **kw )
 
             self._palette.js_on_click( CustomJS( args=dict( image=self._chan_image,
+                                                            tiles=self._tile_source,
                                                             ids=self._ids,
                                                             ctrl=self._pipe['control'] ),
                                                  code='''function receive_palette( msg ) {
                                                              if ( 'result' in msg && msg.result != null ) {
-                                                                 let cm = image.glyph.color_mapper
-                                                                 cm.palette = msg.result
-                                                                 cm.change.emit( )
+                                                                 if ( tiles ) {
+                                                                     // tiles are colored by the tile server
+                                                                     tiles.extra_url_vars = { ...tiles.extra_url_vars, P: msg.value }
+                                                                 } else {
+                                                                     let cm = image.glyph.color_mapper
+                                                                     cm.palette = msg.result
+                                                                     cm.change.emit( )
+                                                                 }
                                                                  cb_obj.origin.label = msg.value
                                                              }
                                                          }
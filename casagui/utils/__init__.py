@@ -39,7 +39,7 @@ from socket import socket
 from os import path as __path
 from ._ResourceManager import _ResourceManager
 from ._logging import get_logger
-from ._regions import polygon_indexes
+from ._regions import polygon_indexes, polygon_mask
 from ._docenum import DocEnum
 from ._copydoc import copydoc
 from ._pkgs import find_pkg, load_pkg
@@ -59,9 +59,10 @@ logger = get_logger()
 
 from ._conversion import pack_arrays
 from ._conversion import strip_arrays
-from ._conversion import serialize, deserialize
+from ._conversion import serialize, serialize_binary, deserialize
 from ._static import static_vars, static_dir
-from ._tiles import TMSTiles
+from ._tiles import TMSTiles, block_reduce
+from ._plane_cache import PlaneCache
 from ._contextmgrchain import ContextMgrChain
 from ._import_protected_module import ImportProtectedModule
 
@@ -29,10 +29,11 @@
 via websockets'''
 
 import json
+import struct
 import numpy as np
 from bokeh.util.serialization import transform_array
 from bokeh.core.serialization import Serializer, Deserializer
-from bokeh.core.json_encoder import serialize_json
+from bokeh.core.json_encoder import serialize_json, PayloadEncoder
 from ._static import static_vars
 
 def strip_arrays( val ):
@@ -55,6 +56,31 @@ def serialize( val ):
     '''
     return serialize_json(serialize.encoder.serialize(val))
 
+def serialize_binary( val ):
+    '''convert python values to a binary websocket message. Arrays are not base64
+    encoded. Instead they are sent as raw buffers which follow a JSON header which
+    refers to the buffers by ID (like the Bokeh protocol does for document patches).
+    The message is returned as a list of bytes-like objects which can be passed
+    directly to ``websocket.send`` (which sends them as the fragments of a single
+    message) so the array buffers are not copied. The layout is::
+
+        uint32 (little endian) header length
+        header: utf-8 JSON { "content": <serialized val>, "buffers": [ <id>, ... ] }
+        for each buffer in "buffers" order:
+            uint32 (little endian) buffer length
+            buffer bytes
+    '''
+    encoder = Serializer(deferred=True)
+    content = encoder.encode(val)
+    header = PayloadEncoder( buffers=encoder.buffers, separators=(',', ':') ).encode(
+                 { 'content': content, 'buffers': [ buf.id for buf in encoder.buffers ] } ).encode('utf-8')
+    result = [ struct.pack('<I', len(header)), header ]
+    for buf in encoder.buffers:
+        data = buf.data.cast('B') if isinstance(buf.data, memoryview) else memoryview(buf.data)
+        result.append( struct.pack('<I', data.nbytes) )
+        result.append( data )
+    return result
+
 @static_vars( decoder=Deserializer( ) )
 def deserialize( val ):
     '''convert an encoded value received from websockets
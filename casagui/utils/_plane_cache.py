@@ -0,0 +1,201 @@
+########################################################################
+#
+# Copyright (C) 2024
+# Associated Universities, Inc. Washington DC, USA.
+#
+# This script is free software; you can redistribute it and/or modify it
+# under the terms of the GNU Library General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+# FITNESS FOR A PARTICULAR PURPOSE.  See the GNU Library General Public
+# License for more details.
+#
+# You should have received a copy of the GNU Library General Public License
+# along with this library; if not, write to the Free Software Foundation,
+# Inc., 675 Massachusetts Ave, Cambridge, MA 02139, USA.
+#
+# Correspondence concerning AIPS++ should be adressed as follows:
+#        Internet email: casa-feedback@nrao.edu.
+#        Postal address: AIPS++ Project Office
+#                        National Radio Astronomy Observatory
+#                        520 Edgemont Road
+#                        Charlottesville, VA 22903-2475 USA
+#
+########################################################################
+'''Byte-size limited LRU cache of image planes with background prefetch
+of neighboring channels'''
+
+import queue
+import threading
+from collections import OrderedDict
+
+class PlaneCache:
+    '''LRU cache of image planes keyed by ``(stokes, channel)``. The total size
+    of the cached planes is limited to ``max_bytes``. Each time a plane is
+    retrieved, the direction the user is moving through the cube is noted and
+    the next ``prefetch`` channels in that direction are loaded by a worker
+    thread so that stepping through a cube does not wait on disk I/O.
+
+    Parameters
+    ----------
+    fetch: ( [ int, int ] ) => numpy.ndarray
+        function which loads one plane given ``[ stokes, channel ]``, it is
+        called from both the caller's thread and the prefetch thread so
+        it must do any locking required by the underlying image tool
+    nchan: int
+        number of channels in the cube, prefetch stays within ``[0, nchan)``
+    max_bytes: int
+        upper limit for the total size (``nbytes``) of the cached planes
+    prefetch: int
+        number of channels to load ahead of the current channel, zero
+        disables prefetching (fewer are loaded when ``prefetch`` planes
+        do not fit in ``max_bytes`` along with the current plane)
+    '''
+
+    def __init__( self, fetch, nchan, max_bytes=512*1024*1024, prefetch=4 ):
+        self.__fetch = fetch
+        self.__nchan = nchan
+        self.__max_bytes = max_bytes
+        self.__prefetch = prefetch
+        self.__lock = threading.RLock( )
+        self.__planes = OrderedDict( )            ### (stokes,chan) -> [ plane, extras ]
+        self.__nbytes = 0
+        self.__last = None                        ### last (stokes,chan) requested
+        self.__step = 1                           ### direction the user is moving through the cube
+        self.__epoch = 0                          ### incremented by clear( ) to discard stale prefetches
+        self.__queue = None
+        self.__worker = None
+
+    def __len__( self ):
+        return len(self.__planes)
+
+    def __contains__( self, index ):
+        return tuple(index) in self.__planes
+
+    def nbytes( self ):
+        '''total size of the cached planes'''
+        return self.__nbytes
+
+    def get( self, index ):
+        '''Return the plane for ``index`` loading it if it is not already cached.
+
+        Parameters
+        ----------
+        index: [ int, int ]
+            list containing first the ''stokes'' index and second the ''channel'' index
+        '''
+        key = tuple(index)
+        with self.__lock:
+            if key in self.__planes:
+                self.__planes.move_to_end(key)
+                plane = self.__planes[key][0]
+            else:
+                plane = None
+            previous = self.__last
+            self.__last = key
+            epoch = self.__epoch
+        if plane is None:
+            plane = self.__fetch(list(key))
+            self.__insert( key, plane, epoch )
+        self.__schedule( key, previous, plane.nbytes )
+        return plane
+
+    def extras( self, index ):
+        '''Return the dictionary stored along with the plane for ``index``. This
+        allows values derived from a plane to be cached alongside the plane and
+        discarded when the plane is evicted. ``None`` is returned if the plane is
+        not cached.'''
+        with self.__lock:
+            entry = self.__planes.get(tuple(index))
+            return None if entry is None else entry[1]
+
+    def clear( self ):
+        '''Discard all cached planes, e.g. because the image has changed on disk.'''
+        with self.__lock:
+            self.__epoch += 1
+            self.__planes.clear( )
+            self.__nbytes = 0
+            if self.__queue is not None:
+                try:
+                    while True:
+                        self.__queue.get_nowait( )
+                except queue.Empty:
+                    pass
+
+    def stop( self ):
+        '''Stop the prefetch thread and discard all cached planes.'''
+        self.clear( )
+        if self.__worker is not None:
+            self.__queue.put(None)
+            self.__worker.join( )
+            self.__worker = None
+            self.__queue = None
+
+    def __insert( self, key, plane, epoch, prefetch=False ):
+        size = plane.nbytes
+        with self.__lock:
+            if epoch != self.__epoch or key in self.__planes:
+                ### image changed while this plane was being loaded, or the
+                ### same plane was loaded by the other thread in the meantime
+                return
+            ### the plane most recently requested by the caller is never evicted
+            ### to make room for a prefetched plane
+            current = self.__last
+            if prefetch and current in self.__planes and \
+               self.__planes[current][0].nbytes + size > self.__max_bytes:
+                return
+            self.__planes[key] = [ plane, { } ]
+            self.__nbytes += size
+            ### always keep the most recent plane even if it alone exceeds the limit
+            while self.__nbytes > self.__max_bytes:
+                victim = next( ( k for k in self.__planes if k != key and k != current ), None )
+                if victim is None:
+                    break
+                evicted, _ = self.__planes.pop(victim)
+                self.__nbytes -= evicted.nbytes
+
+    def __schedule( self, key, previous, plane_bytes ):
+        if self.__prefetch <= 0 or self.__nchan <= 1:
+            return
+        if previous is not None and previous[0] == key[0] and previous[1] != key[1]:
+            self.__step = 1 if key[1] > previous[1] else -1
+        ### prefetching more planes than fit in the cache along with the current
+        ### plane would only evict planes which were prefetched earlier
+        count = min( self.__prefetch, max( 0, self.__max_bytes // max( plane_bytes, 1 ) - 1 ) )
+        if count == 0:
+            return
+        step = self.__step
+        wanted = [ (key[0], c) for c in range( key[1] + step, key[1] + step * (count + 1), step )
+                   if 0 <= c < self.__nchan ]
+        with self.__lock:
+            wanted = [ k for k in wanted if k not in self.__planes ]
+            if not wanted:
+                return
+            if self.__worker is None:
+                self.__queue = queue.Queue( )
+                self.__worker = threading.Thread( target=self.__run, daemon=True )
+                self.__worker.start( )
+            epoch = self.__epoch
+        self.__queue.put( (epoch, key, wanted) )
+
+    def __run( self ):
+        while True:
+            request = self.__queue.get( )
+            if request is None:
+                return
+            epoch, origin, wanted = request
+            for key in wanted:
+                with self.__lock:
+                    ### abandon prefetch if the user has moved on or the cache was cleared
+                    if epoch != self.__epoch or self.__last != origin:
+                        break
+                    if key in self.__planes:
+                        continue
+                try:
+                    plane = self.__fetch(list(key))
+                except Exception:
+                    break
+                self.__insert( key, plane, epoch, prefetch=True )
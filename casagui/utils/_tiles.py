@@ -28,6 +28,42 @@
 '''tiling utilities'''
 
 from math import ceil, log
+import numpy as np
+
+def block_reduce( plane, factor, reduce='mean' ):
+    '''
+    Reduce the resolution of a 2D array by combining ``factor`` x ``factor`` blocks
+    of pixels into a single pixel. Partial blocks along the upper edges are combined
+    as well so the result has shape ``ceil(shape / factor)``.
+
+    Parameters
+    ----------
+    plane: numpy.ndarray
+        2D array to be reduced
+    factor: int
+        number of pixels along each axis which are combined
+    reduce: str
+        ``'mean'`` to average the pixels in each block or ``'max'`` to
+        select the largest pixel in each block
+
+    Returns
+    -------
+    numpy.ndarray:
+        the reduced array, ``plane`` itself if ``factor`` is less than two
+    '''
+    if factor < 2:
+        return plane
+    xstart = np.arange( 0, plane.shape[0], factor )
+    ystart = np.arange( 0, plane.shape[1], factor )
+    if reduce == 'mean':
+        sums = np.add.reduceat( np.add.reduceat( plane, xstart, axis=0, dtype=np.float64 ), ystart, axis=1 )
+        counts = np.outer( np.diff( np.append( xstart, plane.shape[0] ) ),
+                           np.diff( np.append( ystart, plane.shape[1] ) ) )
+        return sums / counts
+    elif reduce == 'max':
+        return np.maximum.reduceat( np.maximum.reduceat( plane, xstart, axis=0 ), ystart, axis=1 )
+    else:
+        raise RuntimeError(f'''block_reduce: unknown reduction "{reduce}" (should be 'mean' or 'max')''')
 
 class TMSTiles(object):
     ###
@@ -146,6 +182,17 @@ class TMSTiles(object):
     def zoom_levels( self, reverse=False ):
         return sorted( list(self.__units_per_pixel.keys( )), reverse=reverse )
 
+    def zoom_for_resolution( self, units_per_pixel ):
+        '''Return the zoom level with the coarsest resolution which still provides
+        at least one image pixel for every ``units_per_pixel`` image pixels, i.e.
+        the level whose ``units_per_pixel( )`` is the largest value which does not
+        exceed ``units_per_pixel``. The native (full resolution) zoom level is
+        returned when ``units_per_pixel`` is less than two.'''
+        for z in self.zoom_levels( ):
+            if self.__units_per_pixel[z] <= units_per_pixel:
+                return z
+        return self.__zoom[1]
+
     def units_per_pixel( self, zoom_level ):
         if zoom_level not in self.__units_per_pixel:
             raise RuntimeError(f'''{zoom_level} is not an existing zoom level''')
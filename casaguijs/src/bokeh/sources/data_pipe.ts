@@ -1,6 +1,6 @@
 import { DataSource } from "@bokehjs/models/sources/data_source"
 import * as p from "@bokehjs/core/properties"
-import { serialize, deserialize } from "../util/conversions"
+import { serialize, deserialize, deserialize_binary } from "../util/conversions"
 import { CallbackLike0 } from "@bokehjs/core/util/callbacks";
 import {execute} from "@bokehjs/core/util/callbacks"
 
@@ -68,8 +68,10 @@ export class DataPipe extends DataSource {
             })
 
             this.websocket.onmessage = (event: any) => {
-                if (typeof event.data === 'string' || event.data instanceof String) {
-                    let data = deserialize( event.data )
+                // binary messages are only sent by Python after 'binary' is indicated at initialization
+                const is_text = typeof event.data === 'string' || event.data instanceof String
+                if ( is_text || event.data instanceof ArrayBuffer ) {
+                    let data = is_text ? deserialize( event.data ) : deserialize_binary( event.data )
                     // @ts-ignore: 'data' is of type 'unknown'
                     if ( 'id' in data && 'direction' in data && 'message' in data ) {
                         // @ts-ignore: 'data' is of type 'unknown'
@@ -106,13 +108,14 @@ export class DataPipe extends DataSource {
                     }
 
                 } else {
-                    console.log("datapipe received binary data", event.data.byteLength, "bytes" )
+                    console.log("datapipe received unexpected data", event.data )
                 }
             }
 
             this.websocket.onopen = ( ) => {
                 if ( ! reconnections ) {
-                    this.websocket.send(serialize({ id: 'initialize', direction: 'j2p', session: casalib.object_id(this) }))
+                    // 'binary' indicates that binary messages (see deserialize_binary) can be decoded
+                    this.websocket.send(serialize({ id: 'initialize', direction: 'j2p', session: casalib.object_id(this), binary: true }))
                 } else if ( reconnections.connected == false ) {
                     console.log( `connection reestablished at ${new Date( )}` )
                 }
@@ -17,6 +17,7 @@ export namespace ImageDataSource {
       _mask_contour_source: p.Property<ColumnDataSource | null>  // source for multi_polygon contours
       num_chans: p.Property<[Number,Number]>                     // [ stokes, spectral ]
       cur_chan:  p.Property<[Number,Number]>                     // [ stokes, spectral ]
+      max_level: p.Property<number>                              // log2 of the largest decimation factor
   }
 }
 
@@ -27,6 +28,10 @@ export class ImageDataSource extends ColumnDataSource {
 
     imid: string
     last_chan: [number, number]
+    // visible range and screen size of the display, see update_view( )
+    view: {[key: string]: any} | null = null
+    // log2 of the number of image pixels combined into one pixel of the current channel
+    view_level: number = 0
 
     static __module__ = "casagui.bokeh.sources._image_data_source"
 
@@ -42,11 +47,21 @@ export class ImageDataSource extends ColumnDataSource {
             // @ts-ignore: Parameter 'acc' implicitly has an 'any' type.
             return pairs.reduce( (acc, pair) => { acc[0].push(pair[0]); acc[1].push(pair[1]); return acc }, [[],[]] )
         }
+        // the mask may have been reduced in resolution (see ImagePipe.decimation_factor)
+        // in which case the contour must be scaled up to image pixel coordinates
+        const size = this._plane_size( mask[0] )
+        const xscale = this.image_source.shape[0] / size[0]
+        const yscale = this.image_source.shape[1] / size[1]
         // @ts-ignore:
-        const d3contours = casalib.d3.contours( ).size(this.image_source.shape.slice(0,2)).thresholds([1])(mask[0])[0]
+        const d3contours = casalib.d3.contours( ).size(size).thresholds([1])(mask[0])[0]
         //             Parameter 'x' implicitly has an 'any' type.
         // @ts-ignore: Parameter 'y' implicitly has an 'any' type.
         const split_tuples = d3contours.coordinates.map( x => x.map( y => split(y) ) )
+        if ( xscale != 1 || yscale != 1 ) {
+            // @ts-ignore: Parameter 'ps' implicitly has an 'any' type.
+            split_tuples.forEach( ps => ps.forEach( xy => { xy[0] = xy[0].map( (v: number) => v * xscale )
+                                                            xy[1] = xy[1].map( (v: number) => v * yscale ) } ) )
+        }
         // @ts-ignore: Parameter 'ps' implicitly has an 'any' type.
         const reformatted = { xs: [ split_tuples.map( ps => ps.map(  x => x[0] ) ) ],
         // @ts-ignore: Parameter 'ps' implicitly has an 'any' type.
@@ -54,8 +69,36 @@ export class ImageDataSource extends ColumnDataSource {
         return reformatted
     }
 
+    _plane_size( plane: any ): [number, number] {
+        // channels are sent transposed so the NDArray shape is [ y, x ]
+        if ( plane && 'shape' in plane && plane.shape.length == 2 )
+            return [ plane.shape[1], plane.shape[0] ]
+        return [ this.image_source.shape[0], this.image_source.shape[1] ]
+    }
+
+    // called when the visible range of the display changes, a new channel is requested
+    // only when the resolution needed for the display differs from the current channel
+    update_view( x0: number, x1: number, y0: number, y1: number, width: number, height: number ): void {
+        this.view = { x: [ x0, x1 ], y: [ y0, y1 ], width, height }
+        const upp = Math.min( (x1 - x0) / Math.max( width, 1 ), (y1 - y0) / Math.max( height, 1 ) )
+        // beyond the coarsest level the server returns the same plane
+        const level = upp >= 2 ? Math.min( Math.floor( Math.log2( upp ) ), this.max_level ) : 0
+        if ( level != this.view_level ) {
+            this.view_level = level
+            this.refresh( )
+        }
+    }
+
     initialize(): void {
         super.initialize();
+        // with tiles no channel is embedded, but the masks are at the same reduced resolution
+        for ( const key of [ 'img', 'msk', 'msk0' ] ) {
+            if ( key in this.data && this.data[key].length > 0 && this.data[key][0] != null ) {
+                const size = this._plane_size( this.data[key][0] )
+                this.view_level = Math.max( 0, Math.round( Math.log2( this.image_source.shape[0] / size[0] ) ) )
+                break
+            }
+        }
         // when an initial mask is supplied by the user, it is included
         // in the data object. In case there is a non-zero mask, we must
         // search for a contour upon initialization...
@@ -90,7 +133,7 @@ export class ImageDataSource extends ColumnDataSource {
                                        }
                                        if ( cb ) { cb(data) }
                                        this.data = data.chan
-                                   }, this.imid )
+                                   }, this.imid, this.view )
     }
 
     adjust_colormap( bounds: [ number[], number[] ] | string,
@@ -116,7 +159,7 @@ export class ImageDataSource extends ColumnDataSource {
             }
             if ( cb ) { cb(data) }
             this.data = data.chan
-        }, this.imid, [ 0, 0 ] )
+        }, this.imid, [ 0, 0 ], this.view )
     }
 
     wcs( ): {[key: string]: any} | null {
@@ -130,6 +173,7 @@ export class ImageDataSource extends ColumnDataSource {
             _mask_contour_source: [ Nullable(Ref(ColumnDataSource)), null ],
             num_chans: [ Tuple(Number,Number) ],
             cur_chan:  [ Tuple(Number,Number) ],
+            max_level: [ Number, 0 ],
         }));
     }
 }
@@ -13,9 +13,9 @@ export namespace ImagePipe {
         shape: p.Property<[number,number,number,number]>
         fits_header_json: p.Property<string | null>
         _histogram_source: p.Property<ColumnDataSource | null>     // source for histogram updates
-        channel: p.Property<( index: [number,number], cb: (msg:{[key: string]: any}) => any, id: string ) => void>
+        channel: p.Property<( index: [number,number], cb: (msg:{[key: string]: any}) => any, id: string, view: {[key: string]: any} | null ) => void>
         spectra: p.Property<( index: [number,number,number], cb: (msg:{[key: string]: any}) => any, id: string ) => void>
-        refresh: p.Property<( cb: (msg:{[key: string]: any}) => any, id: string, default_index: [number] ) => void>
+        refresh: p.Property<( cb: (msg:{[key: string]: any}) => any, id: string, default_index: [number], view: {[key: string]: any} | null ) => void>
     }
 }
 
@@ -47,9 +47,11 @@ export class ImagePipe extends DataPipe {
     // fetch channel
     //    index: [ stokes index, spectral plane ]
     // RETURNED MESSAGE SHOULD HAVE { id: string, message: any }
-    channel( index: [number, number], cb: (msg:{[key: string]: any}) => any, id: string ): void {
-        this.position[id] = { index }
-        let message = { action: 'channel', index, id }
+    //    view:  visible range and screen size used to reduce the resolution of the channel
+    //           { x: [ x0, x1 ], y: [ y0, y1 ], width: number, height: number }
+    channel( index: [number, number], cb: (msg:{[key: string]: any}) => any, id: string, view: {[key: string]: any} | null = null ): void {
+        this.position[id] = { index, view }
+        let message = view ? { action: 'channel', index, view, id } : { action: 'channel', index, id }
         super.send( this.dataid, message,
                     (msg:{[key: string]: any}) => {
                         // update histogram (for colormap adjust etc.)
@@ -74,11 +76,13 @@ export class ImagePipe extends DataPipe {
         super.send( this.dataid, message, cb, squash_queue )
     }
 
-    refresh( cb: (msg:{[key: string]: any}) => any, id: string, default_index=[ 0, 0 ] as number[] ): void {
+    refresh( cb: (msg:{[key: string]: any}) => any, id: string, default_index=[ 0, 0 ] as number[], view: {[key: string]: any} | null = null ): void {
         let { index } = id in this.position ? this.position[id] : { index: default_index }
         if ( index.length === 2 ) {
             // refreshing channel
-            let message = { action: 'channel', index, id }
+            if ( view ) this.position[id] = { index, view }
+            else if ( id in this.position && this.position[id].view ) view = this.position[id].view
+            let message = view ? { action: 'channel', index, view, id } : { action: 'channel', index, id }
             super.send( this.dataid, message, cb )
 
         } else if ( index.length === 3 ) {
@@ -3,9 +3,10 @@ import {ModelResolver} from "@bokehjs/core/resolvers"
 import {Deserializer} from "@bokehjs/core/serialization/deserializer"
 import {Serializer} from "@bokehjs/core/serialization/serializer"
 
-const { deserialize } = new class {
+const { deserialize, deserialize_binary } = new class {
     resolver = new ModelResolver(default_resolver)
     deserializer = new Deserializer( this.resolver )
+    decoder = new TextDecoder( )
     deserialize = ( value: string ) => {
         try {
             return this.deserializer.decode( JSON.parse( value ) )
@@ -17,6 +18,35 @@ const { deserialize } = new class {
             return { }
         }
     }
+    // binary messages created by casagui.utils.serialize_binary( ) in Python:
+    //    uint32 (little endian) header length
+    //    header: utf-8 JSON { content: <serialized value>, buffers: [ <id>, ... ] }
+    //    for each buffer in 'buffers' order:
+    //        uint32 (little endian) buffer length
+    //        buffer bytes
+    deserialize_binary = ( value: ArrayBuffer ) => {
+        try {
+            const view = new DataView(value)
+            const header_length = view.getUint32( 0, true )
+            const header = JSON.parse( this.decoder.decode( new Uint8Array( value, 4, header_length ) ) )
+            const buffers = new Map<string, ArrayBuffer>( )
+            let offset = 4 + header_length
+            for ( const id of header.buffers ) {
+                const length = view.getUint32( offset, true )
+                offset += 4
+                // slice copies the buffer which guarantees alignment for typed array views
+                buffers.set( id, value.slice( offset, offset + length ) )
+                offset += length
+            }
+            return this.deserializer.decode( header.content, buffers )
+        } catch ( e1 ) {
+            console.group( "deserialize error" )
+            console.log( value.byteLength, "bytes" )
+            console.log( e1 )
+            console.groupEnd( )
+            return { }
+        }
+    }
 }
 
 const { serialize } = new class {
@@ -28,4 +58,4 @@ const { serialize } = new class {
     }
 }
 
-export { deserialize, serialize }
+export { deserialize, deserialize_binary, serialize }
@@ -0,0 +1,73 @@
+###
+### compare mask inversion using np.vectorize (previously used by CubeMask)
+### with in-place native array operations, first for a single plane and
+### then (if casatools is available) for a whole mask cube where the old
+### per-channel get/invert/put loop is compared with ImagePipe.invert_mask
+###
+### usage: python mask-invert.py [ image-size [ channels ] ]
+###
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+nchan = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+notf = np.vectorize(lambda x: 0.0 if x != 0 else 1.0)
+
+rng = np.random.default_rng(2024)
+plane = ( rng.random( ( size, size ) ) > 0.5 ).astype(np.float32)
+
+start = time.perf_counter( )
+old = notf(plane)
+vectorize = time.perf_counter( ) - start
+
+new = plane.copy( )
+start = time.perf_counter( )
+np.equal( new, 0, out=new )
+native = time.perf_counter( ) - start
+
+print( f'''plane {size}x{size}''' )
+print( f'''    np.vectorize:  {vectorize:8.4f} s''' )
+print( f'''    in place:      {native:8.4f} s  ({vectorize/max(native,1e-9):.0f}x faster)''' )
+print( f'''    planes agree:  {np.array_equal( old, new )}''' )
+
+try:
+    from casatools import image as imagetool
+    from casagui.bokeh.sources import ImagePipe
+except ImportError:
+    print( 'casatools is not available, skipping the cube benchmark' )
+    sys.exit(0)
+
+with tempfile.TemporaryDirectory( ) as tmp:
+    image_path = os.path.join( tmp, 'bench.image' )
+    mask_path = os.path.join( tmp, 'bench.mask' )
+    for path in ( image_path, mask_path ):
+        ia = imagetool( )
+        ia.fromshape( path, [ size, size, 1, nchan ] )
+        ia.close( )
+
+    ###
+    ### per-channel loop as previously done in CubeMask.mod_mask
+    ###
+    ia = imagetool( )
+    ia.open( mask_path )
+    start = time.perf_counter( )
+    for c in range(nchan):
+        mask = np.squeeze( ia.getchunk( blc=[0,0,0,c], trc=[size,size,0,c] ) )
+        ia.putchunk( blc=[0,0,0,c], pixels=notf(mask) )
+    per_channel = time.perf_counter( ) - start
+    ia.close( )
+
+    pipe = ImagePipe( image=image_path, mask=mask_path )
+    start = time.perf_counter( )
+    pipe.invert_mask( 0 )
+    chunked = time.perf_counter( ) - start
+    agree = all( np.all( pipe.mask( [0,c], True ) == 0 ) for c in range(nchan) )
+
+    print( f'''cube {size}x{size}x{nchan}''' )
+    print( f'''    per channel:   {per_channel:8.3f} s''' )
+    print( f'''    chunked:       {chunked:8.3f} s  ({per_channel/max(chunked,1e-9):.1f}x faster)''' )
+    print( f'''    cubes agree:   {agree}''' )
@@ -0,0 +1,72 @@
+###
+### compare the per-pixel Path.contains_point polygon rasterization that
+### was previously used to modify masks with the vectorized polygon_mask
+###
+### usage: python polygon-mask.py [ image-size [ polygon-vertices ] ]
+###
+import sys
+import time
+from itertools import product
+from math import floor, ceil, pi
+import numpy as np
+from matplotlib.path import Path
+from casagui.utils import polygon_mask
+
+def polygon_indexes_per_pixel( xs, ys, shape ):
+    path = Path(list(zip(xs,ys)))
+    xmin, xmax = max([0,min(xs)-1]), max(xs)+1
+    ymin, ymax = max([0,min(ys)-1]), max(ys)+1
+    return filter( path.contains_point, product(range(max(floor(xmin),0),min(ceil(xmax),shape[0]-1)), range(max(floor(ymin),0),min(ceil(ymax),shape[1]-1))) )
+
+def box_indexes_per_pixel( xs, ys, shape ):
+    uniqx = sorted(set(xs))
+    uniqy = sorted(set(ys))
+    return product(range(max(floor(uniqx[0]),0),min(ceil(uniqx[1]),shape[0]-1)),range(max(floor(uniqy[0]),0),min(ceil(uniqy[1]),shape[1]-1)))
+
+def old_mask_for( indexes, shape ):
+    mask = np.zeros( shape, dtype=bool )
+    for index in indexes:
+        mask[index] = True
+    return mask
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+nverts = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+shape = ( size, size )
+
+###
+### irregular "hand drawn" polygon covering much of the image
+###
+rng = np.random.default_rng(2024)
+theta = np.linspace( 0, 2*pi, nverts, endpoint=False )
+radius = size * 0.4 * ( 1.0 + 0.1 * rng.standard_normal(nverts) )
+xs = list( size / 2 + radius * np.cos(theta) )
+ys = list( size / 2 + radius * np.sin(theta) )
+
+start = time.perf_counter( )
+indices = tuple(np.array(list(polygon_indexes_per_pixel( xs, ys, shape ))).T)
+old_mask = np.zeros( shape, dtype=bool )
+old_mask[indices] = True
+per_pixel = time.perf_counter( ) - start
+
+start = time.perf_counter( )
+new_mask = polygon_mask( xs, ys, shape )
+vectorized = time.perf_counter( ) - start
+
+print( f'''image {size}x{size}, polygon with {nverts} vertices, {int(new_mask.sum( ))} pixels selected''' )
+print( f'''    per pixel:   {per_pixel:8.3f} s''' )
+print( f'''    vectorized:  {vectorized:8.3f} s  ({per_pixel/vectorized:.1f}x faster)''' )
+print( f'''    masks agree: {np.array_equal( old_mask, new_mask )}''' )
+
+###
+### boxes use a separate path, including boxes which are partly or wholly off the image
+###
+boxes = { 'inside': ( 10, 50, 20, 60 ),
+          'partly off (negative)': ( -20, 30, -5, 40 ),
+          'partly off (beyond shape)': ( size - 30, size + 30, size - 10, size + 10 ),
+          'wholly off (negative)': ( -20, -10, -20, -10 ),
+          'wholly off (beyond shape)': ( size + 10, size + 20, size + 10, size + 20 ) }
+for name, ( bx0, bx1, by0, by1 ) in boxes.items( ):
+    bxs, bys = [ bx0, bx1, bx1, bx0 ], [ by0, by0, by1, by1 ]
+    old_box = old_mask_for( box_indexes_per_pixel( bxs, bys, shape ), shape )
+    new_box = polygon_mask( bxs, bys, shape )
+    print( f'''    box {name}: {int(new_box.sum( ))} pixels, masks agree: {np.array_equal( old_box, new_box )}''' )
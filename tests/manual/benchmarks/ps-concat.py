@@ -0,0 +1,105 @@
+###
+### compare the list based time gap splitting and ordering of processing set
+### datasets that was previously used by concat_ps_xdt with the searchsorted
+### and argsort based implementation, using synthetic processing sets where
+### scans of several fields are interleaved in time
+###
+### usage: python ps-concat.py [ partitions [ timestamps ... ] ]
+###
+import sys
+import time
+import numpy as np
+import xarray as xr
+from casagui.data.measurement_set.processing_set._ps_concat import _get_sorted_times, _split_xds_by_time_gap
+
+npart = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+sizes = [ int(s) for s in sys.argv[2:] ] if len(sys.argv) > 2 else [ 10000, 100000, 1000000 ]
+
+### the old implementation is quadratic, only run it up to this many timestamps
+old_limit = 100000
+
+def old_sorted_times( ps ):
+    values = []
+    for key in ps:
+        time_values = ps[key].time.values
+        if time_values.size > 1:
+            values.extend(time_values.tolist())
+        else:
+            values.append(time_values)
+    return sorted(values)
+
+def old_split( xds, sorted_times ):
+    times = xds.time.values.ravel()
+    xds_list = []
+    first_times = [times[0]]
+    if len(times) == 1:
+        xds_list.append(xds)
+    else:
+        sorted_time_idx = sorted_times.index(times[0])
+        idx = xds_start_idx = 0
+        for idx, t in enumerate(times):
+            if t == sorted_times[sorted_time_idx]:
+                sorted_time_idx += 1
+                continue
+            xds_list.append(xds.isel(time=slice(xds_start_idx, idx)))
+            xds_start_idx = idx
+            first_times.append(times[idx])
+            sorted_time_idx = sorted_times.index(t) + 1
+        xds_list.append(xds.isel(time=slice(xds_start_idx, idx + 1)))
+    return xds_list, first_times
+
+def old_order( ps ):
+    sorted_times = old_sorted_times( ps )
+    xds_list, time_list = [ ], [ ]
+    for xds in ps.values( ):
+        xdss, times = old_split( xds, sorted_times )
+        xds_list.extend(xdss)
+        time_list.extend(times)
+    time_list.sort( )
+    sorted_xds = [None] * len(time_list)
+    for xds in xds_list:
+        first = xds.time.values.ravel( )[0]
+        for idx, value in enumerate(time_list):
+            if value == first and sorted_xds[idx] is None:
+                sorted_xds[idx] = xds
+                break
+    return sorted_xds
+
+def new_order( ps ):
+    sorted_times = _get_sorted_times( ps )
+    xds_list, time_list = [ ], [ ]
+    for xds in ps.values( ):
+        xdss, times = _split_xds_by_time_gap( xds, sorted_times )
+        xds_list.extend(xdss)
+        time_list.extend(times)
+    return [ xds_list[i] for i in np.argsort( np.array(time_list), kind='stable' ) ]
+
+def synthetic_ps( ntimes, npart ):
+    ### integrations are divided into scans which are assigned to partitions in turn,
+    ### so every partition has a time gap between each of its scans
+    times = 4.0e9 + np.arange(ntimes) * 2.0
+    scans = np.array_split( times, max(npart, ntimes // 50) )
+    ps = { }
+    for p in range(npart):
+        ptimes = np.concatenate( scans[p::npart] )
+        ps[f'part_{p}'] = xr.Dataset( coords={ 'time': ptimes } )
+    return ps
+
+for ntimes in sizes:
+    ps = synthetic_ps( ntimes, npart )
+
+    start = time.perf_counter( )
+    new = new_order( ps )
+    new_time = time.perf_counter( ) - start
+
+    print( f'''{npart} partitions, {ntimes} timestamps, {len(new)} datasets after split''' )
+    if ntimes <= old_limit:
+        start = time.perf_counter( )
+        old = old_order( ps )
+        old_time = time.perf_counter( ) - start
+        agree = len(old) == len(new) and all( np.array_equal( o.time.values, n.time.values ) for o, n in zip( old, new ) )
+        print( f'''    list/index:    {old_time:8.3f} s''' )
+        print( f'''    searchsorted:  {new_time:8.3f} s  ({old_time/max(new_time,1e-9):.0f}x faster)''' )
+        print( f'''    orders agree:  {agree}''' )
+    else:
+        print( f'''    searchsorted:  {new_time:8.3f} s  (list/index skipped)''' )
@@ -0,0 +1,152 @@
+###
+### compare serial conversion of an MSv2 to a processing set with
+### convert_msv2_to_processing_set to parallel conversion by partition with
+### MsConverter, for increasing numbers of worker processes, using a synthetic
+### MS with several spectral windows and fields; the converted visibilities
+### are compared with the serial conversion
+###
+### requires python-casacore
+###
+### usage: python ps-convert.py [ workdir [ workers ... ] ]
+###
+import logging
+import os
+import shutil
+import sys
+import time
+import numpy as np
+from casacore.tables import table, default_ms, maketabdesc, makearrcoldesc
+from xradio.measurement_set.convert_msv2_to_processing_set import convert_msv2_to_processing_set
+from xradio.measurement_set.open_processing_set import open_processing_set
+from casagui.data.measurement_set.processing_set._ps_convert import MsConverter
+
+workdir = sys.argv[1] if len(sys.argv) > 1 else 'ps-convert-bench'
+### default: powers of two up to the number of cpus; more workers than cpus only add overhead
+workers = [ int(n) for n in sys.argv[2:] ] if len(sys.argv) > 2 else \
+          [ 2 ** i for i in range( (os.cpu_count( ) or 1).bit_length( ) ) ]
+
+### synthetic MS shape: partitions are spw x field with partition scheme [ 'FIELD_ID' ]
+nspw, nfield, nscan, ntime_per_scan, nant, nchan, ncorr = 8, 2, 8, 30, 16, 128, 4
+partition_scheme = [ 'FIELD_ID' ]
+
+def putcells( tb, column, values ):
+    for row, value in enumerate(values):
+        tb.putcell( column, row, value )
+
+def synthetic_ms( name ):
+    ### scans alternate between fields, every scan observes all spws
+    desc = maketabdesc( [ makearrcoldesc( 'DATA', 0j, ndim=2, shape=[nchan, ncorr], valuetype='complex' ) ] )
+    ms = default_ms( name, desc )
+
+    with table( f'{name}/ANTENNA', readonly=False, ack=False ) as tb:
+        tb.addrows( nant )
+        tb.putcol( 'NAME', [ f'A{i:02d}' for i in range(nant) ] )
+        tb.putcol( 'STATION', [ f'S{i:02d}' for i in range(nant) ] )
+        tb.putcol( 'TYPE', [ 'GROUND-BASED' ] * nant )
+        tb.putcol( 'MOUNT', [ 'ALT-AZ' ] * nant )
+        tb.putcol( 'POSITION', np.array( [ [ -1601185.4 + 100.0 * i, -5041977.5, 3554875.9 ] for i in range(nant) ] ) )
+        tb.putcol( 'DISH_DIAMETER', np.full( nant, 25.0 ) )
+
+    with table( f'{name}/SPECTRAL_WINDOW', readonly=False, ack=False ) as tb:
+        tb.addrows( nspw )
+        freqs = [ 1.0e9 + s * 1.0e8 + np.arange(nchan) * 1.0e6 for s in range(nspw) ]
+        tb.putcol( 'NUM_CHAN', np.full( nspw, nchan, dtype=np.int32 ) )
+        putcells( tb, 'CHAN_FREQ', freqs )
+        for column in [ 'CHAN_WIDTH', 'EFFECTIVE_BW', 'RESOLUTION' ]:
+            putcells( tb, column, [ np.full( nchan, 1.0e6 ) ] * nspw )
+        tb.putcol( 'REF_FREQUENCY', np.array( [ f[0] for f in freqs ] ) )
+        tb.putcol( 'TOTAL_BANDWIDTH', np.full( nspw, nchan * 1.0e6 ) )
+        tb.putcol( 'MEAS_FREQ_REF', np.full( nspw, 5, dtype=np.int32 ) )
+        tb.putcol( 'NAME', [ f'SPW{s}' for s in range(nspw) ] )
+
+    with table( f'{name}/POLARIZATION', readonly=False, ack=False ) as tb:
+        tb.addrows( 1 )
+        tb.putcell( 'NUM_CORR', 0, ncorr )
+        tb.putcell( 'CORR_TYPE', 0, np.array( [ 5, 6, 7, 8 ][:ncorr], dtype=np.int32 ) )
+        tb.putcell( 'CORR_PRODUCT', 0, np.array( [ [0, 0], [0, 1], [1, 0], [1, 1] ][:ncorr], dtype=np.int32 ) )
+
+    with table( f'{name}/DATA_DESCRIPTION', readonly=False, ack=False ) as tb:
+        tb.addrows( nspw )
+        tb.putcol( 'SPECTRAL_WINDOW_ID', np.arange( nspw, dtype=np.int32 ) )
+        tb.putcol( 'POLARIZATION_ID', np.zeros( nspw, dtype=np.int32 ) )
+
+    with table( f'{name}/FIELD', readonly=False, ack=False ) as tb:
+        tb.addrows( nfield )
+        tb.putcol( 'NAME', [ f'F{f}' for f in range(nfield) ] )
+        for column in [ 'PHASE_DIR', 'DELAY_DIR', 'REFERENCE_DIR' ]:
+            putcells( tb, column, [ np.array( [ [ 0.1 * f, 0.5 ] ] ) for f in range(nfield) ] )
+
+    t0 = 5.0e9
+    with table( f'{name}/OBSERVATION', readonly=False, ack=False ) as tb:
+        tb.addrows( 1 )
+        tb.putcell( 'TELESCOPE_NAME', 0, 'VLA' )
+        tb.putcell( 'TIME_RANGE', 0, np.array( [ t0, t0 + nscan * ntime_per_scan * 10.0 ] ) )
+
+    with table( f'{name}/STATE', readonly=False, ack=False ) as tb:
+        tb.addrows( 1 )
+        tb.putcell( 'OBS_MODE', 0, 'OBSERVE_TARGET#ON_SOURCE' )
+
+    ant1, ant2 = np.triu_indices( nant, 1 )
+    nrow = ntime_per_scan * ant1.size
+    rng = np.random.default_rng( 0 )
+    for scan in range(nscan):
+        times = np.repeat( t0 + (scan * ntime_per_scan + np.arange(ntime_per_scan)) * 10.0, ant1.size )
+        for spw in range(nspw):
+            start = ms.nrows( )
+            ms.addrows( nrow )
+            columns = { 'TIME': times, 'TIME_CENTROID': times,
+                        'ANTENNA1': np.tile( ant1, ntime_per_scan ).astype(np.int32),
+                        'ANTENNA2': np.tile( ant2, ntime_per_scan ).astype(np.int32),
+                        'DATA_DESC_ID': np.full( nrow, spw, dtype=np.int32 ),
+                        'FIELD_ID': np.full( nrow, scan % nfield, dtype=np.int32 ),
+                        'SCAN_NUMBER': np.full( nrow, scan + 1, dtype=np.int32 ),
+                        'STATE_ID': np.zeros( nrow, dtype=np.int32 ),
+                        'INTERVAL': np.full( nrow, 10.0 ), 'EXPOSURE': np.full( nrow, 10.0 ),
+                        'UVW': rng.normal( size=(nrow, 3) ) * 1000.0,
+                        'SIGMA': np.ones( (nrow, ncorr), dtype=np.float32 ),
+                        'WEIGHT': np.ones( (nrow, ncorr), dtype=np.float32 ),
+                        'FLAG': np.zeros( (nrow, nchan, ncorr), dtype=bool ),
+                        'DATA': ( rng.normal( size=(nrow, nchan, ncorr) ) +
+                                  1j * rng.normal( size=(nrow, nchan, ncorr) ) ).astype(np.complex64) }
+            for column, values in columns.items( ):
+                ms.putcol( column, values, startrow=start, nrow=nrow )
+    ms.close( )
+
+def same_visibilities( ps1, ps2 ):
+    return sorted(ps1.keys( )) == sorted(ps2.keys( )) and \
+           all( np.array_equal( ps1[name].VISIBILITY.values, ps2[name].VISIBILITY.values ) for name in ps1.keys( ) )
+
+if __name__ == '__main__':
+    ### worker processes are spawned, so this module must be importable without side effects
+    logging.basicConfig( level=logging.WARNING )
+    logger = logging.getLogger( 'ps-convert' )
+    os.makedirs( workdir, exist_ok=True )
+    ms_path = os.path.join( workdir, 'bench.ms' )
+    if not os.path.exists( ms_path ):
+        synthetic_ms( ms_path )
+
+    with table( ms_path, ack=False ) as tb:
+        print( f'''{tb.nrows( )} rows, {nspw * nfield} partitions, {os.cpu_count( )} cpus''' )
+
+    serial_path = os.path.join( workdir, 'serial.ps.zarr' )
+    shutil.rmtree( serial_path, ignore_errors=True )
+    start = time.perf_counter( )
+    convert_msv2_to_processing_set( in_file=ms_path, out_file=serial_path, partition_scheme=partition_scheme )
+    serial_time = time.perf_counter( ) - start
+    serial = open_processing_set( serial_path )
+    print( f'''    serial convert_msv2_to_processing_set:  {serial_time:8.2f} s''' )
+
+    if max(workers) > (os.cpu_count( ) or 1):
+        print( f'''    warning: more workers than cpus, speedup is limited to {os.cpu_count( )} cpus''' )
+
+    for n_workers in workers:
+        zarr_path = os.path.join( workdir, f'''workers{n_workers}.ps.zarr''' )
+        shutil.rmtree( zarr_path, ignore_errors=True )
+        start = time.perf_counter( )
+        converter = MsConverter( ms_path, zarr_path, logger,
+                                 { 'n_workers': n_workers, 'partition_scheme': partition_scheme, 'use_dask_client': False } )
+        converter.wait( )
+        elapsed = time.perf_counter( ) - start
+        converter.close( )
+        agree = same_visibilities( serial, converter.open_processing_set( ) )
+        print( f'''    MsConverter {n_workers:2d} workers:            {elapsed:8.2f} s  ({serial_time/elapsed:.2f}x)  visibilities agree: {agree}''' )
@@ -0,0 +1,38 @@
+########################################################################
+##
+## display a large image with the CubeMask tile server, i.e. the channel
+## is rendered as TMS tiles by the ImagePipe instead of being sent to
+## the browser as one plane
+##
+## usage:
+##
+##    python cubemask-tiles.py [ IMAGE [ MASK ] ]
+##
+## the image should be large (e.g. 8k x 8k or 16k x 16k pixels) so that
+## zooming in and out moves between tile levels, a compatible mask can be
+## supplied to check that the mask overlay lines up with the tiles
+##
+########################################################################
+import sys
+import asyncio
+from bokeh.plotting import show
+from bokeh.layouts import row, column
+from casagui.toolbox import CubeMask
+
+img = sys.argv[1] if len(sys.argv) > 1 else 'large.image'
+msk = sys.argv[2] if len(sys.argv) > 2 else None
+
+cube = CubeMask( img, mask=msk )
+layout = column( cube.image( tiles=True, width=800, height=800 ),
+                 row( cube.slider( ), cube.palette( ) ) )
+cube.connect( )
+show( layout )
+
+try:
+    loop = asyncio.get_event_loop( )
+    loop.run_until_complete(cube.loop( ))
+    loop.run_forever( )
+except KeyboardInterrupt:
+    print('\nInterrupt received, stopping GUI...')
+
+print( f"cube exited with {cube.result( )}" )